@@ -1,8 +1,17 @@
-from typing import Dict, List, Union, Optional, Tuple
-import asyncio
+from typing import Callable, Dict, List, Union, Optional, Tuple
 from core.rag_chain import ResumeRagChain
-from utils.resume_standardizer import ResumeStandardizer
+from core.async_runner import run_async
+from core.job_queue import job_queue, speculative_queue, DONE
+from core.rate_limiter import llm_priority, PRIORITY_NORMAL, PRIORITY_BULK
+from core.resilience import deadline_scope, degradation_scope, DEFAULT_DEADLINE_SECONDS, JOB_DEADLINE_SECONDS
+from core.retriever import add_resume_to_vector_store
+from utils.resume_standardizer import ResumeStandardizer, STANDARDIZER_VERSION
+from utils.candidate_catalog import candidate_catalog, text_digest
 import streamlit as st
+import hashlib
+import json
+import time
+import uuid
 import logging
 import traceback
 
@@ -47,11 +56,177 @@ def get_resume_data(inputs: Union[Dict, List, str, Tuple]) -> Tuple[str, str]:
         logger.error(f"Error in get_resume_data: {str(e)}\n{traceback.format_exc()}")
         return ("", "")
 
+# Use case yang dijalankan sebagai job latar belakang, beserta jenis job-nya
+JOB_KINDS = {
+    "Candidate Search by Job Description": "candidate_search",
+    "Compare Multiple Candidates": "compare_candidates",
+    "Compare with Scoring": "score_and_rank_candidates",
+}
+
+# Standardisasi, deteksi level, dan embedding spekulatif saat resume diunggah
+PREWARM_KIND = "prewarm_resumes"
+
+# Kelas prioritas LLM per jenis job; scoring massal memakai sisa kapasitas
+JOB_PRIORITIES = {
+    "candidate_search": PRIORITY_NORMAL,
+    "compare_candidates": PRIORITY_NORMAL,
+    "score_and_rank_candidates": PRIORITY_BULK,
+}
+
+def session_context(inputs: Union[Dict, List, None]) -> Dict:
+    """Snapshot of the session state a use case depends on (job workers cannot read st.session_state)"""
+    selected_domain = st.session_state.get("selected_domain", "general")
+    return {
+        "domain": inputs.get("domain", selected_domain) if isinstance(inputs, dict) else selected_domain,
+        "jd_text": st.session_state.get("last_jd_text") or "",
+        "previous_results": st.session_state.get("last_scoring_results"),
+    }
+
+def store_results(use_case: str, results: Union[str, Dict]):
+    """Publish the results of a finished use case into session state"""
+    if use_case == "Compare with Scoring" and isinstance(results, dict) and "ranking" in results:
+        st.session_state["last_narrative_analysis"] = results.get("narrative_analysis", "")
+        st.session_state["last_scoring_results"] = results
+        st.session_state["show_scoring_results"] = True
+        logger.info(f"Session state updated - results: {len(results['ranking'])} candidates")
+
 def process_use_case(use_case: str, inputs: Union[Dict, List], question: Optional[str] = None) -> Union[str, Dict]:
-    """Route use cases to appropriate handlers with improved consistency"""
+    """Run a use case synchronously within the Streamlit script"""
+    results = run_with_deadline(DEFAULT_DEADLINE_SECONDS, use_case, inputs, question, session_context(inputs))
+    store_results(use_case, results)
+    return results
+
+def run_with_deadline(seconds: float, use_case: str, inputs: Union[Dict, List], question: Optional[str] = None,
+                      context: Optional[Dict] = None,
+                      progress: Optional[Callable[..., None]] = None) -> Union[str, Dict]:
+    """Run a use case within an end-to-end deadline, marking results whose stages fell back to local paths"""
+    with deadline_scope(seconds), degradation_scope() as notes:
+        results = run_use_case(use_case, inputs, question, context, progress)
+    if notes:
+        logger.warning(f"Use case '{use_case}' completed in degraded mode: {notes}")
+        if isinstance(results, dict):
+            results["degraded"] = list(notes)
+        elif isinstance(results, str):
+            results = f"⚠️ **Mode terdegradasi:** {'; '.join(notes)}\n\n{results}"
+    return results
+
+def submit_use_case_job(use_case: str, inputs: Union[Dict, List], question: Optional[str] = None) -> str:
+    """Queue a use case as a background job; identical inputs on later reruns reuse the existing job"""
+    context = session_context(inputs)
+    key = hashlib.sha256(json.dumps(
+        [use_case, inputs, question, context["domain"], context["jd_text"]], sort_keys=True, default=str
+    ).encode()).hexdigest()
+    
+    jobs = st.session_state.setdefault("use_case_jobs", {})
+    known = jobs.get(use_case)
+    if known and known["key"] == key and job_queue.get(known["job_id"]):
+        return known["job_id"]
+    
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    job_id = job_queue.submit(JOB_KINDS[use_case], {
+        "use_case": use_case,
+        "inputs": inputs,
+        "question": question,
+        "context": context,
+        "session_id": session_id,
+    }, session_id=session_id)
+    jobs[use_case] = {"key": key, "job_id": job_id, "stored": False}
+    return job_id
+
+def get_use_case_job(use_case: str) -> Optional[Dict]:
+    """
+    Latest job of a use case in this session; results are published to session state once
+    
+    Returns:
+        Job dictionary (status, progress, message, partial, result, error) with
+        'just_finished' set on the first poll after completion, or None
+    """
+    known = st.session_state.get("use_case_jobs", {}).get(use_case)
+    if not known:
+        return None
+    job = job_queue.get(known["job_id"])
+    if job and job["status"] == DONE and not known["stored"]:
+        store_results(use_case, job["result"])
+        known["stored"] = True
+        job["just_finished"] = True
+    return job
+
+def _run_job(payload: Dict, report: Callable[..., None]) -> Union[str, Dict]:
+    priority = JOB_PRIORITIES.get(JOB_KINDS.get(payload["use_case"]), PRIORITY_NORMAL)
+    with llm_priority(priority, payload.get("session_id", "")):
+        return run_with_deadline(JOB_DEADLINE_SECONDS, payload["use_case"], payload["inputs"],
+                                 payload.get("question"), payload["context"], report)
+
+def schedule_prewarm(resumes: List[Tuple[str, str]], domain: str) -> Optional[str]:
+    """Queue speculative standardization, level detection and embedding for freshly uploaded resumes"""
+    domain = (domain or "general").lower()
+    scheduled = st.session_state.setdefault("prewarmed_resumes", set())
+    digests = []
+    for text, filename in resumes:
+        if not text:
+            continue
+        digest = text_digest(text)
+        if (digest, domain) not in scheduled:
+            candidate_catalog.upsert_resume(text, filename)
+            scheduled.add((digest, domain))
+            digests.append(digest)
+    if not digests:
+        return None
+    
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    return speculative_queue.submit(PREWARM_KIND, {
+        "digests": digests,
+        "domain": domain,
+        "session_id": session_id,
+    }, session_id=session_id)
+
+def _prewarm_resume(standardizer: ResumeStandardizer, digest: str):
+    record = candidate_catalog.get_resume(digest)
+    if not record:
+        return
+    if not candidate_catalog.get_standardized(digest, standardizer.domain, STANDARDIZER_VERSION):
+        # Hasil valid disimpan ke katalog bersama LEVEL-nya oleh standardizer
+        standardizer.standardize_resume(record["raw_text"])
+    # Dilewati di dalam fungsi bila chunk resume sudah ada di vector store
+    add_resume_to_vector_store(record["raw_text"], record.get("filename") or "", standardizer.domain)
+
+def _run_prewarm(payload: Dict, report: Callable[..., None]) -> Dict:
+    standardizer = ResumeStandardizer(domain=payload["domain"])
+    digests = payload["digests"]
+    failed = 0
+    with llm_priority(PRIORITY_BULK, payload.get("session_id", "")), deadline_scope(JOB_DEADLINE_SECONDS):
+        for index, digest in enumerate(digests, start=1):
+            try:
+                _prewarm_resume(standardizer, digest)
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Prewarm failed for {digest[:12]}: {str(e)}")
+            report(index / len(digests), f"Prewarm {index}/{len(digests)} resume")
+    return {"prewarmed": len(digests) - failed, "failed": failed}
+
+for _kind in JOB_KINDS.values():
+    job_queue.register(_kind, _run_job)
+job_queue.resume_pending()
+speculative_queue.register(PREWARM_KIND, _run_prewarm)
+speculative_queue.resume_pending()
+
+def run_use_case(use_case: str, inputs: Union[Dict, List], question: Optional[str] = None,
+                 context: Optional[Dict] = None,
+                 progress: Optional[Callable[..., None]] = None) -> Union[str, Dict]:
+    """
+    Route use cases to appropriate handlers with improved consistency
+    
+    Does not touch st.session_state, so it can run in a job worker.
+    
+    Args:
+        context: Output of session_context (domain, JD text, previous scoring results)
+        progress: Optional callback(progress 0..1, message, partial)
+    """
     logger.info(f"Starting process_use_case: {use_case}")
+    context = context or {}
+    progress = progress or (lambda *args, **kwargs: None)
     try:
-        domain = inputs.get("domain", st.session_state.get("selected_domain", "general")) if isinstance(inputs, dict) else st.session_state.get("selected_domain", "general")
+        domain = inputs.get("domain", context.get("domain", "general")) if isinstance(inputs, dict) else context.get("domain", "general")
         logger.info(f"Processing use case '{use_case}' with domain: {domain}")
 
         rag_chain = ResumeRagChain(domain=domain)
@@ -63,7 +238,10 @@ def process_use_case(use_case: str, inputs: Union[Dict, List], question: Optiona
                 logger.error(error_msg)
                 return {"error": error_msg}
             logger.info("Running candidate_search")
-            return asyncio.run(rag_chain.candidate_search(inputs["jd_text"]))
+            progress(0.1, "Mencari dan menstandarisasi kandidat...")
+            days = inputs.get("uploaded_within_days")
+            uploaded_after = time.time() - days * 86400 if days else None
+            return run_async(rag_chain.candidate_search(inputs["jd_text"], uploaded_after=uploaded_after))
         
         elif use_case == "Candidate Profiling / Resume QA":
             resume_text, filename = get_resume_data(inputs)
@@ -73,11 +251,11 @@ def process_use_case(use_case: str, inputs: Union[Dict, List], question: Optiona
                 return {"error": error_msg}
             logger.info(f"Processing resume QA/Profiling for file: {filename}")
             if question:
-                return asyncio.run(rag_chain.resume_qa(resume_text, question, filename))
-            return asyncio.run(rag_chain.candidate_profiling(resume_text, filename))
+                return run_async(rag_chain.resume_qa(resume_text, question, filename))
+            return run_async(rag_chain.candidate_profiling(resume_text, filename))
         
         elif use_case in ("Compare Multiple Candidates", "Compare with Scoring"):
-            jd_text = st.session_state.get("last_jd_text", "")
+            jd_text = context.get("jd_text") or ""
             logger.debug(f"JD text length: {len(jd_text)}")
             if isinstance(inputs, dict):
                 resume_data = inputs.get("resume_data", [])
@@ -91,9 +269,9 @@ def process_use_case(use_case: str, inputs: Union[Dict, List], question: Optiona
                 
             validated_resume_data = []
             for data in resume_data:
-                if not isinstance(data, tuple) or len(data) < 2:
+                if not isinstance(data, (tuple, list)) or len(data) < 2:
                     logger.warning(f"Data resume tidak valid: {data}")
-                    resume_text = data[0] if isinstance(data, tuple) and len(data) > 0 else str(data)
+                    resume_text = data[0] if isinstance(data, (tuple, list)) and len(data) > 0 else str(data)
                     validated_resume_data.append((resume_text.strip(), ""))
                 else:
                     validated_resume_data.append((data[0].strip(), data[1].strip()))
@@ -101,7 +279,8 @@ def process_use_case(use_case: str, inputs: Union[Dict, List], question: Optiona
                 
             if use_case == "Compare Multiple Candidates":
                 logger.info("Running compare_candidates")
-                return asyncio.run(rag_chain.compare_candidates(validated_resume_data, jd_text))
+                progress(0.1, f"Membandingkan {len(validated_resume_data)} kandidat...")
+                return run_async(rag_chain.compare_candidates(validated_resume_data, jd_text))
             
             elif use_case == "Compare with Scoring":
                 criteria = inputs.get("criteria") if isinstance(inputs, dict) else None
@@ -110,13 +289,22 @@ def process_use_case(use_case: str, inputs: Union[Dict, List], question: Optiona
                     criteria = standardizer.get_domain_specific_criteria()
                     logger.debug(f"Using default criteria: {criteria}")
                 
+                # Narasi dapat ditunda sampai diminta dari tab "Analisis Naratif"
+                defer_narrative = bool(inputs.get("defer_narrative")) if isinstance(inputs, dict) else False
+                
                 logger.info(f"Processing scoring with {len(validated_resume_data)} candidates, domain: {domain}")
                 
                 try:
                     results = rag_chain.score_and_rank_candidates(
                         validated_resume_data,
                         jd_text,
-                        criteria
+                        criteria,
+                        previous_results=context.get("previous_results"),
+                        generate_narrative=not defer_narrative,
+                        progress_callback=lambda scored, total: progress(
+                            0.9 * scored / total, f"Menilai resume {scored}/{total}",
+                            {"scored": scored, "total": total}
+                        )
                     )
                     
                     if "error" in results:
@@ -125,10 +313,10 @@ def process_use_case(use_case: str, inputs: Union[Dict, List], question: Optiona
                     
                     narrative = results.get("narrative_analysis", "")
                     logger.debug(f"Initial narrative length: {len(narrative)}")
-                    if not narrative or len(narrative.strip()) < 50:
+                    if not defer_narrative and (not narrative or len(narrative.strip()) < 50):
                         logger.warning("Narrative missing or too short, attempting to generate")
                         try:
-                            narrative = asyncio.run(rag_chain.generate_llm_narrative_analysis(results, jd_text))
+                            narrative = run_async(rag_chain.get_narrative(results, jd_text))
                             if narrative and len(narrative.strip()) > 50:
                                 results["narrative_analysis"] = narrative
                                 logger.info(f"Generated narrative successfully: {len(narrative)} chars")
@@ -137,13 +325,6 @@ def process_use_case(use_case: str, inputs: Union[Dict, List], question: Optiona
                         except Exception as e:
                             logger.error(f"Error generating narrative: {str(e)}\n{traceback.format_exc()}")
                     
-                    # Simpan ke session state untuk memastikan hasil tersedia
-                    st.session_state["last_narrative_analysis"] = narrative
-                    st.session_state["last_scoring_results"] = results
-                    st.session_state["show_scoring_results"] = True
-                    
-                    logger.info(f"Session state updated - narrative: {len(narrative)} chars, results: {len(results['ranking'])} candidates")
-                    logger.debug(f"Show scoring results flag set to: {st.session_state['show_scoring_results']}")
                     return results
                 
                 except Exception as e:
@@ -4,6 +4,13 @@ from utils.resume_parser import parse_resume, parse_uploaded_folder
 from utils.jd_parser import parse_jd
 from utils.name_extractor import NameExtractor
 from utils.resume_standardizer import ResumeStandardizer
+from core.llm_client import get_llm_call_stats
+from core.rate_limiter import all_limiter_stats
+from core.resilience import all_circuit_stats
+from core.async_runner import run_async
+from app.controller import schedule_prewarm
+from utils.near_duplicate import near_duplicate_index
+from utils.candidate_catalog import text_digest
 import pandas as pd
 import plotly.express as px
 import logging
@@ -28,6 +35,45 @@ name_extractor = NameExtractor()
 
 # Daftar domain yang didukung
 SUPPORTED_DOMAINS = ["General", "IT", "HR", "Finance", "Marketing", "Sales", "Operations"]
+# Jumlah set upload yang klaster duplikatnya disimpan per sesi
+DUPLICATE_CACHE_SIZE = 8
+# Rentang waktu unggah resume pada pencarian kandidat (hari; None = semua)
+UPLOAD_RECENCY_OPTIONS = {"Semua waktu": None, "30 hari terakhir": 30, "90 hari terakhir": 90, "1 tahun terakhir": 365}
+
+def duplicate_clusters(texts: List[str]) -> List[List[int]]:
+    """Klaster duplikat per set upload, di-cache di session state agar tidak dihitung ulang setiap rerun"""
+    cache = st.session_state.setdefault("duplicate_clusters", {})
+    key = tuple(text_digest(text) for text in texts)
+    if key not in cache:
+        if len(cache) >= DUPLICATE_CACHE_SIZE:
+            cache.clear()
+        cache[key] = near_duplicate_index.cluster(texts)
+    return cache[key]
+
+def show_duplicate_notice(resumes: List[Tuple[str, str]]):
+    """Tampilkan klaster resume duplikat yang terdeteksi saat upload"""
+    clusters = duplicate_clusters([text for text, _ in resumes])
+    for cluster in clusters:
+        if len(cluster) > 1:
+            duplicates = ", ".join(resumes[i][1] or f"Resume {i+1}" for i in cluster[1:])
+            original = resumes[cluster[0]][1] or f"Resume {cluster[0]+1}"
+            st.info(f"🔁 {duplicates} terdeteksi sebagai duplikat dari {original}. Hanya satu yang akan diproses oleh LLM.")
+
+def show_ranking_diff(diff: Dict):
+    """Tampilkan perubahan ranking setelah resume ditambahkan ke sesi scoring"""
+    if not diff or not (diff.get("added") or diff.get("removed") or diff.get("moved")):
+        return
+    lines = []
+    for entry in diff.get("added", []):
+        lines.append(f"🆕 {entry['name']} masuk di peringkat {entry['rank']}")
+    for entry in diff.get("moved", []):
+        arrow = "⬆️" if entry["to"] < entry["from"] else "⬇️"
+        lines.append(f"{arrow} {entry['name']}: {entry['from']} → {entry['to']}")
+    for name in diff.get("removed", []):
+        lines.append(f"➖ {name} dihapus dari sesi")
+    if not diff.get("top_changed"):
+        lines.append("Urutan kandidat teratas tidak berubah, analisis naratif sebelumnya tetap digunakan.")
+    st.info("**Perubahan ranking:**\n\n" + "\n\n".join(lines))
 
 def display_scoring_results(results: Dict):
     """Display scoring results with tabs for different analyses"""
@@ -45,6 +91,8 @@ def display_scoring_results(results: Dict):
         st.markdown("## 🎯 Hasil Analisis Kandidat")
         st.markdown(f"**Jumlah Kandidat Dianalisis:** {len(results['ranking'])}")
         st.markdown(f"**Domain:** {st.session_state.selected_domain.title()}")
+        if results.get("degraded"):
+            st.warning("⚠️ Sebagian tahap memakai mode terdegradasi: " + "; ".join(results["degraded"]))
         
         tab1, tab2, tab3, tab4 = st.tabs([
             "🏆 Ranking", 
@@ -55,11 +103,15 @@ def display_scoring_results(results: Dict):
         
         with tab1:
             st.subheader("🏆 Hasil Ranking Kandidat")
+            show_ranking_diff(results.get("ranking_diff"))
             ranking_data = []
             for candidate in results["ranking"]:
+                name = candidate.get("name", f"Kandidat {candidate['candidate_id']}")
+                if candidate.get("duplicate_of"):
+                    name = f"{name} (duplikat dari {candidate['duplicate_of']})"
                 row = {
                     "Ranking": candidate["rank"],
-                    "Nama": candidate.get("name", f"Kandidat {candidate['candidate_id']}"),
+                    "Nama": name,
                     "AI Score": f"{candidate['ai_score']:.1f}",
                     "Total Score": f"{candidate['total_score']:.1f}",
                     "Level": candidate["level"].title()
@@ -174,10 +226,11 @@ def display_scoring_results(results: Dict):
                                 try:
                                     from core.rag_chain import ResumeRagChain
                                     rag_chain = ResumeRagChain(domain=st.session_state.selected_domain)
-                                    new_analysis = rag_chain.generate_llm_narrative_analysis(
+                                    new_analysis = run_async(rag_chain.get_narrative(
                                         results,
-                                        st.session_state.get("last_jd_text")
-                                    )
+                                        st.session_state.get("last_jd_text"),
+                                        force=True
+                                    ))
                                     if new_analysis and not str(new_analysis).startswith("⚠️"):
                                         st.session_state["last_narrative_analysis"] = new_analysis
                                         results["narrative_analysis"] = new_analysis
@@ -203,10 +256,11 @@ def display_scoring_results(results: Dict):
                                         try:
                                             from core.rag_chain import ResumeRagChain
                                             rag_chain = ResumeRagChain(domain=st.session_state.selected_domain)
-                                            new_analysis = rag_chain.generate_llm_narrative_analysis(
+                                            new_analysis = run_async(rag_chain.get_narrative(
                                                 results,
-                                                st.session_state.get("last_jd_text")
-                                            )
+                                                st.session_state.get("last_jd_text"),
+                                                force=True
+                                            ))
                                             if new_analysis:
                                                 st.session_state["last_narrative_analysis"] = new_analysis
                                                 results["narrative_analysis"] = new_analysis
@@ -226,10 +280,11 @@ def display_scoring_results(results: Dict):
                                 try:
                                     from core.rag_chain import ResumeRagChain
                                     rag_chain = ResumeRagChain(domain=st.session_state.selected_domain)
-                                    new_analysis = rag_chain.generate_llm_narrative_analysis(
+                                    new_analysis = run_async(rag_chain.get_narrative(
                                         results,
-                                        st.session_state.get("last_jd_text")
-                                    )
+                                        st.session_state.get("last_jd_text"),
+                                        force=True
+                                    ))
                                     if new_analysis:
                                         st.session_state["last_narrative_analysis"] = new_analysis
                                         results["narrative_analysis"] = new_analysis
@@ -259,10 +314,10 @@ def display_scoring_results(results: Dict):
                             rag_chain = ResumeRagChain(domain=st.session_state.selected_domain)
                             analysis_results = results if results else st.session_state.get("last_scoring_results", {})
                             if analysis_results and "ranking" in analysis_results:
-                                new_analysis = rag_chain.generate_llm_narrative_analysis(
+                                new_analysis = run_async(rag_chain.get_narrative(
                                     analysis_results,
                                     st.session_state.get("last_jd_text")
-                                )
+                                ))
                                 if new_analysis and str(new_analysis).strip():
                                     st.session_state["last_narrative_analysis"] = new_analysis
                                     results["narrative_analysis"] = new_analysis
@@ -388,6 +443,17 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
         help="Pilih domain untuk menyesuaikan kriteria penilaian dan analisis."
     )
     
+    with st.sidebar.expander("📈 Statistik Panggilan LLM", expanded=False):
+        llm_stats = get_llm_call_stats()
+        st.caption(f"Dikirim ke Groq: {llm_stats['issued']} | Digabung (coalesced): {llm_stats['coalesced']} | Sedang berjalan: {llm_stats['in_flight']}")
+        for model, limiter_stats in all_limiter_stats().items():
+            waiting = ", ".join(f"{name}: {count}" for name, count in limiter_stats["waiting"].items())
+            p95 = ", ".join(f"{name}: {wait:.2f}s" for name, wait in limiter_stats["queue_wait_p95"].items())
+            st.caption(f"{model} — antre ({waiting}) | p95 tunggu antrean ({p95})")
+        for model, circuit in all_circuit_stats().items():
+            if circuit["state"] != "closed":
+                st.caption(f"⚠️ {model} — circuit {circuit['state']} setelah {circuit['failures']} kegagalan beruntun")
+    
     st.sidebar.header("📋 Use Cases")
     use_case = st.sidebar.radio(
         "Pilih Use Case",
@@ -400,6 +466,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
     if use_case == "Candidate Search by Job Description":
         st.header("🔍 Candidate Search by Job Description")
         jd_file = st.file_uploader("Upload Job Description (PDF/DOCX)", type=["pdf", "docx"])
+        recency = st.selectbox("Resume yang diunggah dalam", list(UPLOAD_RECENCY_OPTIONS), key="search_recency")
         if jd_file:
             try:
                 jd_text, error = parse_jd(jd_file)
@@ -407,7 +474,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
                     st.error(f"Gagal memproses JD: {error}")
                     logger.error(f"JD parsing error: {error}")
                 else:
-                    inputs = {"jd_text": jd_text}
+                    inputs = {"jd_text": jd_text, "uploaded_within_days": UPLOAD_RECENCY_OPTIONS[recency]}
                     st.session_state.last_jd_text = jd_text
             except Exception as e:
                 error_msg = f"Gagal memparsing JD: {str(e)}"
@@ -436,8 +503,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
                     logger.error(f"Resume parsing error: {error}")
                 else:
                     st.session_state.uploaded_resumes["Candidate Profiling / Resume QA"] = (resume_text, resume_file.name)
-                    from core.retriever import add_resume_to_vector_store
-                    add_resume_to_vector_store(resume_text, resume_file.name)
+                    schedule_prewarm([(resume_text, resume_file.name)], st.session_state.selected_domain)
             except Exception as e:
                 st.error(f"Failed to parse resume: {str(e)}")
                 logger.error(f"Resume parsing exception: {str(e)}")
@@ -479,8 +545,6 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
                         text, error = parse_resume(file, file.name)
                         if text:
                             valid_resumes.append((text, file.name))
-                            from core.retriever import add_resume_to_vector_store
-                            add_resume_to_vector_store(text, file.name)
                         if error:
                             error_messages.append(error)
                             logger.error(f"Resume parsing error for {file.name}: {error}")
@@ -488,6 +552,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
                         error_messages.append(f"Failed to parse {file.name}: {str(e)}")
                         logger.error(f"Resume parsing exception for {file.name}: {str(e)}")
                 
+                schedule_prewarm(valid_resumes, st.session_state.selected_domain)
                 st.session_state.uploaded_resumes["Compare Multiple Candidates"] = valid_resumes
                 st.session_state.upload_errors = error_messages
         else:
@@ -500,9 +565,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
             if uploaded_folder:
                 try:
                     valid_resumes, error_messages = parse_uploaded_folder(uploaded_folder)
-                    for text in valid_resumes:
-                        from core.retriever import add_resume_to_vector_store
-                        add_resume_to_vector_store(text, "folder_uploaded_resume")
+                    schedule_prewarm([(text, "folder_uploaded_resume") for text in valid_resumes], st.session_state.selected_domain)
                     st.session_state.uploaded_resumes["Compare Multiple Candidates"] = [(text, "folder_uploaded_resume") for text in valid_resumes]
                     st.session_state.upload_errors = error_messages
                     for error in error_messages:
@@ -516,6 +579,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
             col1, col2 = st.columns([4, 1])
             with col1:
                 st.success(f"Berhasil mengunggah {len(current_resumes)} resume")
+                show_duplicate_notice(current_resumes)
             with col2:
                 if st.button("Clear All Resume", key="clear_compare_resume"):
                     st.session_state.uploaded_resumes["Compare Multiple Candidates"] = []
@@ -564,6 +628,28 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
                         domain_criteria[criterion],
                         key=f"score_criteria_{criterion}_{st.session_state.selected_domain}"
                     )
+            defer_narrative = st.checkbox(
+                "Buat analisis naratif hanya saat diminta di tab Analisis Naratif",
+                key="defer_narrative"
+            )
+        
+        # Bobot berubah: ranking ulang dari fitur yang sudah diekstrak tanpa memanggil LLM.
+        # Hanya untuk hasil dengan domain dan JD yang sama; kriteria domain lain bernama berbeda
+        last_results = st.session_state.get('last_scoring_results')
+        same_scoring_context = bool(last_results) and (
+            last_results.get("domain") == st.session_state.selected_domain.lower()
+            and last_results.get("jd_digest") == text_digest(st.session_state.get("last_jd_text") or "")
+        )
+        if same_scoring_context and last_results.get("ranking") and last_results.get("criteria") != criteria:
+            from core.rag_chain import ResumeRagChain
+            rag_chain = ResumeRagChain(domain=st.session_state.selected_domain)
+            reranked = rag_chain.rerank_candidates(last_results, criteria)
+            if "error" not in reranked:
+                st.session_state["last_scoring_results"] = reranked
+                st.session_state["last_narrative_analysis"] = reranked.get("narrative_analysis", "")
+                st.rerun()
+            else:
+                st.error(f"❌ Gagal menghitung ulang ranking: {reranked['error']}")
         
         upload_option = st.radio(
             "Opsi Upload:", 
@@ -588,8 +674,6 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
                         text, error = parse_resume(file, file.name)
                         if text:
                             valid_resumes.append((text, file.name))
-                            from core.retriever import add_resume_to_vector_store
-                            add_resume_to_vector_store(text, file.name)
                         if error:
                             error_messages.append(error)
                             logger.error(f"Resume parsing error for {file.name}: {error}")
@@ -597,6 +681,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
                         error_messages.append(f"Failed to parse {file.name}: {str(e)}")
                         logger.error(f"Resume parsing exception for {file.name}: {str(e)}")
                 
+                schedule_prewarm(valid_resumes, st.session_state.selected_domain)
                 st.session_state.uploaded_resumes["Compare with Scoring"] = valid_resumes
                 st.session_state.upload_errors = error_messages
                 current_resumes = valid_resumes  # Update current_resumes immediately
@@ -611,9 +696,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
             if uploaded_folder:
                 try:
                     valid_resumes, error_messages = parse_uploaded_folder(uploaded_folder)
-                    for text in valid_resumes:
-                        from core.retriever import add_resume_to_vector_store
-                        add_resume_to_vector_store(text, "folder_uploaded_resume")
+                    schedule_prewarm([(text, "folder_uploaded_resume") for text in valid_resumes], st.session_state.selected_domain)
                     st.session_state.uploaded_resumes["Compare with Scoring"] = [(text, "folder_uploaded_resume") for text in valid_resumes]
                     st.session_state.upload_errors = error_messages
                     current_resumes = [(text, "folder_uploaded_resume") for text in valid_resumes]  # Update current_resumes immediately
@@ -632,6 +715,7 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
             col1, col2 = st.columns([4, 1])
             with col1:
                 st.success(f"Berhasil mengunggah {len(current_resumes)} resume")
+                show_duplicate_notice(current_resumes)
             with col2:
                 if st.button("Clear All Resume", key="clear_score_resume"):
                     st.session_state.uploaded_resumes["Compare with Scoring"] = []
@@ -656,12 +740,16 @@ def render_ui() -> Tuple[str, Union[Dict, List, None], Optional[str]]:
             inputs = {
                 "resume_data": current_resumes,
                 "criteria": criteria,
+                "defer_narrative": defer_narrative,
                 "domain": st.session_state.selected_domain
             }
             
-            # Proses langsung setelah resume diunggah, hanya jika belum diproses
-            if not st.session_state.processed_flag:
+            # Proses langsung setelah resume diunggah, dan lagi jika set resume berubah
+            # (resume baru dinilai secara inkremental terhadap hasil sebelumnya)
+            resume_digests = sorted(text_digest(text) for text, _ in current_resumes)
+            if not st.session_state.processed_flag or st.session_state.get("processed_digests") != resume_digests:
                 st.session_state.processed_flag = True  # Set flag untuk mencegah pemrosesan ganda
+                st.session_state.processed_digests = resume_digests
                 return use_case, inputs, question  # Kembalikan inputs untuk diproses di main.py
         else:
             st.session_state.processed_flag = False  # Reset flag jika tidak ada resume
@@ -0,0 +1,58 @@
+import argparse
+import glob
+import os
+import time
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from core.embedding import cpu_optimized_embeddings
+from utils.resume_parser import parse_resume
+from utils.resume_chunker import resume_chunker
+
+
+def sample_chunks(pattern: str):
+    """Chunks of the sample resumes, split the same way as the vector store"""
+    chunks = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "rb") as f:
+            text, _ = parse_resume(f, os.path.basename(path))
+        if text:
+            chunks.extend(chunk["text"] for chunk in resume_chunker.chunk(text, os.path.basename(path)))
+    return chunks
+
+
+def throughput(embed, chunks, rounds: int):
+    embed(chunks[:8])  # pemanasan
+    started = time.perf_counter()
+    for _ in range(rounds):
+        vectors = embed(chunks)
+    return len(chunks) * rounds / (time.perf_counter() - started), np.asarray(vectors, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput embedding CPU: presisi penuh vs mode teroptimasi")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--resumes", default="data/resumes/*.pdf")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    chunks = sample_chunks(args.resumes)
+    if not chunks:
+        raise SystemExit(f"Tidak ada resume yang cocok dengan {args.resumes}")
+    model = SentenceTransformer(args.model, device="cpu")
+
+    baseline_rate, baseline = throughput(
+        lambda texts: model.encode(texts, normalize_embeddings=True, show_progress_bar=False), chunks, args.rounds
+    )
+    print(f"{len(chunks)} chunk dari {args.resumes}, {args.rounds} putaran")
+    print(f"{'mode':<28}{'chunk/detik':>12}{'speedup':>9}{'cos min':>9}")
+    print(f"{'float32, batch default':<28}{baseline_rate:>12.1f}{1.0:>9.2f}{1.0:>9.4f}")
+
+    for label, quantize in (("float32, bucketed", False), ("int8 dinamis, bucketed", True)):
+        embeddings = cpu_optimized_embeddings(model, quantize=quantize)
+        rate, vectors = throughput(embeddings.embed_documents, chunks, args.rounds)
+        agreement = float(np.min(np.sum(vectors * baseline, axis=1)))
+        print(f"{label:<28}{rate:>12.1f}{rate / baseline_rate:>9.2f}{agreement:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
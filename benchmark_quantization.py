@@ -0,0 +1,79 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from core.quantized_index import QuantizedIndex, QUANTIZED_MODES, DEFAULT_RESCORE_FACTOR
+
+
+def synthetic_embeddings(n: int, dim: int, seed: int = 42) -> np.ndarray:
+    """Clustered, L2-normalized vectors resembling sentence embeddings of resume chunks"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 200, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def store_embeddings() -> np.ndarray:
+    """Embeddings currently stored in the Chroma collection"""
+    from langchain_community.vectorstores import Chroma
+    from core.retriever import CHROMA_DIR
+    stored = Chroma(persist_directory=CHROMA_DIR).get(include=["embeddings"])
+    return np.asarray(stored["embeddings"], dtype=np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def timed(search, queries: np.ndarray):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        latencies.append(time.perf_counter() - started)
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark float32 vs quantized embedding search")
+    parser.add_argument("--n", type=int, default=200_000, help="Jumlah vektor sintetis")
+    parser.add_argument("--dim", type=int, default=384, help="Dimensi (all-MiniLM-L6-v2 = 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=DEFAULT_RESCORE_FACTOR)
+    parser.add_argument("--from-store", action="store_true", help="Gunakan embedding dari vector store Chroma")
+    args = parser.parse_args()
+
+    vectors = store_embeddings() if args.from_store else synthetic_embeddings(args.n, args.dim)
+    rng = np.random.default_rng(7)
+    # Query = vektor tersimpan dengan derau, seperti JD yang mirip dengan chunk resume
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    k = min(args.k, len(vectors))
+
+    exact, latency = timed(lambda q: exact_top_k(vectors, q, k), queries)
+    print(f"{len(vectors)} vektor x {vectors.shape[1]} dimensi, {len(queries)} query, k={k}")
+    print(f"{'mode':<22}{'memori (MB)':>12}{'p50 (ms)':>10}{'p95 (ms)':>10}{'recall@k':>10}")
+    print(f"{'float32 (baseline)':<22}{vectors.nbytes / 2**20:>12.1f}"
+          f"{np.percentile(latency, 50):>10.2f}{np.percentile(latency, 95):>10.2f}{1.0:>10.3f}")
+
+    with tempfile.TemporaryDirectory(prefix="quantized_bench_") as workdir:
+        for mode in QUANTIZED_MODES:
+            index = QuantizedIndex(mode)
+            index.add([str(i) for i in range(len(vectors))], [""] * len(vectors), vectors)
+            # Seperti di aplikasi: setelah disimpan, vektor float32 dibaca dari disk (memory-mapped)
+            index.save(os.path.join(workdir, mode))
+            for factor in (0, args.rescore_factor):
+                results, latency = timed(lambda q: [row for row, _ in index.search(q, k, factor)], queries)
+                recall = np.mean([len(set(found) & set(truth.tolist())) / k for found, truth in zip(results, exact)])
+                label = f"{mode} + rescore x{factor}" if factor else mode
+                print(f"{label:<22}{index.memory_bytes() / 2**20:>12.1f}"
+                      f"{np.percentile(latency, 50):>10.2f}{np.percentile(latency, 95):>10.2f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
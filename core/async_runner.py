@@ -0,0 +1,106 @@
+import asyncio
+import contextvars
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRunner:
+    def __init__(self, name: str = "async-runner"):
+        """
+        Long-lived event loop on a daemon thread that all chain coroutines are submitted to.
+
+        One loop per process lets LLM calls from different steps of a user action overlap
+        and keeps async clients bound to a loop that outlives a single call.
+
+        Args:
+            name: Name of the background thread
+        """
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run_loop():
+                    asyncio.set_event_loop(loop)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run_loop, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                logger.info(f"Started background event loop '{self.name}'")
+            return self._loop
+
+    def in_runner_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """Schedule a coroutine on the background loop (with the caller's contextvars) and return a concurrent Future"""
+        loop = self._ensure_started()
+        context = contextvars.copy_context()
+
+        async def run_in_caller_context():
+            # Konteks pemanggil (mis. prioritas LLM) ikut terbawa ke task di loop latar belakang
+            for var, value in context.items():
+                var.set(value)
+            return await coro
+
+        return asyncio.run_coroutine_threadsafe(run_in_caller_context(), loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the background loop and block until it finishes"""
+        if self.in_runner_thread():
+            coro.close()
+            raise RuntimeError("run_async tidak boleh dipanggil dari dalam event loop runner; gunakan await")
+        return self.submit(coro).result(timeout)
+
+
+async_runner = AsyncRunner()
+
+
+def run_async(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """Synchronous entry point for chain coroutines (replaces per-call asyncio.run)"""
+    return async_runner.run(coro, timeout)
+
+
+def map_in_threads(func: Callable[[Any], Any], items: Iterable[Any],
+                   progress: Optional[Callable[[int, int], None]] = None) -> List[Any]:
+    """
+    Apply a blocking function to every item concurrently, preserving order
+
+    Args:
+        func: Blocking function applied to each item
+        items: Inputs
+        progress: Optional callback(completed, total) invoked as items finish
+    """
+    items = list(items)
+    completed = [0]
+    lock = threading.Lock()
+
+    def tracked(item):
+        result = func(item)
+        if progress:
+            with lock:
+                completed[0] += 1
+                done = completed[0]
+            progress(done, len(items))
+        return result
+
+    if len(items) <= 1:
+        return [tracked(item) for item in items]
+
+    async def gather():
+        return await asyncio.gather(*(asyncio.to_thread(tracked, item) for item in items))
+
+    return list(run_async(gather()))
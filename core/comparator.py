@@ -1,11 +1,17 @@
 from typing import List
 from langchain.prompts import ChatPromptTemplate
 from utils.resume_standardizer import ResumeStandardizer
+from core.llm_client import invoke_llm
+from utils.prompt_compactor import prompt_compactor
+from core.hierarchical_compare import HierarchicalComparator, MAP_REDUCE_THRESHOLD
+from core.async_runner import run_async
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CANDIDATES_TOKEN_BUDGET = 4000
+
 class ResumeComparator:
     def __init__(self, domain: str = "general"):
         """
@@ -90,14 +96,24 @@ class ResumeComparator:
         """Compare multiple standardized resumes"""
         try:
             standardized_resumes, _ = self.standardizer.standardize_multiple(resume_texts)
+            labels = [f"Kandidat {i+1}" for i in range(len(standardized_resumes))]
+            
+            if len(standardized_resumes) > MAP_REDUCE_THRESHOLD:
+                hierarchical = HierarchicalComparator(llm, self.domain, self._get_domain_context())
+                finalists, _ = run_async(
+                    hierarchical.select_finalists(list(zip(standardized_resumes, labels)))
+                )
+                labels = [name for name, _ in finalists]
+                standardized_resumes = [card for _, card in finalists]
+            
+            compacted_resumes, _ = prompt_compactor.fit_candidates(standardized_resumes, CANDIDATES_TOKEN_BUDGET)
             
             formatted_resumes = "\n\n---\n\n".join(
-                f"Kandidat {i+1} (Standardisasi):\n{text}" 
-                for i, text in enumerate(standardized_resumes)
+                f"{label} (Standardisasi):\n{text}" 
+                for label, text in zip(labels, compacted_resumes)
             )
             
-            chain = self.comparison_prompt | llm
-            result = chain.invoke({"resumes": formatted_resumes}).content
+            result = invoke_llm(self.comparison_prompt, llm, {"resumes": formatted_resumes}).content
             return result
             
         except Exception as e:
@@ -1,22 +1,124 @@
 from langchain.embeddings.sentence_transformer import SentenceTransformerEmbeddings
+from langchain_core.embeddings import Embeddings
+from typing import List
 import os
+import threading
+import logging
 import torch
 import streamlit as st
+from core.embedding_cache import CachedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+# Mode inferensi CPU: "default" = presisi penuh, "quantized" = kuantisasi dinamis int8 pada layer Linear.
+# Opt-in: vector store yang ada berisi vektor presisi penuh; ukur dulu dengan benchmark_embedding.py
+EMBEDDING_CPU_MODE = os.getenv("EMBEDDING_CPU_MODE", "default")
+# Jumlah thread intra-op torch untuk embedding (0 = default torch)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Batas token terpadding per batch (panjang chunk terpanjang x jumlah chunk)
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8192"))
+EMBEDDING_MAX_BATCH = 64
+
+# Satu model per proses: dibagi antar sesi dan dapat dipakai dari worker job
+_embedding_model = None
+_embedding_lock = threading.Lock()
+
+class BucketedSentenceEmbeddings(Embeddings):
+    def __init__(self, model, normalize: bool = True,
+                 batch_tokens: int = EMBEDDING_BATCH_TOKENS, max_batch: int = EMBEDDING_MAX_BATCH):
+        """
+        SentenceTransformer embeddings encoded in length-bucketed batches
+
+        Chunks are sorted by token length and grouped so that each batch stays under a
+        padded-token budget; short chunks share large batches and long chunks are not
+        padded against them.
+
+        Args:
+            model: SentenceTransformer model (optionally dynamically quantized)
+            normalize: L2-normalize the embeddings
+            batch_tokens: Maximum padded tokens per batch
+            max_batch: Maximum chunks per batch
+        """
+        self.model = model
+        self.normalize = normalize
+        self.batch_tokens = batch_tokens
+        self.max_batch = max_batch
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        max_length = self.model.get_max_seq_length() or 512
+        encoded = self.model.tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def batches(self, texts: List[str]) -> List[List[int]]:
+        """Indexes of `texts` grouped into batches of similar token length"""
+        lengths = self._token_lengths(texts)
+        batches, current = [], []
+        for index in sorted(range(len(texts)), key=lambda i: lengths[i]):
+            # Urutan naik: chunk saat ini adalah yang terpanjang di batch dan menentukan padding
+            if current and ((len(current) + 1) * lengths[index] > self.batch_tokens
+                            or len(current) >= self.max_batch):
+                batches.append(current)
+                current = []
+            current.append(index)
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = [[] for _ in texts]
+        with torch.inference_mode():
+            for batch in self.batches(texts):
+                encoded = self.model.encode(
+                    [texts[i] for i in batch], batch_size=len(batch),
+                    normalize_embeddings=self.normalize, convert_to_numpy=True, show_progress_bar=False
+                )
+                for index, vector in zip(batch, encoded):
+                    vectors[index] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def cpu_optimized_embeddings(model, quantize: bool = True) -> BucketedSentenceEmbeddings:
+    """CPU inference mode: thread control, optional dynamic int8 quantization of Linear layers, bucketed batching"""
+    if EMBEDDING_THREADS > 0:
+        torch.set_num_threads(EMBEDDING_THREADS)
+    if quantize:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return BucketedSentenceEmbeddings(model)
+
+def embedding_model_name() -> str:
+    """Configured sentence-transformers model name"""
+    return st.secrets.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 
 def get_embedding_model():
-    """Load optimized embedding model with session state caching"""
-    if 'embedding_model' not in st.session_state:
+    """Load optimized embedding model once per process"""
+    global _embedding_model
+    with _embedding_lock:
+        if _embedding_model is not None:
+            return _embedding_model
+
         # DIUBAH: Gunakan st.secrets.get() untuk mengambil nama model dengan fallback
-        model_name = st.secrets.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        model_name = embedding_model_name()
         device = "cuda" if torch.cuda.is_available() else "cpu"
-        
+
         # Tambahkan validasi untuk Streamlit Cloud (yang hanya punya CPU)
         if 'st' in globals() and hasattr(st, 'secrets'):
             device = 'cpu'
-            
-        st.session_state.embedding_model = SentenceTransformerEmbeddings(
+
+        embeddings = SentenceTransformerEmbeddings(
             model_name=model_name,
             model_kwargs={'device': device, 'trust_remote_code': True},
             encode_kwargs={'normalize_embeddings': True}
         )
-    return st.session_state.embedding_model
+        cache_key = model_name
+        if device == "cpu":
+            quantize = EMBEDDING_CPU_MODE == "quantized"
+            embeddings = cpu_optimized_embeddings(embeddings.client, quantize=quantize)
+            # Vektor hasil model terkuantisasi sedikit berbeda, jadi di-cache terpisah
+            cache_key = f"{model_name}:int8-dynamic" if quantize else model_name
+            logger.info(f"Embedding model {model_name} on CPU (mode={EMBEDDING_CPU_MODE}, threads={torch.get_num_threads()})")
+
+        # Chunk yang identik (upload duplikat, JD yang sama, reindeks) dilayani dari cache tanpa inferensi
+        _embedding_model = CachedEmbeddings(embeddings, model_name=cache_key)
+        return _embedding_model
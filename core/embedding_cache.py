@@ -0,0 +1,219 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache")
+# float16 menghemat separuh ruang disk dengan selisih presisi yang dapat diabaikan untuk cosine similarity
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+# Batas parameter per query IN (...) SQLite
+LOOKUP_BATCH_SIZE = 500
+
+
+def chunk_hash(text: str) -> str:
+    """Content hash used as the cache key of an embedded chunk"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str = EMBEDDING_CACHE_DIR, dtype: str = EMBEDDING_CACHE_DTYPE):
+        """
+        Append-only, memory-mapped embedding store keyed by (model name, chunk hash)
+
+        Vectors live in one raw NumPy file per model and dtype; a SQLite index maps each
+        key to its row. Rows are reserved in a SQLite transaction and indexed only after
+        they are written, so several processes can append to and read from the same store.
+
+        Args:
+            directory: Directory holding the index and the vector files
+            dtype: Storage dtype of the vectors (float32 or float16)
+        """
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.dtype("float32"), np.dtype("float16")):
+            raise ValueError(f"Dtype cache embedding tidak didukung: {dtype}")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self._maps: Dict[str, np.memmap] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=30,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            with self._lock:
+                if not self._schema_ready:
+                    conn.executescript("""
+                        CREATE TABLE IF NOT EXISTS stores (
+                            store TEXT PRIMARY KEY,
+                            dim INTEGER NOT NULL,
+                            rows INTEGER NOT NULL
+                        );
+                        CREATE TABLE IF NOT EXISTS vectors (
+                            store TEXT NOT NULL,
+                            chunk_hash TEXT NOT NULL,
+                            row INTEGER NOT NULL,
+                            PRIMARY KEY (store, chunk_hash)
+                        );
+                    """)
+                    self._schema_ready = True
+        return conn
+
+    def _store_name(self, model_name: str) -> str:
+        return f"{model_name}|{self.dtype.name}"
+
+    def _data_path(self, store: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", store) + ".bin")
+
+    def _rows_view(self, store: str, dim: int, min_rows: int) -> np.memmap:
+        """Read-only memory map of the store covering at least `min_rows` rows (remapped as the file grows)"""
+        with self._lock:
+            view = self._maps.get(store)
+            if view is None or view.shape[0] < min_rows:
+                path = self._data_path(store)
+                rows = os.path.getsize(path) // (dim * self.dtype.itemsize)
+                view = np.memmap(path, dtype=self.dtype, mode="r", shape=(rows, dim))
+                self._maps[store] = view
+            return view
+
+    def get_many(self, model_name: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Cached float32 vectors for the given chunk hashes (misses are omitted)"""
+        store = self._store_name(model_name)
+        hashes = list(dict.fromkeys(hashes))
+        conn = self._connection()
+        meta = conn.execute("SELECT dim FROM stores WHERE store = ?", (store,)).fetchone()
+        if not meta or not hashes:
+            return {}
+
+        rows: Dict[str, int] = {}
+        for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(conn.execute(
+                f"SELECT chunk_hash, row FROM vectors WHERE store = ? AND chunk_hash IN ({placeholders})",
+                [store] + batch
+            ).fetchall())
+        if not rows:
+            return {}
+
+        view = self._rows_view(store, meta[0], max(rows.values()) + 1)
+        return {h: np.array(view[row], dtype=np.float32) for h, row in rows.items()}
+
+    def put_many(self, model_name: str, vectors: Dict[str, List[float]]):
+        """Append vectors for new chunk hashes and index them"""
+        if not vectors:
+            return
+        store = self._store_name(model_name)
+        hashes = list(vectors)
+        data = np.ascontiguousarray(np.asarray([vectors[h] for h in hashes], dtype=self.dtype))
+        dim = data.shape[1]
+
+        conn = self._connection()
+        # Reservasi baris secara atomik agar proses lain menulis ke rentang yang berbeda
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            meta = conn.execute("SELECT dim, rows FROM stores WHERE store = ?", (store,)).fetchone()
+            if meta and meta[0] != dim:
+                raise ValueError(f"Dimensi embedding {dim} tidak cocok dengan cache {store} ({meta[0]})")
+            start_row = meta[1] if meta else 0
+            conn.execute(
+                "INSERT OR REPLACE INTO stores (store, dim, rows) VALUES (?, ?, ?)",
+                (store, dim, start_row + len(hashes))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        fd = os.open(self._data_path(store), os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+b") as f:
+            f.seek(start_row * dim * self.dtype.itemsize)
+            f.write(data.tobytes())
+            f.flush()
+
+        # Indeks ditulis setelah data, sehingga pembaca tidak pernah melihat baris yang belum lengkap
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR IGNORE INTO vectors (store, chunk_hash, row) VALUES (?, ?, ?)",
+            [(store, h, start_row + i) for i, h in enumerate(hashes)]
+        )
+        conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, Dict]:
+        """Indexed vectors and reserved rows per store"""
+        conn = self._connection()
+        return {
+            store: {"dim": dim, "rows": rows, "indexed": conn.execute(
+                "SELECT COUNT(*) FROM vectors WHERE store = ?", (store,)
+            ).fetchone()[0]}
+            for store, dim, rows in conn.execute("SELECT store, dim, rows FROM stores").fetchall()
+        }
+
+
+embedding_cache = EmbeddingCache()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: Optional[EmbeddingCache] = None):
+        """
+        Embeddings wrapper that serves repeated chunks from the embedding cache
+
+        Only chunks missing from the cache (deduplicated within a call) reach the model.
+        Queries (JDs, questions, JD facets) bypass the cache: the store is append-only, so
+        it should grow with the indexed corpus rather than with usage.
+
+        Args:
+            embeddings: Underlying embedding model
+            model_name: Model identifier used in the cache key
+            cache: Embedding cache (defaults to the process-wide store)
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or embedding_cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [chunk_hash(text) for text in texts]
+        try:
+            found = self.cache.get_many(self.model_name, hashes)
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed: {str(e)}")
+            found = {}
+
+        missing = {h: text for h, text in zip(hashes, texts) if h not in found}
+        self.hits += len(texts) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            try:
+                self.cache.put_many(self.model_name, computed)
+            except Exception as e:
+                logger.warning(f"Embedding cache write failed: {str(e)}")
+            found.update({h: np.asarray(vector, dtype=np.float32) for h, vector in computed.items()})
+
+        return [found[h].tolist() for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several queries in one batched, uncached model call"""
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,99 @@
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+from core.embedding import get_embedding_model
+from core.retriever import candidate_chunk_vectors, has_domain_tags, metadata_filter, search_vectors
+from utils.jd_facets import jd_facet_extractor
+
+logger = logging.getLogger(__name__)
+
+# Bobot facet pada skor cakupan; facet yang tidak ada di JD tidak ikut dihitung
+FACET_WEIGHTS = {"skills": 0.5, "experience": 0.3, "education": 0.2, "overall": 1.0}
+# Chunk teratas per facet yang dikumpulkan sebelum diagregasi per kandidat
+FACET_SEARCH_K = 20
+FACET_TOP_CANDIDATES = 5
+
+
+def coverage_matrix(jd_text: str, domain: Optional[str] = None, k: int = FACET_SEARCH_K,
+                    top_n: int = FACET_TOP_CANDIDATES, uploaded_after: Optional[float] = None) -> Dict:
+    """
+    Coverage of the JD's requirement facets by the best-matching candidates
+
+    All facets are embedded in one batched call and searched together. A candidate's score
+    for a facet is the best similarity of any of its chunks to that facet, computed over all
+    of its stored chunks (not only the retrieved ones); candidates are ranked by the weighted
+    mean over facets.
+
+    Args:
+        jd_text: Job description
+        domain: Search within this domain's candidates (plus general resumes)
+        k: Chunks retrieved per facet
+        top_n: Candidates returned
+        uploaded_after: Only consider resumes first seen at or after this Unix time
+
+    Returns:
+        {"facets": facet names, "candidates": [{"candidate_id", "source", "text" (first retrieved chunk),
+        "scores" (per facet), "coverage"}]} in ranking order
+    """
+    facets = jd_facet_extractor.extract(jd_text)
+    names = [facet["facet"] for facet in facets]
+    vectors = np.asarray(get_embedding_model().embed_queries([facet["text"] for facet in facets]), dtype=np.float32)
+
+    where = metadata_filter(domain=domain, uploaded_after=uploaded_after)
+    if where is not None and not has_domain_tags():
+        # Vector store lama yang chunk-nya belum bertag domain: filter domain tidak akan cocok dengan apa pun
+        where = None
+    hits = search_vectors(vectors, k, where)
+
+    # Kandidat dikenali dari candidate_id; chunk lama tanpa tag dikelompokkan per file sumber
+    candidates: Dict[str, Dict] = {}
+    for facet_hits in hits:
+        for metadata, text, _ in facet_hits:
+            key = metadata.get("candidate_id") or metadata.get("source") or text
+            candidates.setdefault(key, {"candidate_id": metadata.get("candidate_id"),
+                                        "source": metadata.get("source", ""), "text": text})
+    if not candidates:
+        return {"facets": names, "candidates": []}
+
+    keys = list(candidates)
+    position = {key: row for row, key in enumerate(keys)}
+    scores = np.zeros((len(keys), len(names)), dtype=np.float32)
+    for column, facet_hits in enumerate(hits):
+        for metadata, text, score in facet_hits:
+            row = position[metadata.get("candidate_id") or metadata.get("source") or text]
+            scores[row, column] = max(scores[row, column], score)
+
+    # Skor lengkap: semua chunk kandidat terhadap semua facet dalam satu perkalian matriks
+    chunk_metadatas, chunk_vectors = candidate_chunk_vectors(
+        [key for key in keys if candidates[key]["candidate_id"]]
+    )
+    if chunk_metadatas:
+        rows = np.fromiter((position[metadata["candidate_id"]] for metadata in chunk_metadatas), dtype=np.intp)
+        np.maximum.at(scores, rows, chunk_vectors @ vectors.T)
+    scores = np.clip(scores, 0.0, 1.0)
+
+    weights = np.asarray([FACET_WEIGHTS.get(name, 1.0) for name in names], dtype=np.float32)
+    coverage = scores @ (weights / weights.sum())
+    ranking = np.argsort(-coverage, kind="stable")[:top_n]
+    logger.debug(f"Facet search: {len(names)} facets, {len(keys)} candidates")
+    return {
+        "facets": names,
+        "candidates": [
+            {
+                **candidates[keys[row]],
+                "scores": {name: round(float(scores[row, column]), 3) for column, name in enumerate(names)},
+                "coverage": round(float(coverage[row]), 3),
+            }
+            for row in ranking
+        ],
+    }
+
+
+def format_coverage(matrix: Dict, names: List[str]) -> str:
+    """Markdown table of a coverage matrix for prompts, with one display name per candidate"""
+    header = ["Kandidat"] + [facet.title() for facet in matrix["facets"]] + ["Cakupan"]
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    for name, candidate in zip(names, matrix["candidates"]):
+        cells = [f"{candidate['scores'][facet]:.2f}" for facet in matrix["facets"]]
+        lines.append("| " + " | ".join([name] + cells + [f"{candidate['coverage']:.2f}"]) + " |")
+    return "\n".join(lines)
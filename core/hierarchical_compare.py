@@ -0,0 +1,164 @@
+import asyncio
+import re
+import logging
+from typing import Callable, List, Optional, Tuple
+from langchain_core.prompts import ChatPromptTemplate
+from core.llm_client import ainvoke_llm
+from core.resilience import record_degradation
+from utils.prompt_compactor import prompt_compactor
+
+logger = logging.getLogger(__name__)
+
+# Di atas ambang ini perbandingan dilakukan bertingkat (map-reduce)
+MAP_REDUCE_THRESHOLD = 8
+GROUP_SIZE = 5
+WINNERS_PER_GROUP = 2
+CARD_SOURCE_TOKEN_BUDGET = 700
+
+
+def _strip_thinking(text: str) -> str:
+    return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL | re.IGNORECASE).strip()
+
+
+class HierarchicalComparator:
+    def __init__(self, llm, domain: str = "general", domain_context: str = "",
+                 clean_output: Optional[Callable[[str], str]] = None):
+        """
+        Map-reduce comparison for large candidate sets
+
+        Candidates are summarised in parallel into compact cards, compared in
+        bounded groups, and group winners advance until a final shortlist remains.
+
+        Args:
+            llm: Chat model used for every round
+            domain: Target domain (it, hr, finance, marketing, general, etc.)
+            domain_context: Domain-specific guidance appended to prompts
+            clean_output: Post-processing for model output (removes thinking traces)
+        """
+        self.llm = llm
+        self.domain = domain.lower()
+        self.clean_output = clean_output or _strip_thinking
+        self._init_prompts(domain_context)
+
+    def _init_prompts(self, domain_context: str):
+        """Initialize card and group prompts"""
+        self.card_prompt = ChatPromptTemplate.from_template(
+            f"""Ringkas resume kandidat {{name}} untuk domain {self.domain.upper()} menjadi kartu profil singkat (maksimal 120 kata):
+            {{resume_text}}
+            {{jd_context}}
+
+            Format:
+            - Level & pengalaman:
+            - Keterampilan utama:
+            - Pencapaian terpenting:
+            - Kekurangan yang terlihat:
+            Jangan sertakan proses berpikir Anda dalam jawaban.
+            """
+        )
+
+        self.group_prompt = ChatPromptTemplate.from_template(
+            f"""Bandingkan kandidat berikut untuk domain {self.domain.upper()}{{jd_context}}:
+            {{candidates}}
+
+            {domain_context}
+
+            Berikan dalam bahasa Indonesia perbandingan singkat (maksimal 5 kalimat),
+            lalu pada baris terakhir tulis tepat {{winners}} ID kandidat terbaik dengan format:
+            PEMENANG: K1, K2
+            Jangan sertakan proses berpikir Anda dalam jawaban.
+            """
+        )
+
+    async def build_cards(self, candidates: List[Tuple[str, str]], jd_text: Optional[str] = None) -> List[Tuple[str, str]]:
+        """Map step: summarise every (text, name) candidate into a card concurrently"""
+        jd_context = self._jd_context(jd_text)
+
+        async def build_card(text: str, name: str) -> Tuple[str, str]:
+            compacted, _ = prompt_compactor.compact(text, CARD_SOURCE_TOKEN_BUDGET)
+            try:
+                result = await ainvoke_llm(self.card_prompt, self.llm, {
+                    "name": name,
+                    "resume_text": compacted,
+                    "jd_context": jd_context
+                })
+                return name, self.clean_output(result.content)
+            except Exception as e:
+                logger.warning(f"Card generation failed for {name}, using compacted resume: {str(e)}")
+                record_degradation("Kartu kandidat memakai ringkasan resume terkompaksi")
+                return name, prompt_compactor.compact(text, 200)[0]
+
+        return list(await asyncio.gather(*(build_card(text, name) for text, name in candidates)))
+
+    async def select_finalists(self, candidates: List[Tuple[str, str]],
+                               jd_text: Optional[str] = None) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """
+        Reduce candidates to at most GROUP_SIZE finalists
+
+        Returns:
+            (finalist cards as (name, card), per-round group notes)
+        """
+        cards = await self.build_cards(candidates, jd_text)
+        notes = []
+        round_number = 1
+
+        while len(cards) > GROUP_SIZE:
+            groups = [cards[i:i + GROUP_SIZE] for i in range(0, len(cards), GROUP_SIZE)]
+            logger.info(f"Hierarchical compare round {round_number}: {len(cards)} candidates in {len(groups)} groups")
+            results = await asyncio.gather(*(self._compare_group(group, jd_text) for group in groups))
+
+            cards = []
+            for group_index, (winners, summary) in enumerate(results, start=1):
+                cards.extend(winners)
+                notes.append(
+                    f"Babak {round_number}, grup {group_index}: lolos {', '.join(name for name, _ in winners)}\n{summary}"
+                )
+            round_number += 1
+
+        return cards, notes
+
+    async def _compare_group(self, group: List[Tuple[str, str]], jd_text: Optional[str]) -> Tuple[List[Tuple[str, str]], str]:
+        if len(group) <= WINNERS_PER_GROUP:
+            return group, "Grup kecil, semua kandidat lolos otomatis."
+
+        candidates_formatted = "\n\n".join(
+            f"[K{i + 1}] {name}:\n{card}" for i, (name, card) in enumerate(group)
+        )
+        try:
+            result = await ainvoke_llm(self.group_prompt, self.llm, {
+                "candidates": candidates_formatted,
+                "jd_context": " terhadap deskripsi pekerjaan" + self._jd_context(jd_text) if jd_text else "",
+                "winners": WINNERS_PER_GROUP
+            })
+            output = self.clean_output(result.content)
+        except Exception as e:
+            logger.warning(f"Group comparison failed, keeping first candidates: {str(e)}")
+            record_degradation("Babak penyisihan memakai urutan awal kandidat")
+            return group[:WINNERS_PER_GROUP], f"⚠️ Perbandingan grup gagal: {str(e)}"
+
+        winner_indexes = self.parse_winners(output, len(group), WINNERS_PER_GROUP)
+        summary = re.sub(r'(?im)^\s*PEMENANG:.*$', '', output).strip()
+        return [group[i] for i in winner_indexes], summary
+
+    @staticmethod
+    def parse_winners(output: str, group_size: int, count: int) -> List[int]:
+        """Parse the 'PEMENANG: K1, K3' line into zero-based indexes, padding in group order"""
+        winners = []
+        line_match = re.search(r'PEMENANG:(.*)$', output, re.IGNORECASE | re.MULTILINE)
+        if line_match:
+            for number in re.findall(r'K\s*(\d+)', line_match.group(1), re.IGNORECASE):
+                index = int(number) - 1
+                if 0 <= index < group_size and index not in winners:
+                    winners.append(index)
+        for index in range(group_size):
+            if len(winners) >= count:
+                break
+            if index not in winners:
+                winners.append(index)
+        return winners[:count]
+
+    @staticmethod
+    def _jd_context(jd_text: Optional[str]) -> str:
+        if not jd_text:
+            return ""
+        compacted, _ = prompt_compactor.compact(jd_text, 400)
+        return f"\nDeskripsi Pekerjaan:\n{compacted}"
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "data/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Antrean terpisah untuk pekerjaan spekulatif agar tidak menahan slot job pengguna
+SPECULATIVE_QUEUE_PATH = os.getenv("SPECULATIVE_QUEUE_PATH", "data/speculative_jobs.sqlite3")
+SPECULATIVE_WORKERS = 1
+# Job selesai yang lebih tua dari ini dibersihkan saat proses dimulai
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+# Proses pemilik memperbarui heartbeat job aktifnya; job tanpa heartbeat baru dianggap ditinggalkan
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_SECONDS = 4 * JOB_HEARTBEAT_SECONDS
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# handler(payload, report) -> hasil yang dapat diserialisasi JSON;
+# report(progress 0..1, message, partial) mencatat kemajuan job
+JobHandler = Callable[[Dict, Callable[..., None]], Any]
+
+
+class JobQueue:
+    def __init__(self, db_path: str = JOB_QUEUE_PATH, max_workers: int = JOB_WORKERS, resume_abandoned: bool = False):
+        """
+        SQLite-persisted job queue executed by a local worker pool
+
+        Jobs outlive Streamlit reruns (they run outside the script thread). Each process owns
+        the jobs it submits and keeps their heartbeat fresh; jobs whose owner stopped
+        heartbeating (e.g. after a restart) are abandoned. Several processes may share one
+        database without touching each other's live jobs.
+
+        Args:
+            db_path: Location of the SQLite database file
+            max_workers: Number of jobs executed concurrently
+            resume_abandoned: Re-run abandoned jobs in this process instead of marking them failed
+                (only for jobs nobody waits on, since job IDs live in the submitting session)
+        """
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.resume_abandoned = resume_abandoned
+        self.owner = uuid.uuid4().hex
+        self._handlers: Dict[str, JobHandler] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self._recovered = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            with self._lock:
+                if not self._schema_ready:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS jobs (
+                            id TEXT PRIMARY KEY,
+                            kind TEXT NOT NULL,
+                            session_id TEXT,
+                            status TEXT NOT NULL,
+                            payload TEXT NOT NULL,
+                            progress REAL DEFAULT 0,
+                            message TEXT,
+                            partial TEXT,
+                            result TEXT,
+                            error TEXT,
+                            created_at REAL,
+                            updated_at REAL,
+                            owner TEXT,
+                            heartbeat_at REAL
+                        )
+                    """)
+                    # Database dari versi sebelum kolom pemilik/heartbeat ada
+                    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+                    for column, kind in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                        if column not in columns:
+                            conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                    conn.commit()
+                    self._schema_ready = True
+        return conn
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job-worker")
+                self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+            return self._executor
+
+    def _beat(self):
+        """Keep the heartbeat of this process's queued and running jobs fresh"""
+        while True:
+            try:
+                conn = self._connection()
+                conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)",
+                             (time.time(), self.owner, QUEUED, RUNNING))
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Job heartbeat failed: {str(e)}")
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+
+    def register(self, kind: str, handler: JobHandler):
+        """Register the handler that executes jobs of `kind`"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, payload: Dict, session_id: str = "") -> str:
+        """Persist a new job and schedule it, returning its ID"""
+        if kind not in self._handlers:
+            raise ValueError(f"Jenis job tidak dikenal: {kind}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            """INSERT INTO jobs (id, kind, session_id, status, payload, created_at, updated_at, owner, heartbeat_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job_id, kind, session_id, QUEUED, json.dumps(payload, ensure_ascii=False), now, now, self.owner, now)
+        )
+        conn.commit()
+        self._pool().submit(self._run, job_id)
+        logger.info(f"Queued {kind} job {job_id}")
+        # Job proses yang berhenti sesaat sebelum proses ini dimulai baru usang setelah JOB_STALE_SECONDS
+        self._sweep_abandoned()
+        return job_id
+
+    def resume_pending(self):
+        """
+        Handle jobs abandoned by a stopped process (once per process)
+
+        Abandoned jobs are queued or running jobs whose owner's heartbeat is stale. They are
+        taken over and re-run when the queue resumes abandoned jobs, otherwise marked failed.
+        Jobs of other live processes are left alone.
+        """
+        with self._lock:
+            if self._recovered:
+                return
+            self._recovered = True
+        conn = self._connection()
+        conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                     (DONE, FAILED, time.time() - JOB_RETENTION_SECONDS))
+        conn.commit()
+        self._sweep_abandoned()
+
+    def _sweep_abandoned(self):
+        """Fail or take over (see resume_abandoned) the jobs of processes that stopped heartbeating"""
+        now = time.time()
+        conn = self._connection()
+        conn.commit()
+        # Transaksi tulis: bila dua proses menyapu bersamaan, hanya satu yang mengambil alih job
+        conn.execute("BEGIN IMMEDIATE")
+        abandoned = [row["id"] for row in conn.execute(
+            """SELECT id FROM jobs WHERE status IN (?, ?) AND (heartbeat_at IS NULL OR heartbeat_at < ?)
+               ORDER BY created_at""",
+            (QUEUED, RUNNING, now - JOB_STALE_SECONDS)
+        )]
+        if self.resume_abandoned:
+            conn.executemany("UPDATE jobs SET status = ?, owner = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                             [(QUEUED, self.owner, now, now, job_id) for job_id in abandoned])
+        else:
+            error = "Proses aplikasi berhenti sebelum job selesai"
+            conn.executemany("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                             [(FAILED, error, now, job_id) for job_id in abandoned])
+        conn.commit()
+        if not abandoned:
+            return
+        if self.resume_abandoned:
+            for job_id in abandoned:
+                self._pool().submit(self._run, job_id)
+            logger.info(f"Resumed {len(abandoned)} abandoned job(s)")
+        else:
+            logger.info(f"Marked {len(abandoned)} abandoned job(s) as failed")
+
+    def _run(self, job_id: str):
+        conn = self._connection()
+        claimed = conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (RUNNING, time.time(), job_id, QUEUED)
+        ).rowcount
+        conn.commit()
+        if not claimed:
+            return
+
+        row = conn.execute("SELECT kind, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        handler = self._handlers.get(row["kind"])
+        if handler is None:
+            self._finish(job_id, FAILED, error=f"Tidak ada handler untuk job {row['kind']}")
+            return
+
+        def report(progress: float, message: str = "", partial: Any = None):
+            self._update(job_id, progress, message, partial)
+
+        started = time.time()
+        try:
+            result = handler(json.loads(row["payload"]), report)
+            self._finish(job_id, DONE, result=result)
+            logger.info(f"Job {job_id} ({row['kind']}) finished in {time.time() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"Job {job_id} ({row['kind']}) failed: {str(e)}\n{traceback.format_exc()}")
+            self._finish(job_id, FAILED, error=str(e))
+
+    def _update(self, job_id: str, progress: float, message: str = "", partial: Any = None):
+        conn = self._connection()
+        conn.execute(
+            """UPDATE jobs SET progress = ?, message = ?,
+                   partial = COALESCE(?, partial), updated_at = ?
+               WHERE id = ?""",
+            (max(0.0, min(1.0, progress)), message,
+             json.dumps(partial, ensure_ascii=False) if partial is not None else None,
+             time.time(), job_id)
+        )
+        conn.commit()
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        conn = self._connection()
+        conn.execute(
+            """UPDATE jobs SET status = ?, progress = CASE WHEN ? THEN 1.0 ELSE progress END,
+                   result = ?, error = ?, updated_at = ?
+               WHERE id = ?""",
+            (status, status == DONE, json.dumps(result, ensure_ascii=False, default=str),
+             error, time.time(), job_id)
+        )
+        conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Current status, progress, partial result and (when done) result of a job"""
+        row = self._connection().execute(
+            """SELECT id, kind, session_id, status, progress, message, partial, result, error,
+                      created_at, updated_at FROM jobs WHERE id = ?""",
+            (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        for field in ("partial", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def list_jobs(self, session_id: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Most recent jobs (without results), optionally for one session"""
+        query = "SELECT id, kind, status, progress, message, error, created_at, updated_at FROM jobs"
+        params: tuple = ()
+        if session_id:
+            query += " WHERE session_id = ?"
+            params = (session_id,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        return [dict(row) for row in self._connection().execute(query, params + (limit,))]
+
+
+job_queue = JobQueue()
+# Hasil job pengguna hanya dapat dibaca oleh sesi yang mengirimnya, jadi hanya job spekulatif yang dilanjutkan
+speculative_queue = JobQueue(SPECULATIVE_QUEUE_PATH, max_workers=SPECULATIVE_WORKERS, resume_abandoned=True)
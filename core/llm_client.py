@@ -0,0 +1,152 @@
+import asyncio
+import time
+import logging
+from typing import Any, Dict, Optional
+from core.rate_limiter import (
+    get_rate_limiter, current_priority, is_rate_limit_error, is_retryable_error,
+    retry_after_seconds, compute_backoff
+)
+from core.request_coalescer import request_coalescer
+from core.resilience import (
+    DeadlineExceeded, CircuitOpenError, MIN_CALL_BUDGET_SECONDS,
+    check_deadline, remaining_time, get_circuit_breaker
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 4
+
+
+def _prompt_text(prompt, inputs: Dict) -> str:
+    try:
+        return prompt.format(**inputs)
+    except Exception:
+        return " ".join(str(value) for value in inputs.values())
+
+
+def _used_tokens(result) -> Optional[int]:
+    """Total tokens reported by the provider, if any"""
+    usage = getattr(result, "usage_metadata", None) or {}
+    if usage.get("total_tokens"):
+        return usage["total_tokens"]
+    token_usage = (getattr(result, "response_metadata", None) or {}).get("token_usage", {})
+    return token_usage.get("total_tokens")
+
+
+def invoke_llm(prompt, llm, inputs: Dict, max_retries: int = MAX_RETRIES) -> Any:
+    """Invoke `prompt | llm` under the shared rate limiter; identical in-flight prompts are coalesced"""
+    model_name = getattr(llm, "model_name", "default")
+    prompt_text = _prompt_text(prompt, inputs)
+    key = request_coalescer.make_key(model_name, prompt_text)
+    return request_coalescer.run(
+        key, lambda: _invoke_with_retries(prompt, llm, inputs, prompt_text, max_retries)
+    )
+
+
+async def ainvoke_llm(prompt, llm, inputs: Dict, max_retries: int = MAX_RETRIES) -> Any:
+    """Async variant of invoke_llm"""
+    model_name = getattr(llm, "model_name", "default")
+    prompt_text = _prompt_text(prompt, inputs)
+    key = request_coalescer.make_key(model_name, prompt_text)
+    return await request_coalescer.arun(
+        key, lambda: _ainvoke_with_retries(prompt, llm, inputs, prompt_text, max_retries)
+    )
+
+
+def get_llm_call_stats() -> Dict[str, int]:
+    """Issued vs coalesced LLM calls since process start"""
+    return request_coalescer.stats()
+
+
+def _check_circuit(breaker):
+    if not breaker.allow():
+        raise CircuitOpenError(f"LLM {breaker.name} sedang tidak tersedia (circuit terbuka)")
+
+
+def _record_outcome(breaker, error: Optional[Exception] = None):
+    """Transient errors and timeouts count toward opening the circuit; anything else proves the model is reachable"""
+    if error is not None and (is_retryable_error(error) or isinstance(error, DeadlineExceeded)):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def _bound_chain(prompt, llm):
+    """prompt | llm with the request timeout capped by the remaining deadline"""
+    remaining = remaining_time()
+    return prompt | (llm.bind(timeout=remaining) if remaining is not None else llm)
+
+
+def _backoff_within_deadline(attempt: int, error: Exception) -> float:
+    delay = compute_backoff(attempt, retry_after_seconds(error))
+    remaining = remaining_time()
+    if remaining is not None and remaining - delay < MIN_CALL_BUDGET_SECONDS:
+        raise DeadlineExceeded("Deadline habis sebelum percobaan ulang LLM") from error
+    return delay
+
+
+def _invoke_with_retries(prompt, llm, inputs: Dict, prompt_text: str, max_retries: int) -> Any:
+    limiter = get_rate_limiter(getattr(llm, "model_name", "default"))
+    breaker = get_circuit_breaker(getattr(llm, "model_name", "default"))
+    estimated = limiter.estimate_tokens(prompt_text)
+    priority, session_id = current_priority()
+
+    for attempt in range(max_retries + 1):
+        budget = check_deadline(MIN_CALL_BUDGET_SECONDS)
+        _check_circuit(breaker)
+        if not limiter.acquire(estimated, priority, session_id, timeout=budget):
+            breaker.abandon()
+            raise DeadlineExceeded("Deadline habis saat menunggu kuota LLM")
+        started = time.monotonic()
+        try:
+            result = _bound_chain(prompt, llm).invoke(inputs)
+        except Exception as e:
+            limiter.release(time.monotonic() - started, rate_limited=is_rate_limit_error(e), session_id=session_id)
+            _record_outcome(breaker, e)
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            delay = _backoff_within_deadline(attempt, e)
+            logger.warning(f"LLM call failed ({type(e).__name__}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        limiter.release(time.monotonic() - started, estimated_tokens=estimated,
+                        used_tokens=_used_tokens(result), session_id=session_id)
+        _record_outcome(breaker)
+        return result
+
+
+async def _ainvoke_with_retries(prompt, llm, inputs: Dict, prompt_text: str, max_retries: int) -> Any:
+    limiter = get_rate_limiter(getattr(llm, "model_name", "default"))
+    breaker = get_circuit_breaker(getattr(llm, "model_name", "default"))
+    estimated = limiter.estimate_tokens(prompt_text)
+    priority, session_id = current_priority()
+
+    for attempt in range(max_retries + 1):
+        budget = check_deadline(MIN_CALL_BUDGET_SECONDS)
+        _check_circuit(breaker)
+        if not await limiter.acquire_async(estimated, priority, session_id, timeout=budget):
+            breaker.abandon()
+            raise DeadlineExceeded("Deadline habis saat menunggu kuota LLM")
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(_bound_chain(prompt, llm).ainvoke(inputs), timeout=remaining_time())
+        except asyncio.TimeoutError as e:
+            limiter.release(time.monotonic() - started, session_id=session_id)
+            error = DeadlineExceeded("Deadline habis saat menunggu respons LLM")
+            _record_outcome(breaker, error)
+            raise error from e
+        except Exception as e:
+            limiter.release(time.monotonic() - started, rate_limited=is_rate_limit_error(e), session_id=session_id)
+            _record_outcome(breaker, e)
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            delay = _backoff_within_deadline(attempt, e)
+            logger.warning(f"LLM call failed ({type(e).__name__}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        limiter.release(time.monotonic() - started, estimated_tokens=estimated,
+                        used_tokens=_used_tokens(result), session_id=session_id)
+        _record_outcome(breaker)
+        return result
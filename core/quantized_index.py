@@ -0,0 +1,409 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_MODES = ("int8", "float16")
+# Jumlah kandidat yang diskor ulang dengan presisi penuh = k * faktor ini
+DEFAULT_RESCORE_FACTOR = 4
+# Baris yang didekuantisasi sekaligus saat skoring, membatasi memori sementara per query
+SCORING_BLOCK_ROWS = 65536
+# Vektor float32 mentah (baris x dimensi), ditambah di akhir file dan di-memory-map
+FULL_VECTORS_FILE = "full.f32"
+# Baris (id, teks, metadata) dan pembaruan metadata, ditambahkan sebagai log JSON-lines
+ROWS_FILE = "rows.jsonl"
+# Header kecil (jumlah baris, skala, generasi file kode) yang ditulis ulang secara atomik setiap perubahan
+META_FILE = "meta.json"
+# Tata letak lama (codes.npy + meta.json berisi semua baris) tidak dimuat dan dibangun ulang dari Chroma
+INDEX_FORMAT = 2
+
+
+def _write_at(path: str, offset: int, array: np.ndarray):
+    """Write an array's bytes at `offset` of a file, creating it if needed"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+b") as f:
+        f.seek(offset)
+        f.write(np.ascontiguousarray(array).tobytes())
+
+
+def _codes_file(generation: int) -> str:
+    return f"codes.{generation}.bin"
+
+
+class QuantizedIndex:
+    def __init__(self, mode: str = "int8"):
+        """
+        In-memory brute-force index over scalar-quantized embeddings
+
+        Only the quantized codes are held in RAM (int8: 1 byte per dimension with a
+        per-dimension scale, float16: 2 bytes). Once saved, the float32 vectors are kept in an
+        append-only file on disk and memory-mapped so the top candidates can be rescored at
+        full precision; later additions append to the saved files, so their cost does not grow
+        with the index. Vectors are expected to be L2-normalized, so the dot product is the
+        cosine similarity.
+
+        Args:
+            mode: Storage mode of the codes ("int8" or "float16")
+        """
+        if mode not in QUANTIZED_MODES:
+            raise ValueError(f"Mode kuantisasi tidak dikenal: {mode}")
+        self.mode = mode
+        # Daftar dan array diganti utuh (tidak pernah diubah di tempat) agar pembaca memegang snapshot yang konsisten
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.codes: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.full: Optional[np.ndarray] = None
+        self.directory: Optional[str] = None
+        self.source_count = 0
+        # Kode int8 ditulis ke file generasi baru saat skala diperlebar, lalu header dialihkan
+        self._generation = 0
+        # Kolom metadata per kunci (kode kategori atau nilai numerik per baris) untuk filter tervektorisasi;
+        # dibangun saat pertama dipakai lalu diperbarui oleh add/update_metadatas (diganti, tidak diubah di tempat)
+        self._categories: Dict[str, Tuple[np.ndarray, Dict]] = {}
+        self._numbers: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def _quantize(self, vectors: np.ndarray, scale: Optional[np.ndarray]) -> np.ndarray:
+        if self.mode == "float16":
+            return vectors.astype(np.float16)
+        return np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+
+    def _append_full(self, vectors: np.ndarray) -> np.ndarray:
+        """Full-precision vectors with `vectors` appended (on disk once the index has been saved)"""
+        if self.full is None:
+            return vectors
+        if self.directory is None:
+            return np.vstack((self.full, vectors))
+        # Baris baru ditulis setelah baris yang tercatat; memmap lama tetap valid untuk pembaca
+        path = os.path.join(self.directory, FULL_VECTORS_FILE)
+        _write_at(path, self.size * vectors.shape[1] * 4, vectors.astype(np.float32, copy=False))
+        return np.memmap(path, dtype=np.float32, mode="r", shape=(self.size + len(vectors), vectors.shape[1]))
+
+    def _append_codes(self, vectors: np.ndarray, full: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Codes and scale after appending `vectors` (`full` already holds them)"""
+        if self.mode == "float16":
+            codes = self._quantize(vectors, None)
+            return (codes if self.codes is None else np.vstack((self.codes, codes))), None
+
+        peak = np.maximum(np.abs(vectors).max(axis=0), 1e-12)
+        if self.scale is not None and np.all(peak <= self.scale * 127.0):
+            return np.vstack((self.codes, self._quantize(vectors, self.scale))), self.scale
+
+        # Skala simetris per dimensi = nilai absolut terbesar yang pernah dilihat; bila batch baru
+        # melampauinya, skala diperlebar dan semua kode dienkode ulang dari vektor penuh
+        scale = (peak if self.scale is None else np.maximum(peak, self.scale * 127.0)) / 127.0
+        scale = scale.astype(np.float32)
+        codes = np.empty(full.shape, dtype=np.int8)
+        for start in range(0, len(full), SCORING_BLOCK_ROWS):
+            codes[start:start + SCORING_BLOCK_ROWS] = self._quantize(
+                np.asarray(full[start:start + SCORING_BLOCK_ROWS]), scale
+            )
+        return codes, scale
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], vectors, metadatas: Optional[Sequence[Dict]] = None):
+        """Quantize and append vectors; IDs already in the index are skipped"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in ids]
+        with self._lock:
+            known = set(self.ids)
+            keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in known]
+            if not keep:
+                return
+            vectors = vectors[keep]
+            rows = [(ids[i], texts[i], metadatas[i] or {}) for i in keep]
+            full = self._append_full(vectors)
+            codes, scale = self._append_codes(vectors, full)
+            if self.directory is not None:
+                self._persist_rows(codes, scale, rows)
+
+            added = [row[2] for row in rows]
+            self._categories = {
+                key: (np.concatenate((column, self._category_codes(added, key, vocab))), vocab)
+                for key, (column, vocab) in self._categories.items()
+            }
+            self._numbers = {key: np.concatenate((column, self._number_values(added, key)))
+                             for key, column in self._numbers.items()}
+            self.codes, self.scale, self.full = codes, scale, full
+            self.ids = self.ids + [row[0] for row in rows]
+            self.texts = self.texts + [row[1] for row in rows]
+            self.metadatas = self.metadatas + added
+
+    def _persist_rows(self, codes: np.ndarray, scale: Optional[np.ndarray], rows: List[Tuple[str, str, Dict]]):
+        """Append new rows to the saved files (caller holds the lock); the header is replaced last"""
+        generation = self._generation
+        if self.codes is None or scale is not self.scale:
+            # Skala diperlebar: semua kode berubah, ditulis ke file baru agar header lama tetap konsisten
+            generation += 1
+            codes.tofile(os.path.join(self.directory, _codes_file(generation)))
+        else:
+            _write_at(os.path.join(self.directory, _codes_file(generation)),
+                      self.size * codes.shape[1] * codes.itemsize, codes[self.size:])
+        with open(os.path.join(self.directory, ROWS_FILE), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False) + "\n"
+                         for chunk_id, text, metadata in rows)
+        self._write_meta(self.directory, self.size + len(rows), codes.shape[1], scale, generation)
+
+    def _write_meta(self, directory: str, count: int, dim: int, scale: Optional[np.ndarray], generation: int):
+        meta_path = os.path.join(directory, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "format": INDEX_FORMAT,
+                "mode": self.mode,
+                "count": count,
+                "dim": dim,
+                "scale": scale.tolist() if scale is not None else None,
+                "codes_generation": generation,
+                "source_count": self.source_count,
+            }, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        if generation != self._generation:
+            stale = os.path.join(directory, _codes_file(self._generation))
+            if os.path.exists(stale):
+                os.remove(stale)
+            self._generation = generation
+
+    def update_metadatas(self, ids: Sequence[str], metadatas: Sequence[Dict]):
+        """Replace the metadata of indexed IDs; IDs not in the index are ignored"""
+        updates = dict(zip(ids, metadatas))
+        with self._lock:
+            self.metadatas = [updates.get(chunk_id, metadata) for chunk_id, metadata in zip(self.ids, self.metadatas)]
+            rows = [row for row, chunk_id in enumerate(self.ids) if chunk_id in updates]
+            changed = [self.metadatas[row] for row in rows]
+            for key, (column, vocab) in list(self._categories.items()):
+                column = column.copy()
+                column[rows] = self._category_codes(changed, key, vocab)
+                self._categories[key] = (column, vocab)
+            for key, column in list(self._numbers.items()):
+                column = column.copy()
+                column[rows] = self._number_values(changed, key)
+                self._numbers[key] = column
+            if self.directory is not None:
+                known = set(self.ids)
+                with open(os.path.join(self.directory, ROWS_FILE), "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps({"id": chunk_id, "metadata": metadata}, ensure_ascii=False) + "\n"
+                                 for chunk_id, metadata in updates.items() if chunk_id in known)
+
+    def _snapshot(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]]:
+        with self._lock:
+            return self.codes, self.scale, self.full
+
+    def approximate_scores(self, query, codes: Optional[np.ndarray] = None,
+                           scale: Optional[np.ndarray] = None, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot products of the query (or of each row of a query matrix) with every quantized vector, or only `rows`"""
+        if codes is None:
+            codes, scale, _ = self._snapshot()
+        query = np.asarray(query, dtype=np.float32)
+        # Untuk int8: (codes * scale) @ q == codes @ (q * scale), jadi skala cukup diterapkan ke query
+        weights = (query * scale if self.mode == "int8" else query).T
+        count = len(codes) if rows is None else len(rows)
+        scores = np.empty((count,) + query.shape[:-1], dtype=np.float32)
+        for start in range(0, count, SCORING_BLOCK_ROWS):
+            if rows is None:
+                block = codes[start:start + SCORING_BLOCK_ROWS]
+            else:
+                block = codes[rows[start:start + SCORING_BLOCK_ROWS]]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights
+        return scores
+
+    @staticmethod
+    def _category_codes(metadatas: Sequence[Dict], key: str, vocab: Dict) -> np.ndarray:
+        return np.fromiter((vocab.setdefault(metadata.get(key), len(vocab)) for metadata in metadatas),
+                           dtype=np.int32, count=len(metadatas))
+
+    @staticmethod
+    def _number_values(metadatas: Sequence[Dict], key: str) -> np.ndarray:
+        # Baris tanpa nilai (NaN) tidak lolos perbandingan
+        return np.fromiter((metadata.get(key, np.nan) for metadata in metadatas), dtype=float, count=len(metadatas))
+
+    def _category_column(self, key: str) -> Tuple[np.ndarray, Dict]:
+        with self._lock:
+            if key not in self._categories:
+                vocab: Dict = {}
+                self._categories[key] = (self._category_codes(self.metadatas, key, vocab), vocab)
+            return self._categories[key]
+
+    def _number_column(self, key: str) -> np.ndarray:
+        with self._lock:
+            if key not in self._numbers:
+                self._numbers[key] = self._number_values(self.metadatas, key)
+            return self._numbers[key]
+
+    def metadata_mask(self, key: str, values: Sequence) -> np.ndarray:
+        """Rows whose metadata `key` is one of `values`"""
+        column, vocab = self._category_column(key)
+        wanted = [vocab[value] for value in values if value in vocab]
+        return np.isin(column, wanted)
+
+    def filter_mask(self, where: Dict) -> np.ndarray:
+        """Rows matching a Chroma-style where filter ($and of $eq/$in/$gte/$lte field conditions)"""
+        if "$and" in where:
+            masks = [self.filter_mask(clause) for clause in where["$and"]]
+            # Baris yang ditambahkan di antara klausa tidak lolos filter
+            rows = min(len(mask) for mask in masks)
+            return np.logical_and.reduce([mask[:rows] for mask in masks])
+
+        (key, condition), = where.items()
+        (operator, value), = (condition if isinstance(condition, dict) else {"$eq": condition}).items()
+        if operator == "$in":
+            return self.metadata_mask(key, value)
+        if operator == "$eq":
+            return self.metadata_mask(key, [value])
+        column = self._number_column(key)
+        if operator == "$gte":
+            return column >= value
+        if operator == "$lte":
+            return column <= value
+        raise ValueError(f"Operator filter tidak didukung: {operator}")
+
+    def search(self, query, k: int = 5, rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+               mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (row, score) pairs
+
+        Args:
+            query: Normalized query embedding
+            k: Number of results
+            rescore_factor: Rescore k * factor approximate candidates at full precision (0 disables rescoring)
+            mask: Optional boolean row filter (e.g. from filter_mask); only the allowed rows are scored
+        """
+        return self.search_many([query], k, rescore_factor, mask)[0]
+
+    def search_many(self, queries, k: int = 5, rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+                    mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k (row, score) pairs for each query, scoring all queries in one pass over the codes"""
+        queries = np.asarray(queries, dtype=np.float32)
+        codes, scale, full = self._snapshot()
+        size = 0 if codes is None else len(codes)
+        if mask is not None and len(mask) != size:
+            # Mask dibuat sebelum/selama penambahan baris: baris di luar mask tidak lolos
+            fitted = np.zeros(size, dtype=bool)
+            fitted[:min(size, len(mask))] = mask[:size]
+            mask = fitted
+        # Filter mempersempit pekerjaan: hanya kode baris yang lolos yang diskor
+        rows = np.flatnonzero(mask) if mask is not None else None
+        allowed = size if rows is None else len(rows)
+        if not allowed:
+            return [[] for _ in queries]
+        k = min(k, allowed)
+        scores = self.approximate_scores(queries, codes, scale, rows)
+
+        rescore = bool(rescore_factor) and full is not None
+        n_candidates = min(allowed, k * rescore_factor) if rescore else k
+        results = []
+        for column, query in enumerate(queries):
+            # Posisi terurut -> baris terurut (rows terurut), sehingga memmap dibaca berurutan
+            positions = np.sort(np.argpartition(-scores[:, column], n_candidates - 1)[:n_candidates])
+            candidates = positions if rows is None else rows[positions]
+            if rescore:
+                candidate_scores = np.asarray(full[candidates]) @ query
+            else:
+                candidate_scores = scores[positions, column]
+            order = np.argsort(-candidate_scores)[:k]
+            results.append([(int(candidates[i]), float(candidate_scores[i])) for i in order])
+        return results
+
+    def memory_bytes(self) -> int:
+        """Resident size of the index arrays (float32 vectors count only while not yet on disk)"""
+        codes, scale, full = self._snapshot()
+        total = codes.nbytes if codes is not None else 0
+        total += scale.nbytes if scale is not None else 0
+        return total + (full.nbytes if full is not None and not isinstance(full, np.memmap) else 0)
+
+    def save(self, directory: str):
+        """
+        Write the index to `directory`
+
+        The first save writes every file and memory-maps the float32 vectors; from then on
+        add() and update_metadatas() append to the files in place, so saving again only
+        rewrites the small header (e.g. after a source_count change).
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            dim = int(self.full.shape[1]) if self.full is not None else 0
+            generation = self._generation
+            if self.directory != directory:
+                generation += 1
+                if self.full is not None:
+                    full_path = os.path.join(directory, FULL_VECTORS_FILE)
+                    with open(full_path, "wb") as f:
+                        for start in range(0, len(self.full), SCORING_BLOCK_ROWS):
+                            f.write(np.ascontiguousarray(self.full[start:start + SCORING_BLOCK_ROWS], dtype=np.float32).tobytes())
+                    self.full = np.memmap(full_path, dtype=np.float32, mode="r", shape=self.full.shape)
+                codes = self.codes if self.codes is not None else np.zeros((0, dim), dtype=self._codes_dtype())
+                codes.tofile(os.path.join(directory, _codes_file(generation)))
+                with open(os.path.join(directory, ROWS_FILE), "w", encoding="utf-8") as f:
+                    f.writelines(
+                        json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False) + "\n"
+                        for chunk_id, text, metadata in zip(self.ids, self.texts, self.metadatas)
+                    )
+                self.directory = directory
+                self._write_meta(directory, self.size, dim, self.scale, generation)
+                # Sisa indeks sebelumnya di direktori yang sama (generasi lain atau tata letak lama)
+                for name in os.listdir(directory):
+                    if name in ("codes.npy", "scale.npy") or (
+                            name.startswith("codes.") and name.endswith(".bin") and name != _codes_file(generation)):
+                        os.remove(os.path.join(directory, name))
+                return
+            self._write_meta(directory, self.size, dim, self.scale, generation)
+
+    def _codes_dtype(self) -> np.dtype:
+        return np.dtype(np.int8 if self.mode == "int8" else np.float16)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["QuantizedIndex"]:
+        """Load a saved index (float32 vectors memory-mapped), or None if there is no complete one"""
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != INDEX_FORMAT:
+            # Indeks format lama dibangun ulang dari Chroma
+            return None
+
+        index = cls(meta["mode"])
+        count, dim = meta["count"], meta["dim"]
+        position: Dict[str, int] = {}
+        try:
+            with open(os.path.join(directory, ROWS_FILE), encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if "text" in record:
+                        position[record["id"]] = len(index.ids)
+                        index.ids.append(record["id"])
+                        index.texts.append(record["text"])
+                        index.metadatas.append(record["metadata"])
+                    else:
+                        index.metadatas[position[record["id"]]] = record["metadata"]
+            codes = np.fromfile(os.path.join(directory, _codes_file(meta["codes_generation"])),
+                                dtype=index._codes_dtype(), count=count * dim)
+            full_path = os.path.join(directory, FULL_VECTORS_FILE)
+            full_rows = os.path.getsize(full_path) // (4 * dim) if dim else 0
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Quantized index in {directory} is unreadable, rebuilding: {str(e)}")
+            return None
+        if len(index.ids) != count or codes.size != count * dim or full_rows < count:
+            # Penulisan terputus (mis. proses berhenti di tengah penambahan)
+            logger.warning(f"Quantized index in {directory} is incomplete, rebuilding")
+            return None
+
+        if count:
+            index.codes = codes.reshape(count, dim)
+            index.full = np.memmap(full_path, dtype=np.float32, mode="r", shape=(count, dim))
+        if meta["scale"] is not None:
+            index.scale = np.asarray(meta["scale"], dtype=np.float32)
+        index.source_count = meta["source_count"]
+        index._generation = meta["codes_generation"]
+        index.directory = directory
+        return index
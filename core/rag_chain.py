@@ -4,14 +4,24 @@ import os
 import streamlit as st # DITAMBAH
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
-from core.retriever import get_retriever
-from typing import List, Optional, Dict, Tuple
+from core.facet_search import coverage_matrix, format_coverage
+from typing import Callable, List, Optional, Dict, Tuple
 from core.scoring import ResumeScorer
-from utils.resume_standardizer import ResumeStandardizer
+from core.llm_client import ainvoke_llm
+from core.async_runner import run_async, map_in_threads
+from core.resilience import degradation_scope, record_degradation
+from utils.prompt_compactor import prompt_compactor
+from utils.near_duplicate import near_duplicate_index
+from utils.candidate_catalog import candidate_catalog, text_digest
+from core.hierarchical_compare import HierarchicalComparator, MAP_REDUCE_THRESHOLD
+from utils.resume_standardizer import ResumeStandardizer, STANDARDIZER_VERSION
 from utils.name_extractor import NameExtractor
 from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import threading
 import logging
 import hashlib
+import json
 import re
 
 # load_dotenv() # DIHAPUS
@@ -19,6 +29,17 @@ import re
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Budget token untuk konten resume di dalam prompt
+RESUME_TOKEN_BUDGET = 900
+CANDIDATES_TOKEN_BUDGET = 4000
+# Narasi dibuat ulang pada scoring inkremental hanya jika urutan top-N berubah
+NARRATIVE_TOP_N = 5
+NARRATIVE_CACHE_SIZE = 64
+
+# Narasi per fingerprint ranking; dibagi antar instance karena chain dibuat per permintaan
+_narrative_cache: "OrderedDict[str, str]" = OrderedDict()
+_narrative_cache_lock = threading.Lock()
+
 class ResumeRagChain:
     def __init__(self, domain: str = "general"):
         """
@@ -33,7 +54,8 @@ class ResumeRagChain:
             model_name="deepseek-r1-distill-llama-70b",
             # DIUBAH: Ambil API Key dari Streamlit Secrets, bukan os.getenv
             api_key=st.secrets["GROQ_API_KEY"], 
-            request_timeout=120
+            request_timeout=120,
+            max_retries=0  # retry ditangani oleh core.llm_client
         )
         self.name_extractor = NameExtractor()
         self.standardizer = ResumeStandardizer(domain=domain)
@@ -66,11 +88,14 @@ class ResumeRagChain:
             Kandidat yang Cocok untuk domain {self.domain.upper()}:
             {{candidates}}
             
+            Cakupan kebutuhan JD per kandidat (kemiripan 0-1 per aspek):
+            {{coverage}}
+            
             {domain_context}
             
             Berikan dalam bahasa Indonesia:
             1. 3 kecocokan teratas dengan alasan
-            2. Area yang perlu dikembangkan
+            2. Area yang perlu dikembangkan (perhatikan aspek dengan cakupan rendah)
             3. Rekomendasi perekrutan
             Jangan sertakan proses berpikir Anda dalam jawaban.
             """
@@ -159,17 +184,37 @@ class ResumeRagChain:
             logger.error(f"Error extracting name: {str(e)}")
             return f"Unknown Candidate {hashlib.md5((resume_text or filename).encode()).hexdigest()[:8]}"
     
+    def _describe_resume(self, data) -> str:
+        """Filename or extracted name for user-facing notes"""
+        if isinstance(data, tuple) and len(data) >= 2 and data[1]:
+            return data[1]
+        resume_text = data[0] if isinstance(data, tuple) and len(data) > 0 else str(data)
+        return self.getcandidate_name(resume_text, "")
+    
+    async def _prepare_candidate(self, data) -> Tuple[str, str]:
+        """Standardize a resume and extract its name concurrently, off the event loop thread"""
+        if not isinstance(data, tuple) or len(data) != 2:
+            logger.warning(f"Invalid resume data: {data}")
+            resume_text = data[0] if isinstance(data, tuple) and len(data) > 0 else str(data)
+            filename = ""
+        else:
+            resume_text, filename = data
+        return tuple(await asyncio.gather(
+            asyncio.to_thread(self.standardizer.standardize_resume, resume_text),
+            asyncio.to_thread(self.getcandidate_name, resume_text, filename)
+        ))
+    
     async def resume_qa(self, resume_text: str, question: str, filename: str = "") -> str:
         """Q&A resume dengan konteks domain"""
         try:
             if not resume_text:
                 return "Resume text is empty"
-            std_resume = self.standardizer.standardize_resume(resume_text)
-            candidate_name = self.getcandidate_name(resume_text, filename)
-            chain = self.qa_prompt | self.llm
-            result = await chain.ainvoke({
+            std_resume, candidate_name = await self._prepare_candidate((resume_text, filename))
+            compacted_resume, compaction = prompt_compactor.compact(std_resume, RESUME_TOKEN_BUDGET)
+            logger.debug(f"resume_qa prompt compaction: {compaction}")
+            result = await ainvoke_llm(self.qa_prompt, self.llm, {
                 "question": question,
-                "resume_text": std_resume[:3000],
+                "resume_text": compacted_resume,
                 "name": candidate_name
             })
             return self._clean_output(result.content)
@@ -177,43 +222,39 @@ class ResumeRagChain:
             logger.error(f"Error in resume_qa: {str(e)}")
             return f"⚠️ Error dalam Q&A resume: {str(e)}"
     
-    async def candidate_search(self, jd_text: str, resume_docs: Optional[List[Tuple[str, str]]] = None) -> str:
-        """Pencarian kandidat dengan konteks domain"""
+    def _retrieve_candidates(self, jd_text: str,
+                             uploaded_after: Optional[float] = None) -> Tuple[List[Tuple[str, str]], Dict]:
+        """Resumes ranked by coverage of the JD's requirement facets, with the coverage matrix"""
+        matrix = coverage_matrix(jd_text, domain=self.domain, uploaded_after=uploaded_after)
+        # Kandidat diwakili teks resume lengkap dari katalog; chunk lama tanpa tag memakai teks chunk-nya
+        resume_docs = []
+        for candidate in matrix["candidates"]:
+            record = candidate_catalog.get_resume(candidate["candidate_id"]) if candidate["candidate_id"] else None
+            if record:
+                resume_docs.append((record["raw_text"], record.get("filename") or ""))
+            else:
+                resume_docs.append((candidate["text"], candidate["source"]))
+        return resume_docs, matrix
+    
+    async def candidate_search(self, jd_text: str, resume_docs: Optional[List[Tuple[str, str]]] = None,
+                               uploaded_after: Optional[float] = None) -> str:
+        """Pencarian kandidat dengan konteks domain, opsional hanya resume yang diunggah sejak `uploaded_after`"""
         try:
-            retriever = get_retriever()
+            matrix = None
             if resume_docs is None:
-                relevant_docs = retriever.invoke(jd_text)
-                processed = self.batchprocess(
-                    lambda doc: (
-                        self.standardizer.standardize_resume(doc.page_content),
-                        self.getcandidate_name(doc.page_content, doc.metadata.get('filename', ''))
-                    ),
-                    relevant_docs
-                )
-            else:
-                processed = []
-                for data in resume_docs:
-                    if not isinstance(data, tuple) or len(data) != 2:
-                        logger.warning(f"Invalid resume data: {data}")
-                        resume_text = data[0] if isinstance(data, tuple) and len(data) > 0 else str(data)
-                        processed.append((
-                            self.standardizer.standardize_resume(resume_text),
-                            self.getcandidate_name(resume_text, "")
-                        ))
-                    else:
-                        processed.append((
-                            self.standardizer.standardize_resume(data[0]),
-                            self.getcandidate_name(data[0], data[1])
-                        ))
+                resume_docs, matrix = await asyncio.to_thread(self._retrieve_candidates, jd_text, uploaded_after)
+            processed = list(await asyncio.gather(*(self._prepare_candidate(data) for data in resume_docs)))
             
+            compacted, _ = prompt_compactor.fit_candidates([text for text, _ in processed], CANDIDATES_TOKEN_BUDGET)
             candidates_formatted = "\n\n".join(
-                f"Kandidat {i+1} ({name}):\n{text[:2000]}..."
-                for i, (text, name) in enumerate(processed)
+                f"Kandidat {i+1} ({name}):\n{text}"
+                for i, (text, (_, name)) in enumerate(zip(compacted, processed))
             )
-            chain = self.search_prompt | self.llm
-            result = await chain.ainvoke({
+            coverage = format_coverage(matrix, [name for _, name in processed]) if matrix else "-"
+            result = await ainvoke_llm(self.search_prompt, self.llm, {
                 "jd_text": jd_text,
-                "candidates": candidates_formatted
+                "candidates": candidates_formatted,
+                "coverage": coverage
             })
             return self._clean_output(result.content)
         except Exception as e:
@@ -225,13 +266,13 @@ class ResumeRagChain:
         try:
             if not resume_text:
                 return "⚠️ Error: Resume text is empty"
-            std_resume = self.standardizer.standardize_resume(resume_text)
+            std_resume, candidate_name = await self._prepare_candidate((resume_text, filename))
             level = self.standardizer.detect_resume_level(std_resume)
-            candidate_name = self.getcandidate_name(resume_text, filename)
-            chain = self.profile_prompt | self.llm
-            result = await chain.ainvoke({
+            compacted_resume, compaction = prompt_compactor.compact(std_resume, RESUME_TOKEN_BUDGET)
+            logger.debug(f"candidate_profiling prompt compaction: {compaction}")
+            result = await ainvoke_llm(self.profile_prompt, self.llm, {
                 "level": level,
-                "resume_text": std_resume[:3000],
+                "resume_text": compacted_resume,
                 "name": candidate_name
             })
             return self._clean_output(result.content)
@@ -245,63 +286,109 @@ class ResumeRagChain:
             if not resume_data:
                 return "Tidak ada resume yang valid untuk dibandingkan"
             
-            processed = []
-            for data in resume_data:
-                if not isinstance(data, tuple) or len(data) != 2:
-                    logger.warning(f"Invalid resume data: {data}")
-                    resume_text = data[0] if isinstance(data, tuple) and len(data) > 0 else str(data)
-                    processed.append((
-                        self.standardizer.standardize_resume(resume_text),
-                        self.getcandidate_name(resume_text, "")
-                    ))
-                else:
-                    processed.append((
-                        self.standardizer.standardize_resume(data[0]),
-                        self.getcandidate_name(data[0], data[1])
-                    ))
+            clusters = near_duplicate_index.cluster([
+                data[0] if isinstance(data, tuple) and len(data) > 0 else str(data) for data in resume_data
+            ])
+            duplicate_notes = [
+                f"- {', '.join(self._describe_resume(resume_data[i]) for i in cluster[1:])} "
+                f"merupakan duplikat dari {self._describe_resume(resume_data[cluster[0]])}"
+                for cluster in clusters if len(cluster) > 1
+            ]
+            resume_data = [resume_data[cluster[0]] for cluster in clusters]
+            
+            processed = list(await asyncio.gather(*(self._prepare_candidate(data) for data in resume_data)))
             
+            elimination_notes = []
+            if len(processed) > MAP_REDUCE_THRESHOLD:
+                # Set kandidat besar: ringkas paralel, bandingkan per grup, lalu bandingkan finalis
+                hierarchical = HierarchicalComparator(
+                    self.llm, self.domain, self._get_domain_context(), self._clean_output
+                )
+                finalists, elimination_notes = await hierarchical.select_finalists(processed, jd_text)
+                processed = [(card, name) for name, card in finalists]
+            
+            compacted, _ = prompt_compactor.fit_candidates([text for text, _ in processed], CANDIDATES_TOKEN_BUDGET)
             candidates_formatted = "\n\n---\n\n".join(
-                f"{name}:\n{text[:2000]}..." 
-                for text, name in processed
+                f"{name}:\n{text}"
+                for text, (_, name) in zip(compacted, processed)
             )
-            chain = self.compare_prompt | self.llm
-            result = await chain.ainvoke({
+            result = await ainvoke_llm(self.compare_prompt, self.llm, {
                 "count": len(processed),
                 "jd_context": " terhadap deskripsi pekerjaan" if jd_text else "",
                 "candidates": candidates_formatted,
                 "jd_text": jd_text or ""
             })
-            return self._clean_output(result.content)
+            final_analysis = self._clean_output(result.content)
+            if elimination_notes:
+                final_analysis += "\n\n### Ringkasan Babak Penyisihan\n" + "\n\n".join(elimination_notes)
+            if duplicate_notes:
+                final_analysis += "\n\n### File Duplikat (tidak dianalisis ulang)\n" + "\n".join(duplicate_notes)
+            return final_analysis
         except Exception as e:
             logger.error(f"Error in compare_candidates: {str(e)}")
             return f"⚠️ Error dalam perbandingan kandidat: {str(e)}"
     
-    async def generate_llm_narrative_analysis(self, scoring_results: Dict, jd_text: Optional[str] = None) -> str:
-        """Generate narrative analysis dengan konteks domain"""
-        try:
-            if not scoring_results.get("ranking"):
-                return "⚠️ Tidak ada data ranking untuk dianalisis"
+    def _narrative_candidates(self, scoring_results: Dict) -> List[Dict]:
+        """Per-candidate level, AI score, strengths and weaknesses used by the narrative"""
+        candidates_info = []
+        for candidate in scoring_results["ranking"]:
+            if candidate.get("duplicate_of"):
+                continue
+            candidate_info = {
+                "name": candidate.get("name", f"Kandidat {candidate['candidate_id']}"),
+                "scores": candidate["scores"],
+                "ai_score": candidate["ai_score"],
+                "level": candidate["level"],
+                "strengths": [],
+                "weaknesses": []
+            }
             
-            candidates_info = []
-            for candidate in scoring_results["ranking"]:
-                candidate_info = {
-                    "name": candidate.get("name", f"Kandidat {candidate['candidate_id']}"),
-                    "scores": candidate["scores"],
-                    "ai_score": candidate["ai_score"],
-                    "level": candidate["level"],
-                    "strengths": [],
-                    "weaknesses": []
-                }
-                
-                for criterion, score in candidate["scores"].items():
-                    normalized_score = score / (scoring_results["criteria"][criterion] / 10)
-                    if normalized_score >= 7:
-                        candidate_info["strengths"].append(criterion)
-                    elif normalized_score <= 4:
-                        candidate_info["weaknesses"].append(criterion)
-                
-                candidates_info.append(candidate_info)
+            for criterion, score in candidate["scores"].items():
+                normalized_score = score / (scoring_results["criteria"][criterion] / 10)
+                if normalized_score >= 7:
+                    candidate_info["strengths"].append(criterion)
+                elif normalized_score <= 4:
+                    candidate_info["weaknesses"].append(criterion)
             
+            candidates_info.append(candidate_info)
+        return candidates_info
+    
+    def _template_narrative(self, candidates_info: List[Dict]) -> str:
+        """Rule-based narrative from the scores alone, used when the LLM is unavailable"""
+        top = candidates_info[:NARRATIVE_TOP_N]
+        best = top[0]
+        lines = [
+            "### Ringkasan Eksekutif",
+            f"{len(candidates_info)} kandidat dinilai untuk domain {self.domain}. "
+            f"Skor tertinggi diraih {best['name']} ({best['level']}, AI Score {best['ai_score']:.1f}/100).",
+            "",
+            "### Analisis Komparatif"
+        ]
+        for info in top:
+            lines.append(
+                f"- **{info['name']}** ({info['level']}, {info['ai_score']:.1f}/100): "
+                f"kekuatan {', '.join(info['strengths']) or 'tidak menonjol'}; "
+                f"area pengembangan {', '.join(info['weaknesses']) or 'tidak ada'}"
+            )
+        lines += [
+            "",
+            "### Rekomendasi",
+            f"Prioritaskan {best['name']} untuk tahap wawancara. "
+            "Analisis naratif lengkap dapat dibuat ulang saat layanan LLM kembali tersedia."
+        ]
+        return "\n".join(lines)
+    
+    async def generate_llm_narrative_analysis(self, scoring_results: Dict, jd_text: Optional[str] = None) -> str:
+        """Generate narrative analysis dengan konteks domain (template berbasis skor jika LLM gagal)"""
+        if not scoring_results.get("ranking"):
+            return "⚠️ Tidak ada data ranking untuk dianalisis"
+        try:
+            candidates_info = self._narrative_candidates(scoring_results)
+        except Exception as e:
+            logger.error(f"Error in narrative analysis: {str(e)}")
+            return f"⚠️ Error dalam analisis: {str(e)}"
+        
+        try:
             domain_context = self._get_domain_context()
             prompt = ChatPromptTemplate.from_template(
                 f"""Anda adalah ahli HR untuk domain {self.domain.upper()}. 
@@ -337,9 +424,8 @@ class ResumeRagChain:
             )
             
             jd_context = f"\nDeskripsi Pekerjaan:\n{jd_text}" if jd_text else ""
-            chain = prompt | self.llm
             
-            result = await chain.ainvoke({
+            result = await ainvoke_llm(prompt, self.llm, {
                 "candidates_info": candidates_formatted,
                 "jd_context": jd_context
             })
@@ -347,12 +433,199 @@ class ResumeRagChain:
             return self._clean_output(result.content)
         except Exception as e:
             logger.error(f"Error in narrative analysis: {str(e)}")
-            return f"⚠️ Error dalam analisis: {str(e)}"
+            record_degradation("Analisis naratif memakai template berbasis skor")
+            return self._template_narrative(candidates_info)
+    
+    def narrative_fingerprint(self, scoring_results: Dict, jd_text: Optional[str] = None) -> str:
+        """Hash of ranking order, rounded scores, criteria, JD and domain that a narrative depends on"""
+        ranking = [
+            (c.get("digest") or c.get("name"), c.get("rank"), round(c.get("ai_score", 0), 1),
+             round(c.get("total_score", 0), 1), c.get("level"), bool(c.get("duplicate_of")))
+            for c in scoring_results.get("ranking", [])
+        ]
+        payload = json.dumps({
+            "ranking": ranking,
+            "criteria": sorted((scoring_results.get("criteria") or {}).items()),
+            "jd": scoring_results.get("jd_digest") or text_digest(jd_text or ""),
+            "domain": self.domain,
+        }, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def cached_narrative(self, scoring_results: Dict, jd_text: Optional[str] = None) -> Optional[str]:
+        """Previously generated narrative for an identical ranking, if any"""
+        fingerprint = self.narrative_fingerprint(scoring_results, jd_text)
+        if scoring_results.get("narrative_fingerprint") == fingerprint and scoring_results.get("narrative_analysis"):
+            return scoring_results["narrative_analysis"]
+        with _narrative_cache_lock:
+            narrative = _narrative_cache.get(fingerprint)
+            if narrative is not None:
+                _narrative_cache.move_to_end(fingerprint)
+        return narrative
+    
+    async def get_narrative(self, scoring_results: Dict, jd_text: Optional[str] = None, force: bool = False) -> str:
+        """
+        Narrative analysis for a ranking, generated only when its fingerprint has no cached narrative
+        
+        Args:
+            scoring_results: Scoring results (ranking, criteria, jd_digest)
+            jd_text: Job description used for the prompt
+            force: Always call the LLM (explicit regenerate)
+        """
+        fingerprint = self.narrative_fingerprint(scoring_results, jd_text)
+        if not force:
+            cached = self.cached_narrative(scoring_results, jd_text)
+            if cached:
+                logger.info(f"Reusing narrative for ranking fingerprint {fingerprint[:12]}")
+                scoring_results["narrative_fingerprint"] = fingerprint
+                return cached
+        
+        with degradation_scope() as notes:
+            narrative = await self.generate_llm_narrative_analysis(scoring_results, jd_text)
+        # Narasi template tidak di-cache agar dibuat ulang oleh LLM begitu tersedia
+        if narrative and not narrative.startswith("⚠️") and not notes:
+            with _narrative_cache_lock:
+                _narrative_cache[fingerprint] = narrative
+                _narrative_cache.move_to_end(fingerprint)
+                while len(_narrative_cache) > NARRATIVE_CACHE_SIZE:
+                    _narrative_cache.popitem(last=False)
+            scoring_results["narrative_fingerprint"] = fingerprint
+        return narrative
+    
+    def _save_catalog_name(self, resume_text: str, filename: str, name: str):
+        """Record the candidate name per domain for cross-session lookups"""
+        try:
+            digest = candidate_catalog.upsert_resume(resume_text, filename)
+            candidate_catalog.save_profile(digest, self.domain, STANDARDIZER_VERSION, name=name)
+        except Exception as e:
+            logger.warning(f"Catalog write failed: {str(e)}")
+    
+    def _expand_duplicate_clusters(self, scoring_results: Dict, clusters: List[List[int]]):
+        """Copy representative scores to every file in its duplicate cluster and re-rank"""
+        expanded = []
+        for candidate in scoring_results.get("ranking", []):
+            cluster = clusters[candidate["candidate_id"] - 1]
+            representative_id = cluster[0] + 1
+            for position, original_index in enumerate(cluster):
+                entry = dict(candidate)
+                entry["candidate_id"] = original_index + 1
+                if position > 0:
+                    entry["duplicate_of"] = representative_id
+                expanded.append(entry)
+        
+        for rank, entry in enumerate(expanded, start=1):
+            entry["rank"] = rank
+        scoring_results["ranking"] = expanded
+        scoring_results["duplicate_clusters"] = [
+            [index + 1 for index in cluster] for cluster in clusters if len(cluster) > 1
+        ]
+    
+    def rerank_candidates(self, scoring_results: Dict, criteria: Dict[str, int]) -> Dict:
+        """Re-rank previous scoring results under new criteria weights from their cached features (no LLM call)"""
+        try:
+            scorer = ResumeScorer(domain=self.domain, criteria=criteria)
+            reranked = scorer.rerank(scoring_results)
+            # Narasi lama merujuk ke urutan sebelumnya; dibuat ulang hanya atas permintaan
+            reranked.pop("narrative_fingerprint", None)
+            reranked["narrative_analysis"] = self.cached_narrative(reranked) or ""
+            return reranked
+        except Exception as e:
+            logger.error(f"Error in rerank_candidates: {str(e)}")
+            return {"error": f"Processing error: {str(e)}"}
+    
+    def _is_same_session(self, previous_results: Optional[Dict], criteria: Dict[str, int], jd_digest: str) -> bool:
+        """Previous results can be extended only if domain, JD and criteria are unchanged"""
+        if not previous_results or not previous_results.get("ranking") or previous_results.get("degraded"):
+            return False
+        return (
+            previous_results.get("domain") == self.domain
+            and previous_results.get("jd_digest") == jd_digest
+            and previous_results.get("criteria") == criteria
+            and all(c.get("digest") for c in previous_results["ranking"])
+        )
+    
+    def _merge_into_session(self, scorer: ResumeScorer, previous_results: Dict,
+                            resume_data: List[Tuple[str, str]], clusters: List[List[int]],
+                            jd_text: Optional[str],
+                            progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """Score only resumes missing from the previous session and sorted-insert them into its ranking"""
+        known = {}
+        for candidate in previous_results["ranking"]:
+            known.setdefault(candidate["digest"], candidate)
+        
+        ranking, pending = [], []
+        for index, cluster in enumerate(clusters):
+            text = resume_data[cluster[0]][0]
+            previous = known.get(text_digest(text))
+            if previous:
+                entry = dict(previous)
+                entry["candidate_id"] = index + 1
+                entry.pop("duplicate_of", None)
+                ranking.append(entry)
+            else:
+                pending.append((index + 1, text))
+        
+        new_results = map_in_threads(
+            lambda item: scorer.score_resume(item[1], jd_text), pending, progress_callback
+        )
+        new_entries = [
+            scorer.build_entry(candidate_id, text, result)
+            for (candidate_id, text), result in zip(pending, new_results)
+        ]
+        
+        logger.info(f"Incremental scoring: {len(new_entries)} new, {len(ranking)} reused from previous session")
+        ranking.sort(key=lambda c: c["rank"])
+        for entry in new_entries:
+            scorer.insert_ranked(ranking, entry)
+        for rank, entry in enumerate(ranking, start=1):
+            entry["rank"] = rank
+        
+        return {
+            "ranking": ranking,
+            "criteria": scorer.criteria,
+            "max_score": scorer.max_score,
+            "scoring_guide": scorer.scoring_guide
+        }
+    
+    def _ranking_diff(self, previous_results: Dict, scoring_results: Dict) -> Dict:
+        """New entries, removed entries, rank movers and whether the top-N order changed"""
+        old_ranks = {c.get("digest"): c["rank"] for c in previous_results["ranking"]}
+        current_digests = set()
+        added, moved = [], []
+        for candidate in scoring_results["ranking"]:
+            current_digests.add(candidate["digest"])
+            old_rank = old_ranks.get(candidate["digest"])
+            if old_rank is None:
+                added.append({"name": candidate["name"], "rank": candidate["rank"]})
+            elif old_rank != candidate["rank"]:
+                moved.append({"name": candidate["name"], "from": old_rank, "to": candidate["rank"]})
+        removed = [
+            c.get("name", "") for c in previous_results["ranking"] if c.get("digest") not in current_digests
+        ]
+        
+        def top_digests(results: Dict) -> List[str]:
+            return [c.get("digest") for c in results["ranking"] if not c.get("duplicate_of")][:NARRATIVE_TOP_N]
+        
+        return {
+            "added": added,
+            "removed": removed,
+            "moved": moved,
+            "top_changed": top_digests(previous_results) != top_digests(scoring_results)
+        }
     
     def score_and_rank_candidates(self, resume_data: List[Tuple[str, str]], 
                                 jd_text: Optional[str] = None,
-                                criteria: Optional[Dict[str, int]] = None) -> Dict:
-        """Score and rank candidates dengan konteks domain"""
+                                criteria: Optional[Dict[str, int]] = None,
+                                previous_results: Optional[Dict] = None,
+                                generate_narrative: bool = True,
+                                progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Score and rank candidates dengan konteks domain
+        
+        Jika previous_results berasal dari sesi dengan domain, JD, dan kriteria yang sama,
+        hanya resume baru yang dinilai lalu disisipkan ke ranking sebelumnya.
+        Dengan generate_narrative=False narasi hanya diambil dari cache (dibuat saat diminta).
+        progress_callback(scored, total) dipanggil setiap kali satu resume selesai dinilai.
+        """
         try:
             if not resume_data:
                 return {"error": "No resume data provided"}
@@ -368,25 +641,59 @@ class ResumeRagChain:
             if not criteria:
                 criteria = self.standardizer.get_domain_specific_criteria()
             
+            # Hanya satu representatif per klaster duplikat yang diproses LLM
+            clusters = near_duplicate_index.cluster([data[0] for data in validated_resume_data])
+            representatives = [validated_resume_data[cluster[0]][0] for cluster in clusters]
+            
             scorer = ResumeScorer(domain=self.domain, criteria=criteria)
-            scoring_results = scorer.compare_resumes([data[0] for data in validated_resume_data], jd_text)
+            jd_digest = text_digest(jd_text or "")
+            same_session = self._is_same_session(previous_results, criteria, jd_digest)
+            if same_session:
+                scoring_results = self._merge_into_session(
+                    scorer, previous_results, validated_resume_data, clusters, jd_text, progress_callback
+                )
+            else:
+                scoring_results = scorer.compare_resumes(representatives, jd_text, progress_callback)
+            scoring_results["domain"] = self.domain
+            scoring_results["jd_digest"] = jd_digest
+            self._expand_duplicate_clusters(scoring_results, clusters)
             
             candidate_id_to_resume = {
                 i+1: (text, name) for i, (text, name) in enumerate(validated_resume_data)
             }
+            known_names = {
+                c.get("digest"): c.get("name") for c in (previous_results or {}).get("ranking", [])
+            }
             
             for candidate in scoring_results.get("ranking", []):
                 cid = candidate["candidate_id"]
                 resume_text, filename = candidate_id_to_resume.get(cid, ("", ""))
-                candidate["name"] = self.getcandidate_name(resume_text, filename)
+                candidate["digest"] = text_digest(resume_text)
+                candidate["name"] = known_names.get(candidate["digest"]) or self.getcandidate_name(resume_text, filename)
+                self._save_catalog_name(resume_text, filename, candidate["name"])
             
-            narrative = asyncio.run(self.generate_llm_narrative_analysis(scoring_results, jd_text))
-            scoring_results["narrative_analysis"] = narrative
+            names_by_id = {c["candidate_id"]: c["name"] for c in scoring_results.get("ranking", [])}
+            for candidate in scoring_results.get("ranking", []):
+                if candidate.get("duplicate_of"):
+                    candidate["duplicate_of"] = names_by_id.get(candidate["duplicate_of"], "")
             
-            if jd_text:
-                st.session_state["last_jd_text"] = jd_text
-            st.session_state["last_narrative_analysis"] = narrative
-            st.session_state["last_scoring_results"] = scoring_results
+            # Perbandingan ranking hanya bermakna untuk domain, JD, dan kriteria yang sama
+            ranking_diff = None
+            if same_session:
+                ranking_diff = self._ranking_diff(previous_results, scoring_results)
+                scoring_results["ranking_diff"] = ranking_diff
+            
+            previous_narrative = previous_results.get("narrative_analysis") if same_session else ""
+            narrative = self.cached_narrative(scoring_results, jd_text)
+            if narrative:
+                scoring_results["narrative_fingerprint"] = self.narrative_fingerprint(scoring_results, jd_text)
+            elif ranking_diff and not ranking_diff["top_changed"] and previous_narrative:
+                logger.info(f"Top-{NARRATIVE_TOP_N} unchanged, reusing previous narrative")
+                narrative = previous_narrative
+            elif generate_narrative:
+                narrative = run_async(self.get_narrative(scoring_results, jd_text))
+            narrative = narrative or ""
+            scoring_results["narrative_analysis"] = narrative
             
             return scoring_results
         except Exception as e:
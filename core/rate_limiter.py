@@ -0,0 +1,316 @@
+import asyncio
+import os
+import re
+import random
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from utils.prompt_compactor import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Batas default mengikuti tier gratis Groq, bisa di-override lewat environment
+DEFAULT_RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", "30"))
+DEFAULT_TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", "6000"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+DEFAULT_COMPLETION_TOKENS = 1024
+
+# Kelas prioritas panggilan LLM (angka kecil = didahulukan)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_BULK: "bulk",
+}
+# Kapasitas yang tidak boleh dipakai panggilan bulk, disisakan untuk permintaan interaktif
+BULK_RESERVED_SLOTS = 1
+BULK_BUCKET_RESERVE = 0.2
+# Error tanpa status/tipe (mis. dibungkus ulang) hanya dianggap rate limit bila pesannya menyebut keduanya;
+# "429" saja bisa muncul di jumlah token, ID request atau ukuran byte
+RATE_LIMIT_MESSAGE_PATTERN = re.compile(r"\b429\b")
+RATE_LIMIT_PHRASE_PATTERN = re.compile(r"rate[ _-]?limit", re.IGNORECASE)
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_NORMAL)
+_session: ContextVar[str] = ContextVar("llm_session", default="")
+
+
+@contextmanager
+def llm_priority(priority: int, session_id: Optional[str] = None):
+    """
+    Run LLM calls made in this context at `priority`, attributed to `session_id`
+
+    The context follows asyncio tasks, asyncio.to_thread and run_async submissions.
+    """
+    priority_token = _priority.set(priority)
+    session_token = _session.set(session_id) if session_id is not None else None
+    try:
+        yield
+    finally:
+        if session_token is not None:
+            _session.reset(session_token)
+        _priority.reset(priority_token)
+
+
+def current_priority() -> Tuple[int, str]:
+    """(priority, session_id) of the calling context"""
+    return _priority.get(), _session.get()
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        """
+        Token bucket that may go into debt when actual usage exceeds the reservation
+
+        Args:
+            capacity: Maximum number of tokens in the bucket
+            refill_per_second: Tokens added per second
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+
+class ModelRateLimiter:
+    def __init__(self, model_name: str, rpm: int = DEFAULT_RPM_LIMIT, tpm: int = DEFAULT_TPM_LIMIT,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Per-model limiter combining request/token buckets with AIMD concurrency control
+
+        Admission is priority-aware: a call waits while a higher-priority call is queued,
+        bulk calls leave a reserved slot and bucket headroom for interactive ones, and
+        sessions competing within one class are limited to a fair share of the slots.
+
+        Args:
+            model_name: LLM model the limits apply to
+            rpm: Requests per minute
+            tpm: Tokens per minute (prompt + completion)
+            max_concurrency: Upper bound for the adaptive concurrency limit
+        """
+        self.model_name = model_name
+        self.request_bucket = TokenBucket(rpm, rpm / 60)
+        self.token_bucket = TokenBucket(tpm, tpm / 60)
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(min(2, max_concurrency))
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.lock = threading.Lock()
+        self.waiting: Dict[int, Dict[str, int]] = {priority: {} for priority in PRIORITY_NAMES}
+        self.session_in_flight: Dict[str, int] = {}
+        self.queue_waits: Dict[int, deque] = {priority: deque(maxlen=200) for priority in PRIORITY_NAMES}
+
+    def estimate_tokens(self, prompt_text: str) -> int:
+        """Prompt token count plus expected completion"""
+        return count_tokens(prompt_text) + DEFAULT_COMPLETION_TOKENS
+
+    def _within_fair_share(self, priority: int, session_id: str, limit: int) -> bool:
+        sessions = self.waiting[priority]
+        if len(sessions) <= 1:
+            return True
+        share = max(1, limit // len(sessions))
+        return self.session_in_flight.get(session_id, 0) < share
+
+    def try_acquire(self, estimated_tokens: int, priority: int = PRIORITY_NORMAL, session_id: str = "") -> float:
+        """Reserve a slot and budget; returns 0 on success or seconds to wait before retrying"""
+        with self.lock:
+            if any(self.waiting[p] for p in PRIORITY_NAMES if p < priority):
+                return 0.05
+            limit = int(self.concurrency_limit)
+            if priority >= PRIORITY_BULK:
+                limit = max(1, limit - BULK_RESERVED_SLOTS)
+            if self.in_flight >= limit or not self._within_fair_share(priority, session_id, limit):
+                return 0.05
+
+            reserve = BULK_BUCKET_RESERVE if priority >= PRIORITY_BULK else 0.0
+            wait = max(
+                self.request_bucket.wait_time(1 + reserve * self.request_bucket.capacity),
+                self.token_bucket.wait_time(estimated_tokens + reserve * self.token_bucket.capacity)
+            )
+            if wait > 0:
+                return wait
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(estimated_tokens)
+            self.in_flight += 1
+            self.session_in_flight[session_id] = self.session_in_flight.get(session_id, 0) + 1
+            return 0.0
+
+    def _set_waiting(self, priority: int, session_id: str, delta: int):
+        with self.lock:
+            counts = self.waiting[priority]
+            counts[session_id] = counts.get(session_id, 0) + delta
+            if counts[session_id] <= 0:
+                del counts[session_id]
+
+    def _record_wait(self, priority: int, waited: float):
+        with self.lock:
+            self.queue_waits[priority].append(waited)
+
+    def acquire(self, estimated_tokens: int, priority: int = PRIORITY_NORMAL, session_id: str = "",
+                timeout: Optional[float] = None) -> bool:
+        """Blocking acquire for synchronous callers; False if `timeout` elapsed first"""
+        started = time.monotonic()
+        self._set_waiting(priority, session_id, 1)
+        try:
+            while True:
+                wait = self.try_acquire(estimated_tokens, priority, session_id)
+                if wait == 0:
+                    break
+                if timeout is not None and time.monotonic() - started + wait > timeout:
+                    return False
+                time.sleep(min(wait, 1.0))
+        finally:
+            self._set_waiting(priority, session_id, -1)
+        self._record_wait(priority, time.monotonic() - started)
+        return True
+
+    async def acquire_async(self, estimated_tokens: int, priority: int = PRIORITY_NORMAL, session_id: str = "",
+                            timeout: Optional[float] = None) -> bool:
+        """Non-blocking acquire for coroutines; False if `timeout` elapsed first"""
+        started = time.monotonic()
+        self._set_waiting(priority, session_id, 1)
+        try:
+            while True:
+                wait = self.try_acquire(estimated_tokens, priority, session_id)
+                if wait == 0:
+                    break
+                if timeout is not None and time.monotonic() - started + wait > timeout:
+                    return False
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            self._set_waiting(priority, session_id, -1)
+        self._record_wait(priority, time.monotonic() - started)
+        return True
+
+    def release(self, latency: float, rate_limited: bool = False,
+                estimated_tokens: int = 0, used_tokens: Optional[int] = None, session_id: str = ""):
+        """Release a slot and adapt the concurrency limit (AIMD)"""
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            remaining = self.session_in_flight.get(session_id, 0) - 1
+            if remaining > 0:
+                self.session_in_flight[session_id] = remaining
+            else:
+                self.session_in_flight.pop(session_id, None)
+            if used_tokens is not None:
+                # Koreksi reservasi dengan pemakaian aktual dari response
+                self.token_bucket.consume(used_tokens - estimated_tokens)
+
+            if rate_limited:
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                logger.warning(f"[{self.model_name}] 429 received, concurrency limit -> {self.concurrency_limit:.1f}")
+                return
+
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            elif latency > 2 * self.latency_ewma:
+                self.concurrency_limit = max(1.0, self.concurrency_limit * 0.75)
+            else:
+                self.concurrency_limit = min(self.max_concurrency,
+                                             self.concurrency_limit + 1 / self.concurrency_limit)
+            self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+
+    def stats(self) -> Dict:
+        with self.lock:
+            queue_wait_p95 = {}
+            for priority, waits in self.queue_waits.items():
+                ordered = sorted(waits)
+                queue_wait_p95[PRIORITY_NAMES[priority]] = (
+                    round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3) if ordered else 0.0
+                )
+            return {
+                "model": self.model_name,
+                "in_flight": self.in_flight,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+                "latency_ewma": round(self.latency_ewma or 0.0, 3),
+                "waiting": {PRIORITY_NAMES[p]: sum(c.values()) for p, c in self.waiting.items()},
+                "queue_wait_p95": queue_wait_p95,
+            }
+
+
+_limiters: Dict[str, ModelRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model_name: str) -> ModelRateLimiter:
+    """Shared limiter per model, reused across chains and Streamlit sessions"""
+    with _limiters_lock:
+        if model_name not in _limiters:
+            _limiters[model_name] = ModelRateLimiter(model_name)
+        return _limiters[model_name]
+
+
+def all_limiter_stats() -> Dict[str, Dict]:
+    """Stats of every model limiter created in this process"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.model_name: limiter.stats() for limiter in limiters}
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status == 429 or type(error).__name__ == "RateLimitError":
+        return True
+    message = str(error)
+    return bool(RATE_LIMIT_MESSAGE_PATTERN.search(message) and RATE_LIMIT_PHRASE_PATTERN.search(message))
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """429, 5xx, timeout dan error koneksi dianggap transient"""
+    if is_rate_limit_error(error):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, ConnectionError)) or name in ("APITimeoutError", "APIConnectionError")
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (seconds or HTTP date) or retry-after-ms from the error response"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def compute_backoff(attempt: int, retry_after: Optional[float] = None,
+                    base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter, never shorter than Retry-After"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after) + random.uniform(0, 0.5)
+    return delay
@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    def __init__(self):
+        """
+        Single-flight layer: concurrent callers with the same key share one in-flight call.
+        Works across threads (Streamlit sessions) and across event loops.
+        """
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._issued = 0
+        self._coalesced = 0
+
+    @staticmethod
+    def make_key(model_name: str, prompt_text: str) -> str:
+        return hashlib.sha256(f"{model_name}\x00{prompt_text}".encode()).hexdigest()
+
+    def _join_or_lead(self, key: str):
+        """Return (future, is_leader)"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            self._issued += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, key: str, func: Callable[[], Any]) -> Any:
+        """Execute `func` once for all concurrent synchronous callers with the same key"""
+        future, is_leader = self._join_or_lead(key)
+        if not is_leader:
+            logger.debug(f"Coalesced LLM call {key[:12]}")
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def arun(self, key: str, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of run; followers await the leader's shared future"""
+        future, is_leader = self._join_or_lead(key)
+        if not is_leader:
+            logger.debug(f"Coalesced LLM call {key[:12]}")
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await coro_factory()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "issued": self._issued,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._in_flight),
+            }
+
+
+request_coalescer = RequestCoalescer()
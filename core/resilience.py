@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Batas waktu end-to-end per use case (detik), bisa di-override lewat environment
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("USE_CASE_DEADLINE_SECONDS", "90"))
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "600"))
+# Panggilan LLM tidak dimulai jika sisa waktu lebih kecil dari ini
+MIN_CALL_BUDGET_SECONDS = 3.0
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+_degradations: ContextVar[Optional[List[str]]] = ContextVar("degradations", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The end-to-end deadline of the current use case has (almost) run out"""
+
+
+class CircuitOpenError(Exception):
+    """The LLM circuit breaker is open after repeated failures"""
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Set a deadline `seconds` from now for work in this context (never extends an outer deadline)"""
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(min(deadline, outer) if outer is not None else deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left until the current deadline, or None when no deadline is set"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(min_budget: float = 0.0) -> Optional[float]:
+    """Return the remaining time, raising DeadlineExceeded when it is below `min_budget`"""
+    remaining = remaining_time()
+    if remaining is not None and remaining < min_budget:
+        raise DeadlineExceeded(f"Sisa waktu {max(remaining, 0):.1f}s tidak cukup")
+    return remaining
+
+
+@contextmanager
+def degradation_scope():
+    """Collect degradation notes recorded in this context; notes also propagate to an outer scope"""
+    notes: List[str] = []
+    parent = _degradations.get()
+    token = _degradations.set(notes)
+    try:
+        yield notes
+    finally:
+        _degradations.reset(token)
+        if parent is not None:
+            parent.extend(note for note in notes if note not in parent)
+
+
+def record_degradation(note: str):
+    """Mark the current result as degraded (a stage fell back to its local path)"""
+    logger.warning(f"Degraded: {note}")
+    notes = _degradations.get()
+    if notes is not None and note not in notes:
+        notes.append(note)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown_seconds: float = CIRCUIT_COOLDOWN_SECONDS):
+        """
+        Consecutive-failure circuit breaker with a single half-open trial call
+
+        Args:
+            name: Protected dependency (model name)
+            failure_threshold: Consecutive failures that open the circuit
+            cooldown_seconds: Time the circuit stays open before a trial call is allowed
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        with self.lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def abandon(self):
+        """Give up an allowed call before it reached the dependency (frees the half-open trial)"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"[{self.name}] circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                if self._state() == "closed" or self.trial_in_flight:
+                    logger.warning(f"[{self.name}] circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {"name": self.name, "state": self._state(), "failures": self.failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Shared circuit breaker per model"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def all_circuit_stats() -> Dict[str, Dict]:
+    """State of every circuit breaker created in this process"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
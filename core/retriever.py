@@ -1,29 +1,249 @@
 from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from core.embedding import get_embedding_model
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from core.quantized_index import QuantizedIndex, QUANTIZED_MODES, DEFAULT_RESCORE_FACTOR
+from utils.candidate_catalog import candidate_catalog
+from utils.resume_chunker import resume_chunker
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import os
-import streamlit as st
-
-def get_retriever():
-    """Initialize and return retriever with session state caching"""
-    if 'retriever' not in st.session_state:
-        embedding = get_embedding_model()
-        vector_store = Chroma(
-            persist_directory="vector_store/chroma",
-            embedding_function=embedding
-        )
-        st.session_state.retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-    return st.session_state.retriever
-
-def add_resume_to_vector_store(resume_text: str, filename: str):
+import time
+import shutil
+import numpy as np
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHROMA_DIR = "vector_store/chroma"
+# float32 (Chroma, default) atau int8/float16 (indeks terkuantisasi dengan rescoring presisi penuh)
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "float32")
+QUANTIZED_INDEX_DIR = "vector_store/quantized"
+# Resume domain "general" ikut dicari di setiap domain; memilih "general" berarti tanpa filter domain
+GENERAL_DOMAIN = "general"
+
+# Retriever dibagi per proses agar dapat dipakai dari worker job (di luar thread skrip Streamlit)
+_retriever = None
+_vector_store = None
+_quantized_index = None
+_retriever_lock = threading.Lock()
+
+class QuantizedRetriever(BaseRetriever):
+    """Retriever over a QuantizedIndex built from the Chroma collection"""
+    index: Any
+    embedding: Any
+    k: int = 5
+    rescore_factor: int = DEFAULT_RESCORE_FACTOR
+    where: Optional[Dict] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        mask = self.index.filter_mask(self.where) if self.where else None
+        hits = self.index.search(self.embedding.embed_query(query), self.k, self.rescore_factor, mask)
+        return [
+            Document(
+                page_content=self.index.texts[row],
+                metadata={**self.index.metadatas[row], "id": self.index.ids[row], "score": score}
+            )
+            for row, score in hits
+        ]
+
+def _load_quantized_index(vector_store: Chroma) -> QuantizedIndex:
+    """Saved quantized index, rebuilt from Chroma's stored embeddings when the collection has changed"""
+    directory = os.path.join(QUANTIZED_INDEX_DIR, VECTOR_STORE_MODE)
+    count = vector_store._collection.count()
+    index = QuantizedIndex.load(directory)
+    if index is not None and index.mode == VECTOR_STORE_MODE and index.source_count == count:
+        return index
+    
+    logger.info(f"Building {VECTOR_STORE_MODE} index from {count} Chroma vectors")
+    stored = vector_store.get(include=["embeddings", "documents", "metadatas"])
+    index = QuantizedIndex(VECTOR_STORE_MODE)
+    if stored["ids"]:
+        index.add(stored["ids"], stored["documents"], stored["embeddings"], stored["metadatas"])
+    index.source_count = count
+    if index.size:
+        index.save(directory)
+    return index
+
+def metadata_filter(sections: Optional[List[str]] = None, domain: Optional[str] = None,
+                    uploaded_after: Optional[float] = None) -> Optional[Dict]:
+    """Chroma where filter for the given sections, domain and minimum upload time (None when unfiltered)"""
+    clauses = []
+    if sections:
+        clauses.append({"section": {"$in": list(sections)}})
+    domain = (domain or GENERAL_DOMAIN).lower()
+    if domain != GENERAL_DOMAIN:
+        clauses.append({"domain": {"$in": [domain, GENERAL_DOMAIN]}})
+    if uploaded_after is not None:
+        clauses.append({"uploaded_at": {"$gte": float(uploaded_after)}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def get_retriever(sections: Optional[List[str]] = None, domain: Optional[str] = None,
+                  uploaded_after: Optional[float] = None):
+    """
+    Initialize and return retriever, cached once per process
+    
+    Filters are pushed down to the vector store, so only the matching chunks are searched.
+    
+    Args:
+        sections: Restrict results to chunks of these resume sections (e.g. ["experience", "skills"])
+        domain: Restrict results to resumes uploaded for this domain (plus general resumes)
+        uploaded_after: Restrict results to resumes first seen at or after this Unix time
+    """
+    global _retriever, _vector_store, _quantized_index
+    with _retriever_lock:
+        if _retriever is None:
+            embedding = get_embedding_model()
+            _vector_store = Chroma(
+                persist_directory=CHROMA_DIR,
+                embedding_function=embedding
+            )
+            if VECTOR_STORE_MODE in QUANTIZED_MODES:
+                _quantized_index = _load_quantized_index(_vector_store)
+                _retriever = QuantizedRetriever(index=_quantized_index, embedding=embedding, k=5)
+            else:
+                _retriever = _vector_store.as_retriever(search_kwargs={"k": 5})
+    
+    where = metadata_filter(sections, domain, uploaded_after)
+    if where is None:
+        return _retriever
+    if _quantized_index is not None:
+        return QuantizedRetriever(index=_quantized_index, embedding=_retriever.embedding, k=5, where=where)
+    return _vector_store.as_retriever(search_kwargs={"k": 5, "filter": where})
+
+def _similarity_function(collection) -> Callable[[float], float]:
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    # Vektor ternormalisasi: jarak L2 kuadrat = 2 - 2 * cosine
+    return (lambda distance: 1.0 - distance / 2.0) if space == "l2" else (lambda distance: 1.0 - distance)
+
+def search_vectors(query_vectors, k: int = 5, where: Optional[Dict] = None) -> List[List[Tuple[Dict, str, float]]]:
+    """Top-k (metadata, text, cosine similarity) hits for each query vector, searched in one batched call"""
+    get_retriever()
+    if _quantized_index is not None:
+        mask = _quantized_index.filter_mask(where) if where else None
+        return [
+            [(_quantized_index.metadatas[row], _quantized_index.texts[row], score) for row, score in hits]
+            for hits in _quantized_index.search_many(query_vectors, k, mask=mask)
+        ]
+    
+    collection = _vector_store._collection
+    if not collection.count():
+        return [[] for _ in query_vectors]
+    result = collection.query(
+        query_embeddings=np.asarray(query_vectors, dtype=np.float32).tolist(), n_results=k, where=where,
+        include=["metadatas", "documents", "distances"]
+    )
+    similarity = _similarity_function(collection)
+    return [
+        [(metadata or {}, document, similarity(distance)) for metadata, document, distance in zip(*row)]
+        for row in zip(result["metadatas"], result["documents"], result["distances"])
+    ]
+
+def candidate_chunk_vectors(candidate_ids: List[str]) -> Tuple[List[Dict], np.ndarray]:
+    """Metadata and embeddings of every stored chunk of the given candidates"""
+    get_retriever()
+    if not candidate_ids:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    where = {"candidate_id": {"$in": list(candidate_ids)}}
+    if _quantized_index is not None:
+        rows = np.flatnonzero(_quantized_index.filter_mask(where))
+        if not len(rows):
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return [_quantized_index.metadatas[row] for row in rows], np.asarray(_quantized_index.full[rows], dtype=np.float32)
+    
+    stored = _vector_store._collection.get(where=where, include=["metadatas", "embeddings"])
+    vectors = np.asarray(stored["embeddings"], dtype=np.float32).reshape(len(stored["ids"]), -1)
+    return [metadata or {} for metadata in stored["metadatas"]], vectors
+
+def has_domain_tags() -> bool:
+    """Whether any stored chunk carries the filter tags (stores indexed before domain tagging have none)"""
+    get_retriever()
+    if _quantized_index is not None:
+        return any("domain" in metadata for metadata in _quantized_index.metadatas)
+    # Tag filter selalu ditulis bersama (tag_chunk_metadata); perbandingan numerik hanya cocok dengan chunk yang punya field-nya
+    return bool(_vector_store._collection.get(where={"uploaded_at": {"$gte": 0.0}}, limit=1, include=[])["ids"])
+
+def chunk_id_prefix(filename: str, digest: str) -> str:
+    """ID prefix of a resume's chunks; the text digest keeps same-named files apart"""
+    return f"{filename}_{digest[:8]}"
+
+def resume_chunk_ids(prefix: str, count: int) -> List[str]:
+    return [f"{prefix}_chunk{i}" for i in range(count)]
+
+def tag_chunk_metadata(chunks: List[Dict], candidate_id: str, domain: Optional[str],
+                       uploaded_at: Optional[float]) -> List[Dict]:
+    """Chunk metadata with the retrieval filter fields: domain, candidate ID (resume text digest) and upload time"""
+    tags = {
+        "domain": (domain or GENERAL_DOMAIN).lower(),
+        "candidate_id": candidate_id,
+        "uploaded_at": uploaded_at or time.time(),
+    }
+    return [{**chunk["metadata"], **tags} for chunk in chunks]
+
+def embedded_in_store(embedding_ref: Optional[str], vector_store: Chroma) -> bool:
+    """Whether the chunks an embedding_ref points to are in the collection (refs to a wiped or rebuilt store are stale)"""
+    if not embedding_ref:
+        return False
+    prefix = embedding_ref.split(":", 1)[-1]
+    return bool(vector_store._collection.get(ids=resume_chunk_ids(prefix, 1), include=[])["ids"])
+
+def merge_domain_tag(vector_store: Chroma, candidate_id: str, domain: Optional[str]) -> int:
+    """
+    Widen the domain tag of an indexed resume that is seen again under another domain
+
+    A chunk holds a single domain tag, so a resume used in two different domains is retagged
+    "general" and stays visible to both domain filters. Returns the number of retagged chunks.
+    """
+    domain = (domain or GENERAL_DOMAIN).lower()
+    stored = vector_store._collection.get(where={"candidate_id": candidate_id}, include=["metadatas"])
+    retag = {
+        chunk_id: {**metadata, "domain": GENERAL_DOMAIN}
+        for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+        if (metadata or {}).get("domain", GENERAL_DOMAIN) not in (domain, GENERAL_DOMAIN)
+    }
+    if not retag:
+        return 0
+    vector_store._collection.update(ids=list(retag), metadatas=list(retag.values()))
+    index = _quantized_index
+    if index is not None:
+        # Pembaruan ditambahkan ke log baris indeks tersimpan (di bawah kunci indeks sendiri)
+        index.update_metadatas(list(retag), list(retag.values()))
+    else:
+        # Jumlah chunk tidak berubah, jadi indeks tersimpan tidak akan terdeteksi usang saat dimuat
+        shutil.rmtree(QUANTIZED_INDEX_DIR, ignore_errors=True)
+    logger.info(f"Resume {candidate_id[:8]} retagged {GENERAL_DOMAIN} ({len(retag)} chunks)")
+    return len(retag)
+
+def add_resume_to_vector_store(resume_text: str, filename: str, domain: str = GENERAL_DOMAIN):
     """Add new resume to vector store with unique ID"""
+    digest = candidate_catalog.upsert_resume(resume_text, filename)
+    resume_record = candidate_catalog.get_resume(digest)
     embedding = get_embedding_model()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = text_splitter.split_text(resume_text)
-    ids = [f"{filename}_chunk{i}" for i in range(len(chunks))]
-    
     vector_store = Chroma(
-        persist_directory="vector_store/chroma",
+        persist_directory=CHROMA_DIR,
         embedding_function=embedding
     )
-    vector_store.add_texts(texts=chunks, ids=ids)
+    if resume_record and embedded_in_store(resume_record.get("embedding_ref"), vector_store):
+        # Resume yang sama sudah ada di vector store, tidak perlu embedding ulang; hanya tag domain yang diperluas
+        merge_domain_tag(vector_store, digest, domain)
+        return
+    
+    # Satu chunk per unit logis resume (entri pengalaman, pendidikan, skills) dengan metadata section
+    section_chunks = resume_chunker.chunk(resume_text, filename)
+    chunks = [chunk["text"] for chunk in section_chunks]
+    metadatas = tag_chunk_metadata(section_chunks, digest, domain, resume_record and resume_record.get("created_at"))
+    prefix = chunk_id_prefix(filename, digest)
+    ids = resume_chunk_ids(prefix, len(chunks))
+    
+    vector_store.add_texts(texts=chunks, metadatas=metadatas, ids=ids)
+    candidate_catalog.set_embedding_ref(digest, f"chroma:{prefix}")
+    
+    index = _quantized_index
+    if index is not None:
+        # Embedding chunk baru diambil dari cache embedding, bukan dihitung ulang; penambahan hanya menulis
+        # baris baru ke file indeks, dan tidak menahan _retriever_lock (indeks punya kunci sendiri)
+        index.add(ids, chunks, embedding.embed_documents(chunks), metadatas)
+        index.source_count = vector_store._collection.count()
+        index.save(os.path.join(QUANTIZED_INDEX_DIR, index.mode))
@@ -1,12 +1,21 @@
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+import bisect
 import logging
 import re
-from utils.resume_standardizer import ResumeStandardizer
+from utils.resume_standardizer import ResumeStandardizer, STANDARDIZER_VERSION
+from utils.experience_calculator import experience_calculator
+from utils.prompt_compactor import prompt_compactor
+from utils.candidate_catalog import candidate_catalog, text_digest
+from core.async_runner import map_in_threads
 
 # Konfigurasi logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+COMBINED_TEXT_TOKEN_BUDGET = 500
+# Naikkan saat ekstraksi fitur berubah; fitur juga bergantung pada record standar yang diekstraksi
+FEATURES_VERSION = f"2/{STANDARDIZER_VERSION}"
+
 class ResumeScorer:
     def __init__(self, domain: str = "general", criteria: Optional[Dict[str, int]] = None):
         """
@@ -63,6 +72,11 @@ class ResumeScorer:
             Dictionary with extracted features
         """
         try:
+            digest, jd_digest = text_digest(resume_text), text_digest(jd_text or "")
+            cached_features = self._load_cached_features(digest, jd_digest)
+            if cached_features:
+                return cached_features
+            
             # Standardize resume first
             standardized_resume = self.standardizer.standardize_resume(resume_text)
             
@@ -92,19 +106,16 @@ class ResumeScorer:
             else:
                 skill_match_score = len(candidate_skills) / 10 if candidate_skills else 0
             
-            # Extract experience years
+            # Extract experience years: hitung lokal dari rentang tanggal, fallback ke nilai LLM
+            experience_years = experience_calculator.calculate_experience_years(standardized_resume)
             experience_match = re.search(r'EXPERIENCE_YEARS:(.+?)(?=\n[A-Z_]+:|$)', standardized_resume)
-            if experience_match:
+            if experience_years == 0 and experience_match:
                 experience_value = experience_match.group(1).strip()
-                if experience_value.lower() == 'not specified':
-                    experience_years = 0  # Nilai default jika 'Not specified'
-                else:
+                if experience_value.lower() != 'not specified':
                     try:
                         experience_years = int(experience_value)
                     except ValueError:
                         experience_years = 0  # Nilai default jika konversi gagal
-            else:
-                experience_years = 0  # Nilai default jika tidak ditemukan
             
             # Extract education level
             education_match = re.search(r'EDUCATION:(.+?)(?=\n[A-Z_]+:|$)', standardized_resume, re.DOTALL)
@@ -174,7 +185,7 @@ class ResumeScorer:
             salary_project_ratio = salary_expectation / (projects_count + 1e-6)  # Avoid division by zero
             exp_skill_interaction = experience_years * skill_match_score
             
-            return {
+            features = {
                 'Skill_Match': skill_match_score,
                 'Experience (Years)': experience_years,
                 'Education': education_level,
@@ -185,9 +196,11 @@ class ResumeScorer:
                 'Salary_Project_Ratio': salary_project_ratio,
                 'Exp_Skill_Interaction': exp_skill_interaction,
                 'Domain Expertise': expertise_score,
-                'Combined_Text': standardized_resume[:2000],
+                'Combined_Text': prompt_compactor.compact(standardized_resume, COMBINED_TEXT_TOKEN_BUDGET)[0],
                 'resume_text': standardized_resume
             }
+            self._save_cached_features(digest, jd_digest, features)
+            return features
             
         except Exception as e:
             logger.error(f"Error extracting features: {str(e)}")
@@ -202,10 +215,26 @@ class ResumeScorer:
                 'Salary_Project_Ratio': 0.0,
                 'Exp_Skill_Interaction': 0.0,
                 'Domain Expertise': 0.0,
-                'Combined_Text': resume_text[:2000],
+                'Combined_Text': prompt_compactor.compact(resume_text, COMBINED_TEXT_TOKEN_BUDGET)[0],
                 'resume_text': resume_text[:1000] + "..."
             }
     
+    def _load_cached_features(self, digest: str, jd_digest: str) -> Optional[Dict]:
+        """Read features extracted earlier for the same resume, domain and job description"""
+        try:
+            return candidate_catalog.get_features(digest, self.domain, jd_digest, FEATURES_VERSION)
+        except Exception as e:
+            logger.warning(f"Feature cache lookup failed: {str(e)}")
+            return None
+    
+    def _save_cached_features(self, digest: str, jd_digest: str, features: Dict):
+        """Persist features only when they come from a catalogued (non-fallback) standardization"""
+        try:
+            if candidate_catalog.get_standardized(digest, self.domain, STANDARDIZER_VERSION):
+                candidate_catalog.save_features(digest, self.domain, jd_digest, features, FEATURES_VERSION)
+        except Exception as e:
+            logger.warning(f"Feature cache write failed: {str(e)}")
+    
     def predict_score(self, features: Dict) -> float:
         """
         Predict AI score using a rule-based approach with domain context
@@ -312,62 +341,63 @@ class ResumeScorer:
         """
         try:
             features = self.extract_features_from_resume(resume_text, jd_text)
-            ai_score = self.predict_score(features)
-            criteria_scores = self.score_by_criteria(ai_score, features)
-            total_score = sum(criteria_scores.values())
-            percentage = (total_score / self.max_score) * 100
-            level = self.detect_experience_level(features)
-            
-            return {
-                "scores": criteria_scores,
-                "total_score": round(total_score, 2),
-                "percentage": round(percentage, 2),
-                "ai_score": round(ai_score, 2),
-                "level": level,
-                "features": features,
-                "standardized_resume": features['resume_text']
-            }
+            return self.score_from_features(features)
             
         except Exception as e:
             logger.error(f"Error scoring resume: {str(e)}")
-            default_scores = {k: 5 * (v/10) for k, v in self.criteria.items()}
-            return {
-                "scores": default_scores,
-                "total_score": sum(default_scores.values()),
-                "percentage": 50.0,
-                "ai_score": 50.0,
-                "level": "mid",
-                "features": {},
-                "standardized_resume": resume_text[:1000] + "..."
-            }
+            return self._default_scoring_result(resume_text[:1000] + "...")
     
-    def compare_resumes(self, resume_texts: List[str], jd_text: Optional[str] = None) -> Dict:
+    def score_from_features(self, features: Dict) -> Dict:
         """
-        Score and compare multiple resumes
+        Score already extracted features under the current criteria (no standardization or LLM call)
         
         Args:
-            resume_texts: List of resume texts
-            jd_text: Job description (optional, for context)
+            features: Features returned by extract_features_from_resume
             
         Returns:
-            Dictionary with ranking results
+            Dictionary with scoring results
         """
-        results = []
-        
-        for i, text in enumerate(resume_texts):
-            scoring_result = self.score_resume(text, jd_text)
-            
-            results.append({
-                "candidate_id": i + 1,
-                **scoring_result,
-                "text": text[:1000] + "...",
-                "score_interpretation": {
-                    k: self.scoring_guide[min(10, max(1, round(v / (self.criteria[k] / 10))))]
-                    for k, v in scoring_result["scores"].items()
-                }
-            })
+        ai_score = self.predict_score(features)
+        criteria_scores = self.score_by_criteria(ai_score, features)
+        total_score = sum(criteria_scores.values())
+        percentage = (total_score / self.max_score) * 100
+        level = self.detect_experience_level(features)
         
-        results.sort(key=lambda x: (x["ai_score"], x["total_score"]), reverse=True)
+        return {
+            "scores": criteria_scores,
+            "total_score": round(total_score, 2),
+            "percentage": round(percentage, 2),
+            "ai_score": round(ai_score, 2),
+            "level": level,
+            "features": features,
+            "standardized_resume": features['resume_text']
+        }
+    
+    def _default_scoring_result(self, standardized_resume: str) -> Dict:
+        default_scores = {k: 5 * (v/10) for k, v in self.criteria.items()}
+        return {
+            "scores": default_scores,
+            "total_score": sum(default_scores.values()),
+            "percentage": 50.0,
+            "ai_score": 50.0,
+            "level": "mid",
+            "features": {},
+            "standardized_resume": standardized_resume
+        }
+    
+    def _interpret_scores(self, scores: Dict[str, float]) -> Dict[str, str]:
+        return {
+            k: self.scoring_guide[min(10, max(1, round(v / (self.criteria[k] / 10))))]
+            for k, v in scores.items()
+        }
+    
+    @staticmethod
+    def _rank_key(result: Dict):
+        return (-result["ai_score"], -result["total_score"])
+    
+    def _rank(self, results: List[Dict]) -> Dict:
+        """Sort scored candidates and assign ranks"""
+        results.sort(key=self._rank_key)
         
         for i, result in enumerate(results):
             result["rank"] = i + 1
@@ -378,3 +408,70 @@ class ResumeScorer:
             "max_score": self.max_score,
             "scoring_guide": self.scoring_guide
         }
+    
+    def rerank(self, scoring_results: Dict) -> Dict:
+        """
+        Re-score and re-rank previous results under this scorer's criteria using their cached features
+        
+        Args:
+            scoring_results: Output of compare_resumes (candidates must carry 'features')
+            
+        Returns:
+            New results dictionary; candidate metadata (name, duplicate_of, ...) is preserved
+        """
+        results = []
+        for candidate in scoring_results.get("ranking", []):
+            entry = dict(candidate)
+            if candidate.get("features"):
+                entry.update(self.score_from_features(candidate["features"]))
+            else:
+                entry.update(self._default_scoring_result(candidate.get("standardized_resume", "")))
+            entry["score_interpretation"] = self._interpret_scores(entry["scores"])
+            results.append(entry)
+        
+        return {**scoring_results, **self._rank(results)}
+    
+    def build_entry(self, candidate_id: int, text: str, scoring_result: Dict) -> Dict:
+        """Ranking entry for one scored resume"""
+        return {
+            "candidate_id": candidate_id,
+            **scoring_result,
+            "text": text[:1000] + "...",
+            "score_interpretation": self._interpret_scores(scoring_result["scores"])
+        }
+    
+    def insert_ranked(self, ranking: List[Dict], entry: Dict) -> int:
+        """
+        Insert an entry into an already sorted ranking (ties keep existing candidates first)
+        
+        Returns:
+            Zero-based position of the inserted entry; ranks are not renumbered
+        """
+        keys = [self._rank_key(r) for r in ranking]
+        position = bisect.bisect_right(keys, self._rank_key(entry))
+        ranking.insert(position, entry)
+        return position
+    
+    def compare_resumes(self, resume_texts: List[str], jd_text: Optional[str] = None,
+                        progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Score and compare multiple resumes
+        
+        Args:
+            resume_texts: List of resume texts
+            jd_text: Job description (optional, for context)
+            progress_callback: Optional callback(scored, total) as resumes finish
+            
+        Returns:
+            Dictionary with ranking results
+        """
+        # Standardisasi dan ekstraksi fitur tiap resume berjalan bersamaan (dibatasi rate limiter)
+        scoring_results = map_in_threads(
+            lambda text: self.score_resume(text, jd_text), resume_texts, progress_callback
+        )
+        results = [
+            self.build_entry(i + 1, text, scoring_result)
+            for i, (text, scoring_result) in enumerate(zip(resume_texts, scoring_results))
+        ]
+        
+        return self._rank(results)
@@ -1,30 +1,240 @@
 import os
+import time
+import sqlite3
+import hashlib
+import argparse
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 from core.embedding import get_embedding_model
+from core.retriever import (CHROMA_DIR, GENERAL_DOMAIN, chunk_id_prefix, embedded_in_store, merge_domain_tag,
+                            resume_chunk_ids, tag_chunk_metadata)
 from langchain_community.vectorstores import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.candidate_catalog import candidate_catalog
+from utils.resume_chunker import resume_chunker
 from utils.resume_parser import parse_resume
-import glob
-
-def initialize_vector_store():
-    """Inisialisasi ChromaDB dengan contoh resume menggunakan ID unik"""
-    embedding = get_embedding_model()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    
-    all_chunks = []
-    all_ids = []
-    for resume_path in glob.glob("data/resumes/*.pdf"):
-        filename = os.path.basename(resume_path)
-        with open(resume_path, "rb") as f:
-            text, _ = parse_resume(f, filename)
-            chunks = text_splitter.split_text(text)
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{filename}_chunk{i}"
-                all_chunks.append(chunk)
-                all_ids.append(chunk_id)
-    
-    Chroma.from_texts(
-        all_chunks,
-        embedding,
-        persist_directory="vector_store/chroma",
-        ids=all_ids
-    )
+
+logger = logging.getLogger(__name__)
+
+RESUME_DIR = "data/resumes"
+RESUME_EXTENSIONS = (".pdf", ".docx")
+# Digest file yang sudah tertulis ke vector store; rerun melewati file tersebut
+CHECKPOINT_PATH = os.getenv("INDEX_CHECKPOINT_PATH", "vector_store/index_checkpoint.sqlite3")
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# File yang diparsing bersamaan per worker, membatasi chunk yang tertahan di memori
+PARSE_WINDOW_PER_WORKER = 4
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the file bytes"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_resumes(directory: str) -> List[str]:
+    """PDF and DOCX files below `directory`, in a stable order"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(RESUME_EXTENSIONS))
+    return sorted(paths)
+
+
+class IndexCheckpoint:
+    def __init__(self, db_path: str = CHECKPOINT_PATH):
+        """
+        Digests of files whose chunks have all been written to the vector store
+
+        Args:
+            db_path: Location of the SQLite checkpoint file
+        """
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS indexed_files (
+                file_digest TEXT PRIMARY KEY,
+                path TEXT,
+                text_digest TEXT,
+                chunks INTEGER,
+                indexed_at REAL
+            )
+        """)
+        self.conn.commit()
+
+    def indexed(self) -> Set[str]:
+        return {row[0] for row in self.conn.execute("SELECT file_digest FROM indexed_files")}
+
+    def mark(self, records: Iterable[Tuple[str, str, str, int]]):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO indexed_files (file_digest, path, text_digest, chunks, indexed_at) VALUES (?, ?, ?, ?, ?)",
+            [record + (now,) for record in records]
+        )
+        self.conn.commit()
+
+    def text_digests(self) -> Set[str]:
+        """Text digests of the source files indexed so far"""
+        return {row[0] for row in self.conn.execute("SELECT DISTINCT text_digest FROM indexed_files")}
+
+    def reset(self):
+        self.conn.execute("DELETE FROM indexed_files")
+        self.conn.commit()
+
+
+def parse_and_chunk(path: str) -> Dict:
+    """Parse one resume and split it into section chunks (runs in a worker process)"""
+    filename = os.path.basename(path)
+    text, error = parse_resume(path, filename)
+    if not text:
+        return {"path": path, "error": error or f"File {filename}: tidak mengandung teks"}
+    return {"path": path, "filename": filename, "text": text, "chunks": resume_chunker.chunk(text, filename)}
+
+
+def parsed_files(paths: List[str], workers: int) -> Iterator[Dict]:
+    """Parse files in a process pool, yielding results in input order with a bounded number in flight"""
+    if workers <= 1:
+        for path in paths:
+            yield parse_and_chunk(path)
+        return
+
+    window = workers * PARSE_WINDOW_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(parse_and_chunk, path))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class BulkIndexer:
+    def __init__(self, checkpoint: IndexCheckpoint, batch_size: int = DEFAULT_BATCH_SIZE,
+                 skip_embedded: bool = True, domain: str = GENERAL_DOMAIN):
+        """
+        Streams chunks into the vector store in fixed-size batches
+
+        A file is checkpointed only once all of its chunks have been written, so an
+        interrupted run resumes at the first file that was not completely stored.
+
+        Args:
+            checkpoint: Checkpoint of completed files
+            batch_size: Chunks embedded and written per batch
+            skip_embedded: Skip texts the catalog already records as embedded
+            domain: Domain tag of the indexed resumes (general resumes are searched in every domain)
+        """
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.skip_embedded = skip_embedded
+        self.domain = domain
+        self.vector_store = Chroma(persist_directory=CHROMA_DIR, embedding_function=get_embedding_model())
+        self.texts: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.ids: List[str] = []
+        # (posisi akhir chunk file dalam aliran, record checkpoint, ada chunk baru, prefiks ID chunk)
+        self.pending_files = deque()
+        self.queued_digests: Set[str] = set()
+        self.appended = 0
+        self.written = 0
+
+    def add(self, parsed: Dict, digest: str) -> int:
+        """Queue the chunks of a parsed file, writing full batches as they fill up; returns the chunk count"""
+        text_digest = candidate_catalog.upsert_resume(parsed["text"], parsed["filename"])
+        record = candidate_catalog.get_resume(text_digest)
+        chunks = parsed["chunks"]
+        embedded = self.skip_embedded and record and embedded_in_store(record.get("embedding_ref"), self.vector_store)
+        if embedded:
+            merge_domain_tag(self.vector_store, text_digest, self.domain)
+        if embedded or text_digest in self.queued_digests:
+            # Teks yang sama sudah diindeks (unggahan atau file lain dengan isi identik)
+            chunks = []
+        self.queued_digests.add(text_digest)
+
+        # Prefiks digest mencegah tabrakan ID antar file bernama sama di subfolder berbeda
+        prefix = chunk_id_prefix(parsed["filename"], text_digest)
+        self.texts.extend(chunk["text"] for chunk in chunks)
+        self.metadatas.extend(tag_chunk_metadata(chunks, text_digest, self.domain, record and record.get("created_at")))
+        self.ids.extend(resume_chunk_ids(prefix, len(chunks)))
+        self.appended += len(chunks)
+        self.pending_files.append((self.appended, (digest, parsed["path"], text_digest, len(chunks)),
+                                   bool(chunks), prefix))
+
+        while len(self.texts) >= self.batch_size:
+            self._write(self.batch_size)
+        self._checkpoint_completed()
+        return len(chunks)
+
+    def flush(self):
+        if self.texts:
+            self._write(len(self.texts))
+        self._checkpoint_completed()
+
+    def _write(self, count: int):
+        self.vector_store.add_texts(texts=self.texts[:count], metadatas=self.metadatas[:count], ids=self.ids[:count])
+        del self.texts[:count], self.metadatas[:count], self.ids[:count]
+        self.written += count
+
+    def _checkpoint_completed(self):
+        completed = []
+        while self.pending_files and self.pending_files[0][0] <= self.written:
+            _, record, has_chunks, prefix = self.pending_files.popleft()
+            if has_chunks:
+                candidate_catalog.set_embedding_ref(record[2], f"chroma:{prefix}")
+            completed.append(record)
+        if completed:
+            self.checkpoint.mark(completed)
+
+
+def initialize_vector_store(source: str = RESUME_DIR, workers: int = DEFAULT_WORKERS,
+                            batch_size: int = DEFAULT_BATCH_SIZE, reset: bool = False,
+                            domain: str = GENERAL_DOMAIN) -> Dict:
+    """Index every PDF/DOCX resume under `source` into ChromaDB, skipping files indexed by earlier runs"""
+    started = time.time()
+    checkpoint = IndexCheckpoint()
+    if reset:
+        checkpoint.reset()
+    done = checkpoint.indexed()
+
+    paths, skipped = [], 0
+    for path in find_resumes(source):
+        digest = file_digest(path)
+        if digest in done:
+            skipped += 1
+        else:
+            paths.append((path, digest))
+    logger.info(f"{len(paths)} file to index, {skipped} already indexed (checkpoint)")
+
+    indexer = BulkIndexer(checkpoint, batch_size, skip_embedded=not reset, domain=domain)
+    digests = dict(paths)
+    stats = {"files": len(paths) + skipped, "skipped": skipped, "indexed": 0, "failed": 0, "chunks": 0}
+    for position, parsed in enumerate(parsed_files([path for path, _ in paths], workers), start=1):
+        if parsed.get("error"):
+            stats["failed"] += 1
+            logger.warning(parsed["error"])
+        else:
+            stats["chunks"] += indexer.add(parsed, digests[parsed["path"]])
+            stats["indexed"] += 1
+        if position % 100 == 0:
+            logger.info(f"Parsed {position}/{len(paths)} files, {indexer.written} chunks written")
+    indexer.flush()
+
+    stats["seconds"] = round(time.time() - started, 1)
+    logger.info(f"Indexing finished: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Indeks resume PDF/DOCX ke vector store secara paralel dan dapat dilanjutkan")
+    parser.add_argument("--source", default=RESUME_DIR, help="Folder resume (dipindai rekursif)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Jumlah proses parsing")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Chunk per batch embedding/penulisan")
+    parser.add_argument("--reset", action="store_true", help="Abaikan checkpoint dan indeks ulang semua file")
+    parser.add_argument("--domain", default=GENERAL_DOMAIN,
+                        help="Tag domain resume yang diindeks (general = dicari di semua domain)")
+    args = parser.parse_args()
+    initialize_vector_store(args.source, args.workers, args.batch_size, args.reset, args.domain.lower())
@@ -3,10 +3,14 @@ import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
 import os
+import time
+import uuid
 import streamlit as st
 # from dotenv import load_dotenv # DIHAPUS
 from app.ui import render_ui, display_scoring_results
-from app.controller import process_use_case
+from app.controller import process_use_case, submit_use_case_job, get_use_case_job, JOB_KINDS
+from core.job_queue import QUEUED, RUNNING, FAILED
+from core.rate_limiter import llm_priority, PRIORITY_INTERACTIVE
 import pandas as pd
 import plotly.express as px
 import json
@@ -34,6 +38,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Interval rerun saat menunggu job latar belakang selesai
+JOB_POLL_SECONDS = 1.0
+
 def main():
     # Inisialisasi semua session state yang diperlukan
     if 'uploaded_resumes' not in st.session_state:
@@ -57,34 +64,52 @@ def main():
         st.session_state.selected_domain = "General"
     if 'processed_flag' not in st.session_state:
         st.session_state.processed_flag = False
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
 
     st.set_page_config(page_title="RAG Resume Analyzer", layout="wide")
     st.title("📄 AI Resume Analyzer with Groq")
     
     logger.info("Starting application")
+    # Panggilan LLM langsung dari skrip (QA, profiling, regenerasi narasi) didahulukan di atas job bulk
+    with llm_priority(PRIORITY_INTERACTIVE, st.session_state.session_id):
+        run_app()
+
+def run_app():
+    """Render the UI and dispatch the selected use case"""
     use_case, inputs, question = render_ui()
     
-    if use_case == "Compare with Scoring":
-        logger.info("Processing Compare with Scoring use case")
+    if use_case in JOB_KINDS:
+        # Diproses sebagai job latar belakang agar UI tetap responsif dan pekerjaan tidak hilang saat rerun
         if inputs:
-            with st.spinner("Memproses..."):
-                logger.debug(f"Inputs received: {len(inputs['resume_data'])} resumes")
-                results = process_use_case(use_case, inputs, question)
-                if isinstance(results, dict) and "ranking" in results:
-                    st.session_state["last_scoring_results"] = results
-                    st.session_state["show_scoring_results"] = True
-                    logger.info(f"Processing completed, results stored with {len(results['ranking'])} candidates")
-                    st.subheader("Hasil Perbandingan Skor")
-                    display_scoring_results(results)  # Tampilkan hasil langsung
-                else:
-                    st.error("Gagal memproses skor. Pastikan input valid.")
-                    logger.error(f"Processing failed: {results}")
-        else:
-            if st.session_state.get("show_scoring_results") and st.session_state.get("last_scoring_results"):
+            logger.info(f"Submitting background job for use case: {use_case}")
+            submit_use_case_job(use_case, inputs, question)
+        
+        job = get_use_case_job(use_case)
+        if job and job["status"] in (QUEUED, RUNNING):
+            st.progress(job["progress"] or 0.0, text=job["message"] or "Menunggu giliran di antrean...")
+            time.sleep(JOB_POLL_SECONDS)
+            st.rerun()
+        elif job and job["status"] == FAILED:
+            st.error(f"Gagal memproses: {job['error']}")
+            logger.error(f"Job failed for {use_case}: {job['error']}")
+        elif use_case == "Compare with Scoring":
+            results = job["result"] if job and job.get("just_finished") else None
+            if isinstance(results, dict) and "ranking" in results:
+                logger.info(f"Processing completed, results stored with {len(results['ranking'])} candidates")
+                st.subheader("Hasil Perbandingan Skor")
+                display_scoring_results(results)  # Tampilkan hasil langsung
+            elif results is not None:
+                st.error("Gagal memproses skor. Pastikan input valid.")
+                logger.error(f"Processing failed: {results}")
+            elif st.session_state.get("show_scoring_results") and st.session_state.get("last_scoring_results"):
                 st.subheader("Hasil Perbandingan Skor Terakhir")
                 display_scoring_results(st.session_state["last_scoring_results"])
             else:
                 logger.info("No inputs provided for Compare with Scoring")
+        elif job:
+            st.subheader("Hasil")
+            st.write(job["result"])
     
     else:
         if inputs:
@@ -0,0 +1,235 @@
+import os
+import re
+import time
+import shutil
+import sqlite3
+import random
+import argparse
+import logging
+from typing import Dict, List, Optional, Set
+import numpy as np
+from core.embedding import get_embedding_model
+from core.retriever import (CHROMA_DIR, GENERAL_DOMAIN, QUANTIZED_INDEX_DIR, chunk_id_prefix, resume_chunk_ids,
+                            tag_chunk_metadata)
+from langchain_community.vectorstores import Chroma
+from utils.candidate_catalog import candidate_catalog
+from utils.resume_chunker import resume_chunker
+
+logger = logging.getLogger(__name__)
+
+# Batas ukuran batch operasi Chroma (get/add/delete)
+STORE_BATCH_SIZE = 1000
+LATENCY_QUERIES = 50
+# ID chunk: "{prefix}_chunk{i}"; prefiks lama (sebelum digest ditambahkan) hanya nama file
+CHUNK_ID_PATTERN = re.compile(r"^(?P<prefix>.*)_chunk\d+$")
+# Salinan terkompaksi dibangun di sini lalu ditukar dengan vector store aktif
+COMPACT_STAGING_DIR = f"{CHROMA_DIR}.compacting"
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def expected_prefix(record: Dict) -> str:
+    """Chunk ID prefix a catalog resume was indexed under (legacy refs map to the current scheme)"""
+    ref = (record.get("embedding_ref") or "").split(":", 1)[-1]
+    if ref.endswith(f"_{record['digest'][:8]}"):
+        return ref
+    return chunk_id_prefix(record.get("filename") or "resume", record["digest"])
+
+
+def plan_reconciliation(stored_ids: Set[str], keep_digests: Optional[Set[str]] = None,
+                        stored_metadatas: Optional[Dict[str, Dict]] = None) -> Dict:
+    """
+    Compare the store with the catalog: chunks no live resume owns are orphans, expected chunks absent from the store are missing
+
+    Only chunks owned by a candidate the catalog knows can be orphans; chunks of unknown (or
+    untagged) candidates are reported as unowned and never deleted, so a store restored or copied
+    without its catalog is not wiped. Chunks stored under a resume's legacy ref ("{filename}_chunk{i}",
+    without candidate tags) are owned by that resume and become orphans once its chunks are
+    re-added under the current ID scheme.
+
+    Args:
+        stored_ids: Chunk IDs currently in the collection
+        keep_digests: Only keep resumes with these text digests (None keeps every embedded resume)
+        stored_metadatas: Stored metadata per chunk ID; kept chunks without filter tags are planned for retagging
+    """
+    stored_metadatas = stored_metadatas or {}
+    expected: Dict[str, Dict] = {}
+    refs: Dict[str, str] = {}
+    dropped: List[str] = []
+    legacy_owners: Dict[str, str] = {}
+    for record in candidate_catalog.list_embedded():
+        ref = (record.get("embedding_ref") or "").split(":", 1)[-1]
+        prefix = expected_prefix(record)
+        if ref and ref != prefix:
+            legacy_owners[ref] = record["digest"]
+        if keep_digests is not None and record["digest"] not in keep_digests:
+            dropped.append(record["digest"])
+            continue
+        chunks = resume_chunker.chunk(record["raw_text"], record.get("filename") or "")
+        metadatas = tag_chunk_metadata(chunks, record["digest"], GENERAL_DOMAIN, record.get("created_at"))
+        chunks = [{**chunk, "metadata": metadata} for chunk, metadata in zip(chunks, metadatas)]
+        expected.update(zip(resume_chunk_ids(prefix, len(chunks)), chunks))
+        refs[record["digest"]] = f"chroma:{prefix}"
+
+    known = set(candidate_catalog.list_digests())
+    orphans, unowned = [], []
+    for chunk_id in sorted(stored_ids - expected.keys()):
+        match = CHUNK_ID_PATTERN.match(chunk_id)
+        owner = (stored_metadatas.get(chunk_id) or {}).get("candidate_id") or (
+            legacy_owners.get(match.group("prefix")) if match else None
+        )
+        (orphans if owner in known else unowned).append(chunk_id)
+
+    return {
+        "orphans": orphans,
+        "unowned": unowned,
+        "missing": {chunk_id: chunk for chunk_id, chunk in expected.items() if chunk_id not in stored_ids},
+        "retag": {
+            # Domain yang sudah tercatat dipertahankan
+            chunk_id: {**chunk["metadata"], "domain": (stored_metadatas[chunk_id] or {}).get("domain", GENERAL_DOMAIN)}
+            for chunk_id, chunk in expected.items()
+            if chunk_id in stored_metadatas and "candidate_id" not in (stored_metadatas[chunk_id] or {})
+        },
+        "refs": refs,
+        "dropped": dropped,
+    }
+
+
+def query_latency(vector_store: Chroma, query_embeddings: List[List[float]], k: int = 5) -> Dict[str, float]:
+    """p50/p95 latency (ms) of nearest-neighbour queries against the collection"""
+    if not query_embeddings:
+        return {"p50_ms": 0.0, "p95_ms": 0.0}
+    latencies = []
+    for embedding in query_embeddings:
+        started = time.perf_counter()
+        vector_store._collection.query(query_embeddings=[embedding], n_results=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {"p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2)}
+
+
+def compact(vector_store: Chroma) -> Chroma:
+    """
+    Copy the collection without deleted entries (fresh HNSW index) into a staging directory and VACUUM it
+
+    The live store is not modified; swap_compacted() replaces it once the copy is complete.
+    """
+    stored = vector_store._collection.get(include=["embeddings", "documents", "metadatas"])
+    shutil.rmtree(COMPACT_STAGING_DIR, ignore_errors=True)
+    try:
+        rebuilt = Chroma(collection_name=vector_store._collection.name, persist_directory=COMPACT_STAGING_DIR,
+                         embedding_function=get_embedding_model())
+        for start in range(0, len(stored["ids"]), STORE_BATCH_SIZE):
+            end = start + STORE_BATCH_SIZE
+            rebuilt._collection.add(
+                ids=stored["ids"][start:end],
+                embeddings=stored["embeddings"][start:end],
+                documents=stored["documents"][start:end],
+                metadatas=[metadata or {"section": "other"} for metadata in stored["metadatas"][start:end]],
+            )
+        if rebuilt._collection.count() != len(stored["ids"]):
+            raise RuntimeError(f"Kompaksi tidak lengkap: {rebuilt._collection.count()} dari {len(stored['ids'])} chunk")
+        conn = sqlite3.connect(os.path.join(COMPACT_STAGING_DIR, "chroma.sqlite3"), timeout=30)
+        conn.execute("VACUUM")
+        conn.close()
+    except Exception:
+        shutil.rmtree(COMPACT_STAGING_DIR, ignore_errors=True)
+        raise
+    return rebuilt
+
+
+def swap_compacted():
+    """Replace the live store with the compacted copy"""
+    previous = f"{CHROMA_DIR}.previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    os.replace(CHROMA_DIR, previous)
+    os.replace(COMPACT_STAGING_DIR, CHROMA_DIR)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def maintain_vector_store(apply: bool = False, source_only: bool = False, compact_store: bool = True) -> Dict:
+    """
+    Reconcile the vector store with the candidate catalog, delete orphaned chunks and compact the index
+
+    Args:
+        apply: Modify the store (otherwise only report what would change)
+        source_only: Keep only resumes indexed from source files by initialize_db.py (drops session uploads)
+        compact_store: Rebuild the collection and VACUUM after deleting
+    """
+    vector_store = Chroma(persist_directory=CHROMA_DIR, embedding_function=get_embedding_model())
+    stored = vector_store._collection.get(include=["metadatas"])
+    stored_ids = set(stored["ids"])
+    keep_digests = None
+    if source_only:
+        from initialize_db import IndexCheckpoint
+        keep_digests = IndexCheckpoint().text_digests()
+    plan = plan_reconciliation(stored_ids, keep_digests, dict(zip(stored["ids"], stored["metadatas"])))
+
+    # Query yang sama sebelum dan sesudah: embedding chunk yang tetap ada
+    surviving = sorted(stored_ids - set(plan["orphans"]))
+    sample_ids = random.Random(0).sample(surviving, min(LATENCY_QUERIES, len(surviving)))
+    queries = vector_store._collection.get(ids=sample_ids, include=["embeddings"])["embeddings"] if sample_ids else []
+
+    report = {
+        "chunks": len(stored_ids),
+        "orphans": len(plan["orphans"]),
+        "unowned": len(plan["unowned"]),
+        "missing": len(plan["missing"]),
+        "untagged": len(plan["retag"]),
+        "dropped_resumes": len(plan["dropped"]),
+        "size_before_bytes": directory_size(CHROMA_DIR),
+        "latency_before": query_latency(vector_store, queries),
+    }
+    logger.info(f"Reconciliation plan: {report}")
+    if plan["unowned"]:
+        logger.warning(f"{len(plan['unowned'])} chunk milik kandidat yang tidak ada di katalog dibiarkan; "
+                       f"pulihkan katalog (snapshot_db.py restore) atau jalankan initialize_db.py")
+    if not apply:
+        return report
+
+    # Chunk baru ditulis sebelum chunk yatim dihapus: resume berformat lama tidak pernah hilang dari store
+    missing_ids = list(plan["missing"])
+    for start in range(0, len(missing_ids), STORE_BATCH_SIZE):
+        batch = [plan["missing"][chunk_id] for chunk_id in missing_ids[start:start + STORE_BATCH_SIZE]]
+        vector_store.add_texts(texts=[chunk["text"] for chunk in batch],
+                               metadatas=[chunk["metadata"] for chunk in batch],
+                               ids=missing_ids[start:start + STORE_BATCH_SIZE])
+    retag_ids = list(plan["retag"])
+    for start in range(0, len(retag_ids), STORE_BATCH_SIZE):
+        batch_ids = retag_ids[start:start + STORE_BATCH_SIZE]
+        vector_store._collection.update(ids=batch_ids, metadatas=[plan["retag"][chunk_id] for chunk_id in batch_ids])
+    for start in range(0, len(plan["orphans"]), STORE_BATCH_SIZE):
+        vector_store._collection.delete(ids=plan["orphans"][start:start + STORE_BATCH_SIZE])
+    for digest, ref in plan["refs"].items():
+        candidate_catalog.set_embedding_ref(digest, ref)
+    candidate_catalog.clear_embedding_ref(plan["dropped"])
+
+    if compact_store:
+        vector_store = compact(vector_store)
+    # Diukur sebelum pertukaran, selagi klien Chroma masih menunjuk ke direktori salinan
+    report["chunks_after"] = vector_store._collection.count()
+    report["latency_after"] = query_latency(vector_store, queries)
+    if compact_store:
+        swap_compacted()
+    # Indeks terkuantisasi dibangun ulang dari koleksi yang sudah dibersihkan saat retriever berikutnya dimuat
+    shutil.rmtree(QUANTIZED_INDEX_DIR, ignore_errors=True)
+
+    report["size_after_bytes"] = directory_size(CHROMA_DIR)
+    report["reclaimed_bytes"] = report["size_before_bytes"] - report["size_after_bytes"]
+    logger.info(f"Maintenance finished: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Rekonsiliasi, pembersihan chunk yatim, dan kompaksi vector store")
+    parser.add_argument("--apply", action="store_true", help="Terapkan perubahan (default: hanya laporan)")
+    parser.add_argument("--source-only", action="store_true",
+                        help="Hanya pertahankan resume dari file sumber initialize_db.py (hapus unggahan sesi)")
+    parser.add_argument("--no-compact", action="store_true", help="Lewati rebuild koleksi dan VACUUM")
+    args = parser.parse_args()
+    result = maintain_vector_store(args.apply, args.source_only, not args.no_compact)
+    for key, value in result.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import argparse
+import logging
+from typing import Dict, List
+import numpy as np
+from core.embedding import embedding_model_name
+from core.retriever import CHROMA_DIR, QUANTIZED_INDEX_DIR
+from langchain_community.vectorstores import Chroma
+from utils.candidate_catalog import candidate_catalog
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "resume-analysis-vector-snapshot"
+SNAPSHOT_VERSION = 2
+# Versi 1 belum menyertakan katalog kandidat
+SUPPORTED_VERSIONS = (1, 2)
+MANIFEST_NAME = "manifest.json"
+CATALOG_MEMBER = "catalog.jsonl"
+DEFAULT_SNAPSHOT_PATH = "data/vector_store_snapshot.zip"
+# float16 memperkecil snapshot hampir separuh; vektor dikembalikan ke float32 saat restore
+SNAPSHOT_DTYPES = {"float32": "<f4", "float16": "<f2"}
+# Satu halaman snapshot = satu batch insert; di bawah batas batch default Chroma (5461)
+SNAPSHOT_PAGE_SIZE = 5000
+
+
+def _write_member(archive: zipfile.ZipFile, name: str, data: bytes) -> str:
+    archive.writestr(name, data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def _read_member(archive: zipfile.ZipFile, name: str, sha256: str) -> bytes:
+    data = archive.read(name)
+    if hashlib.sha256(data).hexdigest() != sha256:
+        raise ValueError(f"Checksum snapshot tidak cocok untuk {name}")
+    return data
+
+
+def read_manifest(archive: zipfile.ZipFile) -> Dict:
+    manifest = json.loads(archive.read(MANIFEST_NAME))
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Format snapshot tidak dikenali: {manifest.get('format')} v{manifest.get('version')}")
+    return manifest
+
+
+def export_snapshot(path: str = DEFAULT_SNAPSHOT_PATH, dtype: str = "float32",
+                    page_size: int = SNAPSHOT_PAGE_SIZE) -> Dict:
+    """
+    Write the vector store (ids, documents, metadata, packed embeddings) to one compressed file
+
+    Each page of the collection becomes a JSON-lines records member and a raw little-endian
+    embeddings member. The catalog rows of the indexed resumes (text and embedding ref) are
+    included so a restored node can reconcile and resolve its chunks. The manifest lists every
+    member with its SHA-256. The store should not be written to while exporting.
+
+    Args:
+        path: Snapshot file to create
+        dtype: Packed embedding dtype (float32 or float16)
+        page_size: Chunks per page (and per insert batch on restore)
+    """
+    started = time.time()
+    packed = np.dtype(SNAPSHOT_DTYPES[dtype])
+    collection = Chroma(persist_directory=CHROMA_DIR)._collection
+    total = collection.count()
+    pages: List[Dict] = []
+    dim = 0
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = f"{path}.partial"
+    with zipfile.ZipFile(partial, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for offset in range(0, total, page_size):
+            batch = collection.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+            if not len(batch["ids"]):
+                break
+            vectors = np.asarray(batch["embeddings"], dtype=packed)
+            dim = vectors.shape[1]
+            records = "".join(
+                json.dumps({"id": chunk_id, "document": document, "metadata": metadata}, ensure_ascii=False) + "\n"
+                for chunk_id, document, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"])
+            )
+            name = f"pages/{len(pages):05d}"
+            pages.append({
+                "count": len(batch["ids"]),
+                "records": name + ".jsonl",
+                "records_sha256": _write_member(archive, name + ".jsonl", records.encode("utf-8")),
+                "embeddings": name + ".bin",
+                "embeddings_sha256": _write_member(archive, name + ".bin", vectors.tobytes()),
+            })
+
+        # Tanpa baris katalog, node hasil restore menganggap semua chunk yatim
+        resumes = candidate_catalog.list_embedded()
+        catalog = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in resumes)
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "created_at": time.time(),
+            "collection": collection.name,
+            "embedding_model": embedding_model_name(),
+            "dim": dim,
+            "dtype": packed.str,
+            "count": sum(page["count"] for page in pages),
+            "pages": pages,
+            "catalog": {"records": CATALOG_MEMBER, "count": len(resumes),
+                        "records_sha256": _write_member(archive, CATALOG_MEMBER, catalog.encode("utf-8"))},
+        }
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    os.replace(partial, path)
+
+    report = {"chunks": manifest["count"], "resumes": len(resumes), "pages": len(pages), "bytes": os.path.getsize(path),
+              "seconds": round(time.time() - started, 2)}
+    logger.info(f"Snapshot written to {path}: {report}")
+    return report
+
+
+def restore_snapshot(path: str = DEFAULT_SNAPSHOT_PATH, replace: bool = False, force: bool = False) -> Dict:
+    """
+    Restore a snapshot into the vector store by bulk insert, without re-encoding
+
+    The collection is built in a staging directory and swapped in only after every page
+    has passed its checksum, so a failed restore leaves the current store untouched. The
+    snapshot's resumes are then upserted into the candidate catalog with their embedding refs.
+
+    Args:
+        path: Snapshot file to restore
+        replace: Replace an existing vector store
+        force: Restore even if the snapshot was built with a different embedding model
+    """
+    started = time.time()
+    if os.path.isdir(CHROMA_DIR) and os.listdir(CHROMA_DIR) and not replace:
+        raise ValueError(f"Vector store {CHROMA_DIR} sudah berisi data; gunakan --replace untuk menggantinya")
+
+    staging = f"{CHROMA_DIR}.restoring"
+    shutil.rmtree(staging, ignore_errors=True)
+    with zipfile.ZipFile(path) as archive:
+        manifest = read_manifest(archive)
+        if manifest["embedding_model"] != embedding_model_name() and not force:
+            raise ValueError(
+                f"Snapshot dibuat dengan model {manifest['embedding_model']}, "
+                f"bukan {embedding_model_name()}; gunakan --force untuk tetap memulihkan"
+            )
+
+        packed = np.dtype(manifest["dtype"])
+        try:
+            collection = Chroma(collection_name=manifest["collection"], persist_directory=staging)._collection
+            for page in manifest["pages"]:
+                records = [json.loads(line) for line in
+                           _read_member(archive, page["records"], page["records_sha256"]).decode("utf-8").splitlines()]
+                vectors = np.frombuffer(_read_member(archive, page["embeddings"], page["embeddings_sha256"]),
+                                        dtype=packed).reshape(page["count"], manifest["dim"])
+                collection.add(
+                    ids=[record["id"] for record in records],
+                    embeddings=vectors.astype(np.float32).tolist(),
+                    documents=[record["document"] for record in records],
+                    metadatas=[record["metadata"] or {"section": "other"} for record in records],
+                )
+            restored = collection.count()
+            if restored != manifest["count"]:
+                raise ValueError(f"Restore tidak lengkap: {restored} dari {manifest['count']} chunk")
+            resumes = []
+            if "catalog" in manifest:
+                resumes = [json.loads(line) for line in _read_member(
+                    archive, manifest["catalog"]["records"], manifest["catalog"]["records_sha256"]
+                ).decode("utf-8").splitlines()]
+            else:
+                logger.warning(f"Snapshot {path} tidak memuat katalog kandidat; "
+                               f"jalankan initialize_db.py untuk mengisinya")
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    previous = f"{CHROMA_DIR}.previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(CHROMA_DIR):
+        os.replace(CHROMA_DIR, previous)
+    os.replace(staging, CHROMA_DIR)
+    shutil.rmtree(previous, ignore_errors=True)
+    candidate_catalog.import_resumes(resumes)
+    # Indeks terkuantisasi dibangun ulang dari embedding koleksi baru saat retriever dimuat
+    shutil.rmtree(QUANTIZED_INDEX_DIR, ignore_errors=True)
+
+    report = {"chunks": restored, "resumes": len(resumes), "pages": len(manifest["pages"]),
+              "seconds": round(time.time() - started, 2)}
+    logger.info(f"Snapshot {path} restored: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Ekspor/impor snapshot vector store untuk cold start tanpa embedding ulang")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Tulis vector store ke file snapshot")
+    export_parser.add_argument("path", nargs="?", default=DEFAULT_SNAPSHOT_PATH)
+    export_parser.add_argument("--dtype", choices=sorted(SNAPSHOT_DTYPES), default="float32",
+                               help="Tipe embedding di snapshot")
+    restore_parser = commands.add_parser("restore", help="Pulihkan vector store dari file snapshot")
+    restore_parser.add_argument("path", nargs="?", default=DEFAULT_SNAPSHOT_PATH)
+    restore_parser.add_argument("--replace", action="store_true", help="Ganti vector store yang sudah ada")
+    restore_parser.add_argument("--force", action="store_true", help="Abaikan perbedaan model embedding")
+    args = parser.parse_args()
+    if args.command == "export":
+        result = export_snapshot(args.path, args.dtype)
+    else:
+        result = restore_snapshot(args.path, args.replace, args.force)
+    for key, value in result.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modul aplikasi diimpor dari akar repositori, sama seperti saat menjalankan main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,59 @@
+from utils.jd_facets import JDFacetExtractor, jd_facet_extractor
+
+JD = """PT Maju Jaya adalah perusahaan manufaktur terkemuka.
+
+Tanggung Jawab:
+- Mengelola proses rekrutmen end-to-end
+- Menyusun laporan bulanan
+
+Kualifikasi:
+- Minimal S1 Psikologi atau Manajemen SDM
+- Pengalaman minimal 2 tahun di bidang HR
+- Menguasai HRIS dan payroll
+
+Benefit:
+- Asuransi kesehatan
+"""
+
+
+def test_classify_requirement_lines():
+    assert JDFacetExtractor.classify("Minimal S1 Psikologi") == "education"
+    assert JDFacetExtractor.classify("IPK minimal 3.00") == "education"
+    assert JDFacetExtractor.classify("Berpengalaman 3 tahun sebagai recruiter") == "experience"
+    assert JDFacetExtractor.classify("Menguasai Microsoft Excel") == "skills"
+
+
+def test_structured_jd_is_split_into_facets():
+    facets = {facet["facet"]: facet["text"] for facet in jd_facet_extractor.extract(JD)}
+
+    assert list(facets) == ["skills", "experience", "education"]
+    assert facets["skills"] == "Skills:\nMenguasai HRIS dan payroll"
+    # Tanggung jawab menggambarkan pengalaman yang diharapkan
+    assert facets["experience"] == (
+        "Experience:\nMengelola proses rekrutmen end-to-end\nMenyusun laporan bulanan\n"
+        "Pengalaman minimal 2 tahun di bidang HR"
+    )
+    assert facets["education"] == "Education:\nMinimal S1 Psikologi atau Manajemen SDM"
+
+
+def test_company_profile_and_benefits_are_ignored():
+    text = "\n".join(facet["text"] for facet in jd_facet_extractor.extract(JD))
+
+    assert "manufaktur" not in text
+    assert "Asuransi" not in text
+
+
+def test_jd_without_headings_classifies_every_line():
+    facets = jd_facet_extractor.extract("Lulusan S1 Teknik\nMenguasai Python")
+
+    assert [facet["facet"] for facet in facets] == ["skills", "education"]
+
+
+def test_empty_jd_falls_back_to_overall():
+    assert jd_facet_extractor.extract("Benefit:\n- Asuransi") == [{"facet": "overall", "text": "Benefit:\n- Asuransi"}]
+
+
+def test_facet_text_is_truncated():
+    facets = JDFacetExtractor(max_chars=20).extract("Menguasai " + "Python " * 10)
+
+    assert len(facets[0]["text"]) == len("Skills:\n") + 20
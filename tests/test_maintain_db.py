@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("langchain_community")
+
+import maintain_db
+from core.retriever import GENERAL_DOMAIN
+from utils.candidate_catalog import CandidateCatalog
+
+RESUME = """Budi Santoso
+budi@example.com
+
+Experience
+HR Generalist, PT Maju Jaya
+Jan 2019 - Des 2022
+- Mengelola rekrutmen dan onboarding karyawan baru untuk seluruh divisi
+- Menyusun kebijakan kompensasi dan benefit perusahaan
+
+Education
+S1 Psikologi, Universitas Indonesia
+2014 - 2018
+
+Skills
+Rekrutmen, HRIS, Payroll, Employee Relations
+"""
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    catalog = CandidateCatalog(str(tmp_path / "catalog.sqlite3"))
+    monkeypatch.setattr(maintain_db, "candidate_catalog", catalog)
+    return catalog
+
+
+def test_legacy_chunks_are_owned_and_replaced(catalog):
+    digest = catalog.upsert_resume(RESUME, "budi.pdf")
+    catalog.set_embedding_ref(digest, "chroma:budi.pdf")
+    # Layout lama: "{filename}_chunk{i}" tanpa tag kandidat
+    legacy_ids = {f"budi.pdf_chunk{i}" for i in range(3)}
+
+    plan = maintain_db.plan_reconciliation(legacy_ids, stored_metadatas={chunk_id: None for chunk_id in legacy_ids})
+
+    prefix = f"budi.pdf_{digest[:8]}"
+    assert plan["orphans"] == sorted(legacy_ids)
+    assert plan["unowned"] == []
+    assert plan["missing"] and all(chunk_id.startswith(prefix + "_chunk") for chunk_id in plan["missing"])
+    assert plan["refs"] == {digest: f"chroma:{prefix}"}
+
+
+def test_current_layout_is_stable(catalog):
+    digest = catalog.upsert_resume(RESUME, "budi.pdf")
+    catalog.set_embedding_ref(digest, "chroma:budi.pdf")
+    first = maintain_db.plan_reconciliation(set())
+    stored = {chunk_id: chunk["metadata"] for chunk_id, chunk in first["missing"].items()}
+
+    plan = maintain_db.plan_reconciliation(set(stored), stored_metadatas=stored)
+
+    assert plan["orphans"] == plan["unowned"] == []
+    assert plan["missing"] == plan["retag"] == {}
+    assert all(metadata["domain"] == GENERAL_DOMAIN for metadata in stored.values())
+
+
+def test_chunks_of_unknown_candidates_are_kept(catalog):
+    digest = catalog.upsert_resume(RESUME, "budi.pdf")
+    catalog.set_embedding_ref(digest, f"chroma:budi.pdf_{digest[:8]}")
+    stored = {"lain.pdf_chunk0": None, "lain.pdf_0123abcd_chunk0": {"candidate_id": "0123abcd" * 8}}
+
+    plan = maintain_db.plan_reconciliation(set(stored), stored_metadatas=stored)
+
+    assert plan["orphans"] == []
+    assert plan["unowned"] == sorted(stored)
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from core.quantized_index import QuantizedIndex
+
+
+def _vectors(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _rows(start, count):
+    ids = [f"resume_{i}" for i in range(start, start + count)]
+    texts = [f"Resume {i}" for i in range(start, start + count)]
+    metadatas = [{"domain": "hr" if i % 2 else "it", "uploaded_at": float(i)} for i in range(start, start + count)]
+    return ids, texts, metadatas
+
+
+def _add(index, start, vectors):
+    ids, texts, metadatas = _rows(start, len(vectors))
+    index.add(ids, texts, vectors, metadatas)
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_search_finds_the_exact_vector(mode):
+    vectors = _vectors(50)
+    index = QuantizedIndex(mode)
+    _add(index, 0, vectors)
+
+    results = index.search(vectors[7], k=3)
+
+    assert results[0][0] == 7
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_save_load_round_trip_with_appends(tmp_path, mode):
+    vectors = _vectors(30)
+    index = QuantizedIndex(mode)
+    ids, texts, metadatas = _rows(0, 20)
+    index.add(ids, texts, vectors[:20], metadatas)
+    index.source_count = 20
+    index.save(str(tmp_path))
+    # Setelah disimpan, penambahan dan pembaruan metadata langsung ditulis ke file
+    ids, texts, metadatas = _rows(20, 10)
+    index.add(ids, texts, vectors[20:] * 3, metadatas)
+    index.update_metadatas(["resume_3"], [{"domain": "finance", "uploaded_at": 3.0}])
+
+    loaded = QuantizedIndex.load(str(tmp_path))
+
+    assert loaded.mode == mode
+    assert loaded.ids == index.ids and loaded.texts == index.texts
+    assert loaded.metadatas == index.metadatas
+    assert loaded.source_count == 20
+    np.testing.assert_array_equal(loaded.codes, index.codes)
+    np.testing.assert_array_equal(np.asarray(loaded.full), np.asarray(index.full))
+    assert loaded.search(vectors[25], k=1) == index.search(vectors[25], k=1)
+
+
+def test_load_rejects_missing_or_truncated_index(tmp_path):
+    assert QuantizedIndex.load(str(tmp_path)) is None
+
+    index = QuantizedIndex()
+    _add(index, 0, _vectors(5))
+    index.save(str(tmp_path))
+    with open(tmp_path / "rows.jsonl", "r+", encoding="utf-8") as f:
+        lines = f.readlines()
+        f.seek(0)
+        f.writelines(lines[:-1])
+        f.truncate()
+
+    assert QuantizedIndex.load(str(tmp_path)) is None
+
+
+def test_filter_mask():
+    index = QuantizedIndex()
+    _add(index, 0, _vectors(6))
+
+    assert index.filter_mask({"domain": "hr"}).tolist() == [False, True, False, True, False, True]
+    assert index.filter_mask({"domain": {"$in": ["it", "unknown"]}}).tolist() == [True, False, True, False, True, False]
+    where = {"$and": [{"domain": {"$eq": "hr"}}, {"uploaded_at": {"$gte": 2.0}}]}
+    assert index.filter_mask(where).tolist() == [False, False, False, True, False, True]
+    assert index.filter_mask({"uploaded_at": {"$lte": 1.0}}).tolist() == [True, True, False, False, False, False]
+
+
+def test_filter_columns_follow_adds_and_updates():
+    index = QuantizedIndex()
+    vectors = _vectors(6)
+    _add(index, 0, vectors[:4])
+    assert index.filter_mask({"domain": "hr"}).sum() == 2
+
+    _add(index, 4, vectors[4:])
+    index.update_metadatas(["resume_1"], [{"domain": "finance", "uploaded_at": 1.0}])
+
+    assert index.filter_mask({"domain": "hr"}).tolist() == [False, False, False, True, False, True]
+    assert index.filter_mask({"domain": "finance"}).tolist() == [False, True, False, False, False, False]
+
+
+def test_masked_search_scores_only_allowed_rows():
+    vectors = _vectors(40)
+    index = QuantizedIndex()
+    _add(index, 0, vectors)
+    mask = index.filter_mask({"domain": "hr"})
+
+    results = index.search(vectors[4], k=5, mask=mask)
+
+    assert len(results) == 5
+    assert all(mask[row] for row, _ in results)
+    brute = sorted(np.flatnonzero(mask), key=lambda row: -float(vectors[row] @ vectors[4]))[:5]
+    assert [row for row, _ in results] == brute
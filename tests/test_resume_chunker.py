@@ -0,0 +1,94 @@
+from utils.resume_chunker import ResumeChunker, resume_chunker
+
+RESUME = """Budi Santoso
+budi@example.com
+
+Ringkasan
+HR Generalist dengan pengalaman rekrutmen dan pengelolaan karyawan di perusahaan manufaktur.
+
+Pengalaman Kerja
+HR Generalist, PT Maju Jaya
+Jan 2019 - Des 2022
+- Mengelola rekrutmen dan onboarding karyawan baru
+- Menyusun kebijakan kompensasi dan benefit
+Staf Rekrutmen, PT Sinar Abadi
+Mar 2016 - Des 2018
+- Menyaring kandidat dan menjadwalkan wawancara
+
+Education
+S1 Psikologi, Universitas Indonesia
+2012 - 2016
+
+Skills:
+Rekrutmen, HRIS, Payroll
+"""
+
+
+def test_detect_heading_normalizes_aliases():
+    assert resume_chunker.detect_heading("PENGALAMAN KERJA:") == "experience"
+    assert resume_chunker.detect_heading("## Technical Skills") == "skills"
+    assert resume_chunker.detect_heading("Mengelola rekrutmen dan onboarding") == ""
+
+
+def test_split_sections_in_document_order():
+    sections = resume_chunker.split_sections(RESUME)
+
+    assert [name for name, _ in sections] == ["header", "summary", "experience", "education", "skills"]
+    assert sections[0][1] == "Budi Santoso\nbudi@example.com"
+    assert sections[-1][1] == "Rekrutmen, HRIS, Payroll"
+
+
+def test_text_without_headings_is_one_section():
+    assert resume_chunker.split_sections("Budi Santoso\nRekrutmen, HRIS") == [("other", "Budi Santoso\nRekrutmen, HRIS")]
+
+
+def test_split_entries_carries_title_lines_to_the_next_entry():
+    experience = dict(resume_chunker.split_sections(RESUME))["experience"]
+
+    entries = resume_chunker.split_entries(experience)
+
+    assert len(entries) == 2
+    assert entries[0].startswith("HR Generalist, PT Maju Jaya\nJan 2019 - Des 2022")
+    assert entries[1].startswith("Staf Rekrutmen, PT Sinar Abadi\nMar 2016 - Des 2018")
+
+
+def test_short_dated_entries_keep_their_own_chunk():
+    chunker = ResumeChunker(min_chars=200)
+    text = "Experience\nAnalis, PT A\n2019 - 2021\n- Laporan\nStaf, PT B\n2016 - 2018\n- Data entry"
+
+    chunks = chunker.chunk(text, source="budi.pdf")
+
+    assert [chunk["metadata"]["entry"] for chunk in chunks] == [0, 1]
+    assert "PT A" in chunks[0]["text"] and "PT B" not in chunks[0]["text"]
+
+
+def test_undated_fragments_merge_into_their_neighbour():
+    chunker = ResumeChunker(min_chars=200)
+
+    assert chunker._merge_short(["Catatan singkat", "Analis, PT A\n2019 - 2021"]) == [
+        "Catatan singkat\nAnalis, PT A\n2019 - 2021"
+    ]
+    assert chunker._merge_short(["Analis, PT A\n2019 - 2021", "Referensi tersedia"]) == [
+        "Analis, PT A\n2019 - 2021\nReferensi tersedia"
+    ]
+
+
+def test_long_units_split_on_line_boundaries():
+    chunker = ResumeChunker(max_chars=30, min_chars=0)
+    lines = [f"- Tugas nomor {i:02d}" for i in range(6)]
+
+    pieces = chunker._split_long("\n".join(lines))
+
+    assert all(len(piece) <= 30 for piece in pieces)
+    assert "\n".join(pieces).splitlines() == lines
+
+
+def test_chunk_metadata():
+    chunks = resume_chunker.chunk(RESUME, source="budi.pdf")
+
+    assert [chunk["metadata"]["section"] for chunk in chunks] == [
+        "header", "summary", "experience", "experience", "education", "skills"
+    ]
+    assert [chunk["metadata"]["chunk"] for chunk in chunks] == list(range(len(chunks)))
+    assert all(chunk["metadata"]["source"] == "budi.pdf" for chunk in chunks)
+    assert chunks[2]["text"].startswith("Experience:\nHR Generalist")
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.getenv("CANDIDATE_CATALOG_PATH", "data/candidate_catalog.sqlite3")
+
+
+def text_digest(text: str) -> str:
+    """Content digest used as the catalog key for a parsed resume"""
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
+
+class CandidateCatalog:
+    def __init__(self, db_path: str = CATALOG_PATH):
+        """
+        SQLite-backed catalog of parsed and standardized resumes shared across sessions
+
+        Args:
+            db_path: Location of the SQLite database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._create_schema(conn)
+                    self._schema_ready = True
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS resumes (
+                digest TEXT PRIMARY KEY,
+                filename TEXT,
+                raw_text TEXT NOT NULL,
+                embedding_ref TEXT,
+                created_at REAL,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS profiles (
+                digest TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                standardized TEXT,
+                level TEXT,
+                name TEXT,
+                updated_at REAL,
+                PRIMARY KEY (digest, domain)
+            );
+            CREATE TABLE IF NOT EXISTS features (
+                digest TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                jd_digest TEXT NOT NULL,
+                features TEXT NOT NULL,
+                updated_at REAL,
+                PRIMARY KEY (digest, domain, jd_digest)
+            );
+        """)
+        # Versi prompt/skema yang menghasilkan baris; baris dari katalog lama (tanpa kolom ini) dianggap usang
+        for table in ("profiles", "features"):
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if "version" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN version TEXT")
+        conn.commit()
+
+    def upsert_resume(self, raw_text: str, filename: str = "") -> str:
+        """Store raw resume text, returning its digest"""
+        digest = text_digest(raw_text)
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            """INSERT INTO resumes (digest, filename, raw_text, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(digest) DO UPDATE SET
+                   filename = COALESCE(NULLIF(excluded.filename, ''), resumes.filename),
+                   updated_at = excluded.updated_at""",
+            (digest, filename, raw_text, now, now)
+        )
+        conn.commit()
+        return digest
+
+    def get_resume(self, digest: str) -> Optional[Dict]:
+        row = self._connection().execute("SELECT * FROM resumes WHERE digest = ?", (digest,)).fetchone()
+        return dict(row) if row else None
+
+    def set_embedding_ref(self, digest: str, embedding_ref: str):
+        conn = self._connection()
+        conn.execute("UPDATE resumes SET embedding_ref = ?, updated_at = ? WHERE digest = ?",
+                     (embedding_ref, time.time(), digest))
+        conn.commit()
+
+    def list_embedded(self) -> List[Dict]:
+        """Resumes recorded as indexed in the vector store"""
+        return [dict(row) for row in self._connection().execute(
+            "SELECT digest, filename, raw_text, embedding_ref, created_at FROM resumes WHERE embedding_ref IS NOT NULL"
+        )]
+
+    def import_resumes(self, records: List[Dict]):
+        """Insert or update resumes with their embedding refs (e.g. from a vector store snapshot)"""
+        now = time.time()
+        conn = self._connection()
+        conn.executemany(
+            """INSERT INTO resumes (digest, filename, raw_text, embedding_ref, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(digest) DO UPDATE SET
+                   filename = COALESCE(NULLIF(excluded.filename, ''), resumes.filename),
+                   embedding_ref = excluded.embedding_ref,
+                   updated_at = excluded.updated_at""",
+            [(record["digest"], record.get("filename") or "", record["raw_text"], record.get("embedding_ref"),
+              record.get("created_at") or now, now) for record in records]
+        )
+        conn.commit()
+
+    def clear_embedding_ref(self, digests: List[str]):
+        conn = self._connection()
+        conn.executemany("UPDATE resumes SET embedding_ref = NULL, updated_at = ? WHERE digest = ?",
+                         [(time.time(), digest) for digest in digests])
+        conn.commit()
+
+    def get_profile(self, digest: str, domain: str, version: str) -> Optional[Dict]:
+        """Per-domain profile written by `version` of the standardizer (other versions are a miss)"""
+        row = self._connection().execute(
+            "SELECT * FROM profiles WHERE digest = ? AND domain = ? AND version = ?", (digest, domain.lower(), version)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_standardized(self, digest: str, domain: str, version: str) -> Optional[str]:
+        profile = self.get_profile(digest, domain, version)
+        return profile["standardized"] if profile and profile["standardized"] else None
+
+    def save_profile(self, digest: str, domain: str, version: str, standardized: Optional[str] = None,
+                     level: Optional[str] = None, name: Optional[str] = None):
+        """
+        Upsert per-domain fields; None leaves the stored value unchanged
+
+        A row of another standardizer version is replaced: its standardized record and level
+        are dropped rather than merged (the extracted name is kept).
+        """
+        conn = self._connection()
+        conn.execute(
+            """INSERT INTO profiles (digest, domain, version, standardized, level, name, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(digest, domain) DO UPDATE SET
+                   standardized = CASE WHEN profiles.version IS excluded.version
+                       THEN COALESCE(excluded.standardized, profiles.standardized) ELSE excluded.standardized END,
+                   level = CASE WHEN profiles.version IS excluded.version
+                       THEN COALESCE(excluded.level, profiles.level) ELSE excluded.level END,
+                   name = COALESCE(excluded.name, profiles.name),
+                   version = excluded.version,
+                   updated_at = excluded.updated_at""",
+            (digest, domain.lower(), version, standardized, level, name, time.time())
+        )
+        conn.commit()
+
+    def get_features(self, digest: str, domain: str, jd_digest: str, version: str) -> Optional[Dict]:
+        """Features extracted by `version` of the scorer (other versions are a miss)"""
+        row = self._connection().execute(
+            "SELECT features FROM features WHERE digest = ? AND domain = ? AND jd_digest = ? AND version = ?",
+            (digest, domain.lower(), jd_digest, version)
+        ).fetchone()
+        return json.loads(row["features"]) if row else None
+
+    def save_features(self, digest: str, domain: str, jd_digest: str, features: Dict, version: str):
+        conn = self._connection()
+        conn.execute(
+            """INSERT OR REPLACE INTO features (digest, domain, jd_digest, features, version, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (digest, domain.lower(), jd_digest, json.dumps(features, ensure_ascii=False), version, time.time())
+        )
+        conn.commit()
+
+    def list_digests(self) -> List[str]:
+        return [row["digest"] for row in self._connection().execute("SELECT digest FROM resumes")]
+
+
+candidate_catalog = CandidateCatalog()
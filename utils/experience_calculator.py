@@ -0,0 +1,120 @@
+import re
+from datetime import date
+from typing import List, Optional, Tuple
+
+# Nama bulan dalam bahasa Inggris dan Indonesia (termasuk singkatan umum)
+MONTHS = {
+    "jan": 1, "january": 1, "januari": 1,
+    "feb": 2, "february": 2, "februari": 2, "pebruari": 2,
+    "mar": 3, "march": 3, "maret": 3,
+    "apr": 4, "april": 4,
+    "may": 5, "mei": 5,
+    "jun": 6, "june": 6, "juni": 6,
+    "jul": 7, "july": 7, "juli": 7,
+    "aug": 8, "august": 8, "agu": 8, "agt": 8, "agustus": 8,
+    "sep": 9, "sept": 9, "september": 9,
+    "oct": 10, "october": 10, "okt": 10, "oktober": 10,
+    "nov": 11, "november": 11, "nopember": 11,
+    "dec": 12, "december": 12, "des": 12, "desember": 12,
+}
+
+_MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+_PRESENT = r"present|current|now|today|sekarang|saat\s+ini|kini"
+_SEPARATOR = r"\s*(?:-|–|—|to|until|till|s/d|s\.d\.?|sampai|hingga)\s*"
+
+
+def _date_pattern(side: str) -> str:
+    return (
+        rf"(?:(?P<{side}_mm>\d{{1,2}})\s*[/.]\s*(?P<{side}_mmy>\d{{4}})"
+        rf"|\b(?P<{side}_mon>{_MONTH_NAMES})\.?,?\s+(?P<{side}_mony>\d{{4}})"
+        rf"|(?P<{side}_y>\d{{4}}))"
+    )
+
+
+DATE_RANGE_PATTERN = re.compile(
+    rf"(?<![\d/.]){_date_pattern('start')}{_SEPARATOR}"
+    rf"(?:(?P<present>{_PRESENT})|{_date_pattern('end')})(?![\d/])",
+    re.IGNORECASE
+)
+
+EXPERIENCE_SECTION_PATTERN = re.compile(r'EXPERIENCE:(.+?)(?=\n[A-Z_]+:|$)', re.DOTALL)
+
+
+class ExperienceCalculator:
+    def __init__(self, min_year: int = 1950):
+        """
+        Rule-based experience calculator working on date ranges in resume text
+
+        Args:
+            min_year: Earliest year accepted as a valid employment date
+        """
+        self.min_year = min_year
+
+    def extract_date_ranges(self, text: str, today: Optional[date] = None) -> List[Tuple[int, int]]:
+        """Extract date ranges as half-open (start, end) month indices"""
+        if not text:
+            return []
+
+        today = today or date.today()
+        now_index = today.year * 12 + today.month
+        ranges = []
+
+        for match in DATE_RANGE_PATTERN.finditer(text):
+            start = self._to_month_index(match, "start", is_end=False)
+            if match.group("present"):
+                end = now_index
+            else:
+                end = self._to_month_index(match, "end", is_end=True)
+
+            if start is None or end is None:
+                continue
+            if match.group("start_y") and match.group("end_y") and end == start:
+                end = start + 12  # "2020-2020" dihitung satu tahun penuh
+            if start >= end or end > now_index + 12:
+                continue
+            ranges.append((start, end))
+
+        return ranges
+
+    def merge_intervals(self, intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Merge overlapping or adjacent intervals"""
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def calculate_experience_years(self, text: str, today: Optional[date] = None) -> float:
+        """Total years of experience with overlapping periods counted once"""
+        experience_text = self._experience_section(text)
+        merged = self.merge_intervals(self.extract_date_ranges(experience_text, today))
+        total_months = sum(end - start for start, end in merged)
+        return round(total_months / 12, 1)
+
+    def _experience_section(self, text: str) -> str:
+        """Prefer the EXPERIENCE section of a standardized resume so education dates are ignored"""
+        if not text:
+            return ""
+        exp_match = EXPERIENCE_SECTION_PATTERN.search(text)
+        return exp_match.group(1) if exp_match else text
+
+    def _to_month_index(self, match: re.Match, side: str, is_end: bool) -> Optional[int]:
+        if match.group(f"{side}_mm"):
+            month, year = int(match.group(f"{side}_mm")), int(match.group(f"{side}_mmy"))
+        elif match.group(f"{side}_mon"):
+            month, year = MONTHS[match.group(f"{side}_mon").lower()], int(match.group(f"{side}_mony"))
+        elif match.group(f"{side}_y"):
+            year = int(match.group(f"{side}_y"))
+            # Tahun tanpa bulan: awal rentang = Januari, akhir rentang = awal tahun tersebut
+            return year * 12 if year >= self.min_year else None
+        else:
+            return None
+
+        if not 1 <= month <= 12 or year < self.min_year:
+            return None
+        # Bulan akhir bersifat inklusif, sehingga indeks akhir adalah bulan setelahnya
+        return year * 12 + (month if is_end else month - 1)
+
+experience_calculator = ExperienceCalculator()
@@ -0,0 +1,103 @@
+import re
+import logging
+from typing import Dict, List
+from utils.resume_chunker import BULLET_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Facet kebutuhan JD, dalam urutan tampil di matriks cakupan
+JD_FACETS = ("skills", "experience", "education")
+# Judul section JD (Inggris dan Indonesia); "ignore" = profil perusahaan, benefit, cara melamar
+JD_SECTION_HEADINGS = {
+    "requirements": ["requirements", "requirement", "qualifications", "qualification", "kualifikasi",
+                     "persyaratan", "syarat", "must have", "must-have", "nice to have", "preferred qualifications",
+                     "what we're looking for", "what we are looking for", "who you are", "skills",
+                     "technical skills", "keahlian", "kemampuan", "kompetensi", "keterampilan"],
+    "responsibilities": ["responsibilities", "job responsibilities", "job description", "key responsibilities",
+                         "what you'll do", "what you will do", "tanggung jawab", "deskripsi pekerjaan",
+                         "uraian tugas", "tugas", "rincian pekerjaan", "job desc"],
+    "experience": ["experience", "pengalaman", "pengalaman kerja"],
+    "education": ["education", "pendidikan"],
+    "ignore": ["benefits", "benefit", "perks", "about us", "about the company", "company", "tentang kami",
+               "tentang perusahaan", "fasilitas", "keuntungan", "how to apply", "cara melamar"],
+}
+EDUCATION_PATTERN = re.compile(
+    r"\b(s1|s2|s3|d3|d4|sma|smk|bachelor'?s?|master'?s?|degree|diploma|sarjana|lulusan|pendidikan|jurusan|"
+    r"ipk|gpa|university|universitas|graduate)\b", re.IGNORECASE
+)
+EXPERIENCE_PATTERN = re.compile(r"\b(pengalaman|experience|experienced|berpengalaman|years?|tahun)\b", re.IGNORECASE)
+
+_HEADING_LOOKUP = {alias: name for name, aliases in JD_SECTION_HEADINGS.items() for alias in aliases}
+_HEADING_CLEAN_PATTERN = re.compile(r"[\s:#*_\-–—|•]+")
+MAX_HEADING_LENGTH = 40
+
+
+class JDFacetExtractor:
+    def __init__(self, max_chars: int = 1500):
+        """
+        Splits a job description into requirement facets (skills, experience, education)
+
+        Requirement lines are assigned by keyword (degree and major lines to education,
+        years-of-experience lines to experience, the rest to skills); responsibility lines
+        describe the expected experience. Without recognised headings every line is classified.
+
+        Args:
+            max_chars: Maximum characters per facet text
+        """
+        self.max_chars = max_chars
+
+    def detect_heading(self, line: str) -> str:
+        stripped = line.strip()
+        if not stripped or len(stripped) > MAX_HEADING_LENGTH:
+            return ""
+        key = _HEADING_CLEAN_PATTERN.sub(" ", stripped).strip().lower()
+        return _HEADING_LOOKUP.get(key, "")
+
+    @staticmethod
+    def classify(line: str) -> str:
+        """Facet of a single requirement line"""
+        if EDUCATION_PATTERN.search(line):
+            return "education"
+        if EXPERIENCE_PATTERN.search(line):
+            return "experience"
+        return "skills"
+
+    def extract(self, jd_text: str) -> List[Dict]:
+        """
+        Requirement facets of a JD
+
+        Returns:
+            Dicts with the "facet" name and its "text" (prefixed like resume chunks, e.g. "Skills:\\n...");
+            a single "overall" facet holding the whole JD when no requirement lines are found
+        """
+        lines: Dict[str, List[str]] = {facet: [] for facet in JD_FACETS}
+        raw_lines = (jd_text or "").splitlines()
+        structured = any(self.detect_heading(line) for line in raw_lines)
+        # Tanpa judul section, seluruh JD diperlakukan sebagai daftar kebutuhan
+        section = "header" if structured else "requirements"
+        for line in raw_lines:
+            heading = self.detect_heading(line)
+            if heading:
+                section = heading
+                continue
+            line = BULLET_PATTERN.sub("", line).strip()
+            if not line or section in ("header", "ignore"):
+                continue
+            if section == "responsibilities":
+                lines["experience"].append(line)
+            elif section in ("experience", "education"):
+                lines[section].append(line)
+            else:
+                lines[self.classify(line)].append(line)
+
+        facets = [
+            {"facet": facet, "text": f"{facet.title()}:\n" + "\n".join(lines[facet])[:self.max_chars]}
+            for facet in JD_FACETS if lines[facet]
+        ]
+        if not facets:
+            facets = [{"facet": "overall", "text": (jd_text or "").strip()[:self.max_chars]}]
+        logger.debug(f"JD split into facets: {[facet['facet'] for facet in facets]}")
+        return facets
+
+
+jd_facet_extractor = JDFacetExtractor()
@@ -0,0 +1,105 @@
+import re
+import zlib
+import random
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class NearDuplicateIndex:
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.75,
+                 shingle_size: int = 5, seed: int = 42):
+        """
+        MinHash + LSH index for clustering near-duplicate resumes
+
+        Args:
+            num_perm: Number of MinHash permutations
+            bands: LSH bands (num_perm must be divisible by bands)
+            threshold: Minimum estimated Jaccard similarity to treat two resumes as duplicates
+            shingle_size: Number of words per shingle
+            seed: Seed for the permutation coefficients (stable across processes)
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm harus habis dibagi bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def _shingles(self, text: str) -> set:
+        words = re.findall(r'[a-z0-9]+', (text or "").lower())
+        if len(words) < self.shingle_size:
+            return {" ".join(words)} if words else set()
+        return {
+            " ".join(words[i:i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def fingerprint(self, text: str) -> Tuple[int, ...]:
+        """MinHash signature of the word shingles in `text`"""
+        hashes = [zlib.crc32(shingle.encode()) for shingle in self._shingles(text)]
+        if not hashes:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.permutations
+        )
+
+    def similarity(self, fp_a: Tuple[int, ...], fp_b: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity between two signatures"""
+        return sum(1 for a, b in zip(fp_a, fp_b) if a == b) / self.num_perm
+
+    def cluster(self, texts: List[str]) -> List[List[int]]:
+        """
+        Group indexes of near-duplicate texts
+
+        Returns:
+            Clusters in order of first appearance; the first index of each
+            cluster is the representative (longest text in the cluster)
+        """
+        fingerprints = [self.fingerprint(text) for text in texts]
+        parent = list(range(len(texts)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        buckets: Dict[Tuple, List[int]] = {}
+        for index, fp in enumerate(fingerprints):
+            if not texts[index] or not texts[index].strip():
+                continue
+            for band in range(self.bands):
+                key = (band,) + fp[band * self.rows:(band + 1) * self.rows]
+                for other in buckets.setdefault(key, []):
+                    if find(other) != find(index) and self.similarity(fp, fingerprints[other]) >= self.threshold:
+                        parent[find(index)] = find(other)
+                buckets[key].append(index)
+
+        groups: Dict[int, List[int]] = {}
+        for index in range(len(texts)):
+            groups.setdefault(find(index), []).append(index)
+
+        clusters = []
+        for members in sorted(groups.values(), key=lambda m: m[0]):
+            representative = max(members, key=lambda i: len(texts[i] or ""))
+            clusters.append([representative] + [i for i in members if i != representative])
+
+        duplicates = sum(len(c) - 1 for c in clusters)
+        if duplicates:
+            logger.info(f"Near-duplicate detection: {duplicates} duplicate resume(s) in {len(texts)} uploads")
+        return clusters
+
+
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,205 @@
+import math
+import re
+import logging
+from typing import Dict, List, Tuple
+from utils.experience_calculator import experience_calculator
+
+logger = logging.getLogger(__name__)
+
+# Nilai placeholder yang tidak menambah informasi untuk LLM ("0" tidak termasuk: EXPERIENCE_YEARS: 0 bermakna untuk fresh graduate)
+BOILERPLATE_VALUES = {"", "none", "not specified", "n/a", "na", "-", "tidak ada", "tidak disebutkan"}
+
+# Urutan prioritas section: keterampilan dan pengalaman terbaru lebih dulu
+SECTION_PRIORITY = [
+    "NAME", "LEVEL", "JOB_ROLE", "EXPERIENCE_YEARS", "SKILLS", "EXPERIENCE",
+    "DOMAIN_EXPERTISE", "EDUCATION", "CERTIFICATIONS", "PROJECTS_COUNT", "SALARY_EXPECTATION"
+]
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+SECTION_PATTERN = re.compile(rf'^[\s\-*]*({"|".join(SECTION_PRIORITY)}):[ \t]*', re.MULTILINE)
+ENTRY_SPLIT_PATTERN = re.compile(r'\n(?=\s*(?:[-•*]|\*\*))')
+
+
+def count_tokens(text: str) -> int:
+    """Approximate BPE token count: one token per short word/punctuation, long words split every 4 chars"""
+    if not text:
+        return 0
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_PATTERN.findall(text))
+
+
+class PromptCompactor:
+    def __init__(self, section_priority: List[str] = None):
+        """
+        Section-aware compaction of standardized resumes under a token budget
+
+        Args:
+            section_priority: Section names in the order they should receive budget
+        """
+        self.section_priority = section_priority or SECTION_PRIORITY
+
+    def compact(self, text: str, max_tokens: int) -> Tuple[str, Dict[str, int]]:
+        """Compact a single resume to at most `max_tokens` tokens"""
+        original_tokens = count_tokens(text)
+        sections = self._split_sections(text)
+
+        if sections:
+            compacted = self._compact_sections(sections, max_tokens)
+        else:
+            compacted = self._truncate_lines(self._dedupe_lines(text), max_tokens)
+
+        compacted_tokens = count_tokens(compacted)
+        return compacted, {
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "tokens_saved": max(0, original_tokens - compacted_tokens),
+        }
+
+    def fit_candidates(self, texts: List[str], total_budget: int, min_per_candidate: int = 150) -> Tuple[List[str], Dict[str, int]]:
+        """Fit N resumes into a shared token budget, giving unused share of short resumes to longer ones"""
+        if not texts:
+            return [], {"original_tokens": 0, "compacted_tokens": 0, "tokens_saved": 0}
+
+        deduped = [self._render(self._split_sections(text)) or self._dedupe_lines(text) for text in texts]
+        needs = [count_tokens(text) for text in deduped]
+        budgets = [0] * len(texts)
+        remaining = max(total_budget, min_per_candidate * len(texts))
+        pending = sorted(range(len(texts)), key=lambda i: needs[i])
+
+        # Water-filling: kandidat terpendek dilayani penuh, sisa budget dibagi ke yang lebih panjang
+        while pending:
+            share = remaining // len(pending)
+            i = pending.pop(0)
+            budgets[i] = min(needs[i], share)
+            remaining -= budgets[i]
+
+        compacted, original_tokens, compacted_tokens = [], 0, 0
+        for text, budget in zip(texts, budgets):
+            result, stats = self.compact(text, max(budget, 1))
+            compacted.append(result)
+            original_tokens += stats["original_tokens"]
+            compacted_tokens += stats["compacted_tokens"]
+
+        report = {
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "tokens_saved": max(0, original_tokens - compacted_tokens),
+        }
+        logger.info(f"Prompt compaction for {len(texts)} candidates: {report}")
+        return compacted, report
+
+    def _split_sections(self, text: str) -> Dict[str, str]:
+        matches = list(SECTION_PATTERN.finditer(text or ""))
+        sections = {}
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            name = match.group(1)
+            content = text[match.end():end].strip()
+            if name in sections:
+                # Section ganda (misal output LLM berulang): gabungkan tanpa duplikasi baris
+                content = f"{sections[name]}\n{content}"
+            sections[name] = self._dedupe_lines(content)
+        return sections
+
+    def _render(self, sections: Dict[str, str]) -> str:
+        ordered = self._ordered_sections(sections)
+        return "\n".join(f"{name}: {content}" for name, content in ordered)
+
+    def _ordered_sections(self, sections: Dict[str, str]) -> List[Tuple[str, str]]:
+        names = [n for n in self.section_priority if n in sections]
+        names += [n for n in sections if n not in self.section_priority]
+        ordered = []
+        for name in names:
+            content = sections[name]
+            if name == "SKILLS":
+                content = self._dedupe_items(content)
+            elif name == "EXPERIENCE":
+                content = "\n".join(self._recent_first(content))
+            if content.strip().lower() in BOILERPLATE_VALUES and name != "NAME":
+                continue
+            ordered.append((name, content))
+        return ordered
+
+    def _compact_sections(self, sections: Dict[str, str], max_tokens: int) -> str:
+        lines, used = [], 0
+        for name, content in self._ordered_sections(sections):
+            header = f"{name}: "
+            remaining = max_tokens - used - count_tokens(header)
+            if remaining <= 0:
+                break
+
+            if name == "EXPERIENCE":
+                entries = self._recent_first(content)
+            else:
+                entries = [content]
+
+            kept = []
+            for entry in entries:
+                entry_tokens = count_tokens(entry)
+                if entry_tokens <= remaining:
+                    kept.append(entry)
+                    remaining -= entry_tokens
+                else:
+                    if remaining > 10:
+                        kept.append(self._truncate_words(entry, remaining))
+                        remaining = 0
+                    break
+
+            if kept:
+                section_text = header + "\n".join(kept)
+                lines.append(section_text)
+                used += count_tokens(section_text)
+        return "\n".join(lines)
+
+    def _recent_first(self, experience: str) -> List[str]:
+        """Split experience entries and order them by end date, most recent first"""
+        entries = [e.strip() for e in ENTRY_SPLIT_PATTERN.split(experience) if e.strip()]
+
+        def latest_end(entry: str) -> int:
+            ranges = experience_calculator.extract_date_ranges(entry)
+            return max((end for _, end in ranges), default=0)
+
+        return sorted(entries, key=latest_end, reverse=True)
+
+    def _dedupe_lines(self, text: str) -> str:
+        seen, lines = set(), []
+        for line in (text or "").splitlines():
+            key = re.sub(r'\s+', ' ', line).strip().lower()
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            lines.append(line.rstrip())
+        return "\n".join(lines)
+
+    def _dedupe_items(self, skills: str) -> str:
+        seen, items = set(), []
+        for item in re.split(r'[,\n;]', skills):
+            key = item.strip(" -*•").lower()
+            if key and key not in seen:
+                seen.add(key)
+                items.append(item.strip(" -*•"))
+        return ", ".join(items)
+
+    def _truncate_words(self, text: str, max_tokens: int) -> str:
+        words, kept, used = text.split(), [], 0
+        for word in words:
+            word_tokens = count_tokens(word)
+            if used + word_tokens > max_tokens:
+                break
+            kept.append(word)
+            used += word_tokens
+        return " ".join(kept) + (" ..." if len(kept) < len(words) else "")
+
+    def _truncate_lines(self, text: str, max_tokens: int) -> str:
+        kept, used = [], 0
+        for line in text.splitlines():
+            line_tokens = count_tokens(line)
+            if used + line_tokens > max_tokens:
+                if max_tokens - used > 10:
+                    kept.append(self._truncate_words(line, max_tokens - used))
+                break
+            kept.append(line)
+            used += line_tokens
+        return "\n".join(kept)
+
+
+prompt_compactor = PromptCompactor()
@@ -0,0 +1,154 @@
+import re
+import logging
+from typing import Dict, List, Tuple
+from utils.experience_calculator import DATE_RANGE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Judul section resume (Inggris dan Indonesia) dipetakan ke nama section kanonis
+SECTION_HEADINGS = {
+    "summary": ["summary", "professional summary", "profile", "about me", "objective", "career objective",
+                "ringkasan", "profil", "profil singkat", "tentang saya", "tujuan karir"],
+    "experience": ["experience", "work experience", "professional experience", "employment history",
+                   "work history", "pengalaman", "pengalaman kerja", "pengalaman profesional", "riwayat pekerjaan"],
+    "education": ["education", "academic background", "pendidikan", "riwayat pendidikan", "pendidikan formal"],
+    "skills": ["skills", "technical skills", "core competencies", "competencies", "keahlian", "keterampilan",
+               "kemampuan", "skill"],
+    "certifications": ["certifications", "certificates", "licenses", "licenses & certifications", "training",
+                       "sertifikasi", "sertifikat", "pelatihan"],
+    "projects": ["projects", "portfolio", "proyek", "projek", "portofolio"],
+    "organizations": ["organizations", "organisation", "volunteer", "volunteering", "leadership",
+                      "organisasi", "pengalaman organisasi", "kegiatan"],
+    "awards": ["awards", "achievements", "honors", "penghargaan", "prestasi"],
+    "languages": ["languages", "bahasa"],
+}
+# Section berisi beberapa entri (pekerjaan, sekolah, proyek) yang masing-masing menjadi satu chunk
+ENTRY_SECTIONS = {"experience", "education", "projects", "organizations"}
+
+_HEADING_LOOKUP = {alias: name for name, aliases in SECTION_HEADINGS.items() for alias in aliases}
+_HEADING_CLEAN_PATTERN = re.compile(r"[\s:#*_\-–—|•]+")
+BULLET_PATTERN = re.compile(r"^\s*(?:[-•*▪●◦–]|\d+[.)])\s+")
+MAX_HEADING_LENGTH = 40
+MAX_ENTRY_TITLE_LINES = 2
+MAX_ENTRY_TITLE_LENGTH = 80
+
+
+class ResumeChunker:
+    def __init__(self, max_chars: int = 1500, min_chars: int = 80):
+        """
+        Section-aware resume chunker: one chunk per logical unit with section metadata
+
+        Experience, education and project sections are split into entries (a new entry starts
+        at a non-bullet line carrying a date range); other sections become a single chunk.
+        Undated units shorter than `min_chars` (fragments) are merged into a neighbouring unit of the same
+        section, while dated entries always keep their own chunk; units longer than `max_chars` are split
+        on line boundaries, without overlap.
+
+        Args:
+            max_chars: Maximum characters per chunk
+            min_chars: Units shorter than this are merged with their neighbour
+        """
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+
+    def detect_heading(self, line: str) -> str:
+        """Canonical section name if the line is a section heading, else an empty string"""
+        stripped = line.strip()
+        if not stripped or len(stripped) > MAX_HEADING_LENGTH:
+            return ""
+        key = _HEADING_CLEAN_PATTERN.sub(" ", stripped).strip().lower()
+        return _HEADING_LOOKUP.get(key, "")
+
+    def split_sections(self, text: str) -> List[Tuple[str, str]]:
+        """(section, content) pairs in document order; text before the first heading is the header"""
+        sections: List[Tuple[str, List[str]]] = [("header", [])]
+        for line in (text or "").splitlines():
+            heading = self.detect_heading(line)
+            if heading:
+                sections.append((heading, []))
+            else:
+                sections[-1][1].append(line)
+        if len(sections) == 1:
+            # Tidak ada judul section yang dikenali
+            sections = [("other", sections[0][1])]
+        return [(name, "\n".join(lines).strip()) for name, lines in sections if "\n".join(lines).strip()]
+
+    def split_entries(self, content: str) -> List[str]:
+        """Split an experience/education section into entries at dated, non-bullet lines"""
+        entries: List[List[str]] = [[]]
+        for line in content.splitlines():
+            starts_entry = (
+                not BULLET_PATTERN.match(line)
+                and DATE_RANGE_PATTERN.search(line)
+                and any(DATE_RANGE_PATTERN.search(previous) for previous in entries[-1])
+            )
+            if starts_entry:
+                # Baris judul pendek tepat sebelum tanggal (nama perusahaan/posisi) milik entri baru
+                previous, carried = entries[-1], []
+                while (previous and len(carried) < MAX_ENTRY_TITLE_LINES and previous[-1].strip()
+                       and len(previous[-1]) <= MAX_ENTRY_TITLE_LENGTH
+                       and not BULLET_PATTERN.match(previous[-1])
+                       and not DATE_RANGE_PATTERN.search(previous[-1])):
+                    carried.insert(0, previous.pop())
+                entries.append(carried)
+            entries[-1].append(line)
+        return ["\n".join(lines).strip() for lines in entries if "\n".join(lines).strip()]
+
+    def _split_long(self, text: str) -> List[str]:
+        if len(text) <= self.max_chars:
+            return [text]
+        pieces, current = [], ""
+        for line in text.splitlines():
+            while len(line) > self.max_chars:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(line[:self.max_chars])
+                line = line[self.max_chars:]
+            if current and len(current) + len(line) + 1 > self.max_chars:
+                pieces.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current.strip():
+            pieces.append(current)
+        return pieces
+
+    def _is_fragment(self, unit: str) -> bool:
+        # Entri bertanggal (satu pekerjaan/sekolah) tetap satu chunk walau pendek
+        return len(unit) < self.min_chars and not DATE_RANGE_PATTERN.search(unit)
+
+    def _merge_short(self, units: List[str]) -> List[str]:
+        merged: List[str] = []
+        for unit in units:
+            if merged and self._is_fragment(merged[-1]) and len(merged[-1]) + len(unit) + 1 <= self.max_chars:
+                merged[-1] = f"{merged[-1]}\n{unit}"
+            else:
+                merged.append(unit)
+        if len(merged) > 1 and self._is_fragment(merged[-1]) and len(merged[-2]) + len(merged[-1]) + 1 <= self.max_chars:
+            fragment = merged.pop()
+            merged[-1] = f"{merged[-1]}\n{fragment}"
+        return merged
+
+    def chunk(self, text: str, source: str = "") -> List[Dict]:
+        """
+        Chunk a resume into logical units
+
+        Returns:
+            Dicts with the chunk "text" (prefixed with its section heading) and "metadata"
+            (source, section, entry index within the section, chunk index)
+        """
+        chunks = []
+        for section, content in self.split_sections(text):
+            units = self.split_entries(content) if section in ENTRY_SECTIONS else [content]
+            units = [piece for unit in self._merge_short(units) for piece in self._split_long(unit)]
+            for entry, unit in enumerate(units):
+                chunks.append({
+                    "text": f"{section.title()}:\n{unit}",
+                    "metadata": {"source": source, "section": section, "entry": entry, "chunk": len(chunks)},
+                })
+        logger.debug(f"Chunked {source or 'resume'} into {len(chunks)} section chunks")
+        return chunks
+
+
+resume_chunker = ResumeChunker()
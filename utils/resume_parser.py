@@ -9,6 +9,11 @@ import io
 import os
 import zipfile
 
+PDF_TYPE = "application/pdf"
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+# Dipakai jika objek file tidak membawa MIME type (path lokal, file dari ZIP atau bulk indexer)
+FILE_TYPES_BY_EXTENSION = {".pdf": PDF_TYPE, ".docx": DOCX_TYPE}
+
 def handle_parsing_errors(func):
     def wrapper(*args, **kwargs):
         try:
@@ -37,8 +42,9 @@ def parse_resume(file: Union[BinaryIO, str], filename: str = "") -> Tuple[str, s
         with open(file, 'rb') as f:
             return parse_resume(f, os.path.basename(file))
     
-    if hasattr(file, 'type'):
-        if file.type == "application/pdf":
+    file_type = getattr(file, 'type', None) or FILE_TYPES_BY_EXTENSION.get(os.path.splitext(filename)[1].lower())
+    if file_type:
+        if file_type == PDF_TYPE:
             reader = PdfReader(io.BytesIO(file.read()))
             text = "\n".join([page.extract_text() for page in reader.pages])
             if not text.strip():
@@ -46,7 +52,7 @@ def parse_resume(file: Union[BinaryIO, str], filename: str = "") -> Tuple[str, s
                 logger.warning(error_msg)
                 return "", error_msg
             return text, ""
-        elif file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+        elif file_type == DOCX_TYPE:
             doc = docx.Document(io.BytesIO(file.read()))
             text = "\n".join([para.text for para in doc.paragraphs])
             if not text.strip():
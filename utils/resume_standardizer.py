@@ -7,11 +7,21 @@ import re
 import logging
 import pandas as pd
 import hashlib
+from core.llm_client import invoke_llm
+from core.async_runner import map_in_threads
+from core.resilience import record_degradation
+from utils.candidate_catalog import candidate_catalog, text_digest
+from utils.experience_calculator import experience_calculator, DATE_RANGE_PATTERN
+from utils.name_extractor import name_extractor
+from utils.resume_chunker import resume_chunker
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+# Naikkan saat prompt atau format record standar berubah; record katalog versi lain distandarisasi ulang
+STANDARDIZER_VERSION = "2"
+
 class ResumeStandardizer:
     def __init__(self, domain: str = "general"):
         """
@@ -26,8 +36,19 @@ class ResumeStandardizer:
             model_name="deepseek-r1-distill-llama-70b",
             api_key=os.getenv("GROQ_API_KEY"),
             request_timeout=30,
+            max_retries=0,  # retry ditangani oleh core.llm_client
             model_kwargs={"seed": 42}
         )
+        self.valid_levels = {'entry', 'mid', 'senior', 'expert'}
+        self.level_field_pattern = re.compile(r'^[\s\-*]*LEVEL:\s*\**\s*([A-Za-z]+)', re.IGNORECASE | re.MULTILINE)
+        # Jenjang pendidikan untuk format fallback, dipetakan ke istilah yang dikenali scoring
+        self.degree_levels = {
+            "phd": "PhD", "doctorate": "PhD", "s3": "PhD", "doktor": "PhD",
+            "master": "Master", "mba": "Master", "s2": "Master", "magister": "Master",
+            "bachelor": "Bachelor", "bsc": "Bachelor", "s1": "Bachelor", "sarjana": "Bachelor",
+            "diploma": "Diploma", "d3": "Diploma", "d4": "Bachelor",
+        }
+        self.degree_pattern = re.compile(rf"\b({'|'.join(self.degree_levels)})\b", re.IGNORECASE)
         self._init_prompts()
         self.cache = {}
     
@@ -63,6 +84,11 @@ class ResumeStandardizer:
             - PROJECTS_COUNT: Jumlah proyek yang disebutkan
             - SALARY_EXPECTATION: Jika disebutkan, jika tidak "Not specified"
             - DOMAIN_EXPERTISE: Keahlian spesifik dalam domain {self.domain}
+            - LEVEL: Tepat satu kata kunci: entry | mid | senior | expert
+              - entry: 0-2 tahun pengalaman relevan, posisi entry-level, fokus pendidikan
+              - mid: 3-6 tahun pengalaman relevan, kompeten di fungsi inti {self.domain}
+              - senior: 7+ tahun, progresi karier jelas, peran kepemimpinan atau mentoring
+              - expert: 10+ tahun, posisi eksekutif/direktur, dampak strategis bisnis
             
             {domain_context}
             
@@ -75,42 +101,6 @@ class ResumeStandardizer:
             Keluarkan hanya teks yang diformat.
             """
         )
-        
-        self.level_detection_prompt = ChatPromptTemplate.from_template(
-            f"""Analyze experience in this resume for {self.domain.upper()} domain (STRICT RULES):
-            
-            [LEVEL CRITERIA FOR {self.domain.upper()} DOMAIN]
-            Entry/Junior:
-            - 0-2 years relevant experience
-            - Entry-level positions in {self.domain}
-            - Education-focused with limited practical experience
-            - Basic skills in domain fundamentals
-            
-            Mid-level:
-            - 3-6 years relevant experience
-            - Demonstrated competency in core {self.domain} functions
-            - Some project leadership or specialization
-            - Moderate achievements and responsibilities
-            
-            Senior:
-            - 7+ years relevant experience
-            - Clear career progression in {self.domain}
-            - Leadership roles or senior positions
-            - Strategic impact and advanced expertise
-            - Mentoring or team management experience
-            
-            Expert/Executive:
-            - 10+ years with significant {self.domain} achievements
-            - Executive or director-level positions
-            - Industry recognition or major accomplishments
-            - Strategic business impact
-            
-            Resume Excerpt:
-            {{resume_excerpt}}
-            
-            Return ONLY the level keyword: entry | mid | senior | expert
-            """
-        )
     
     def _get_domain_context(self) -> str:
         """Get domain-specific context for better standardization"""
@@ -149,35 +139,64 @@ class ResumeStandardizer:
         if cache_key in self.cache:
             return self.cache[cache_key]
         
+        digest = text_digest(resume_text)
+        cached_result = self._load_from_catalog(digest)
+        if cached_result:
+            self.cache[cache_key] = cached_result
+            return cached_result
+        
         try:
             if not resume_text or len(resume_text.strip()) < 50:
                 raise ValueError("Resume text too short")
                 
             cleaned_text = self._preprocess_text(resume_text)
             
-            chain = self.standardization_prompt | self.llm
-            result = chain.invoke({"resume_text": cleaned_text}).content
+            result = invoke_llm(self.standardization_prompt, self.llm, {"resume_text": cleaned_text}).content
             
             validated_result = self._validate_for_model_features(result)
             self.cache[cache_key] = validated_result
+            if not self._missing_sections(result):
+                # Hanya hasil LLM yang valid yang disimpan permanen, bukan format fallback
+                self._save_to_catalog(digest, resume_text, validated_result)
             return validated_result
             
         except Exception as e:
             logger.error(f"Standardization failed: {str(e)}")
+            if not isinstance(e, ValueError):
+                record_degradation("Standardisasi resume memakai format berbasis aturan")
             return self._fallback_format(resume_text)
     
+    def _load_from_catalog(self, digest: str) -> Optional[str]:
+        """Read a previously standardized record for this domain from the shared catalog"""
+        try:
+            return candidate_catalog.get_standardized(digest, self.domain, STANDARDIZER_VERSION)
+        except Exception as e:
+            logger.warning(f"Catalog lookup failed: {str(e)}")
+            return None
+    
+    def _save_to_catalog(self, digest: str, resume_text: str, standardized: str):
+        try:
+            candidate_catalog.upsert_resume(resume_text)
+            candidate_catalog.save_profile(
+                digest, self.domain, STANDARDIZER_VERSION,
+                standardized=standardized,
+                level=self.detect_resume_level(standardized)
+            )
+        except Exception as e:
+            logger.warning(f"Catalog write failed: {str(e)}")
+    
     def detect_resume_level(self, resume_text: str) -> str:
-        """Detect resume level with domain context"""
+        """Detect resume level from the LEVEL field emitted during standardization"""
         try:
-            excerpt = self._extract_structured_experience(resume_text)
-            chain = self.level_detection_prompt | self.llm
-            response = chain.invoke({"resume_excerpt": excerpt}).content.lower()
+            level_match = self.level_field_pattern.search(resume_text)
+            if not level_match:
+                raise ValueError("LEVEL field not found")
             
-            valid_levels = {'entry', 'mid', 'senior', 'expert'}
-            if response not in valid_levels:
-                raise ValueError(f"Invalid level detected: {response}")
+            level = level_match.group(1).lower()
+            if level not in self.valid_levels:
+                raise ValueError(f"Invalid level detected: {level}")
                 
-            return response
+            return level
             
         except Exception as e:
             logger.warning(f"Level detection failed: {str(e)}")
@@ -192,6 +211,15 @@ class ResumeStandardizer:
     
     def _validate_for_model_features(self, text: str) -> str:
         """Validate standardized resume format"""
+        errors = self._missing_sections(text)
+        if errors:
+            logger.warning(f"Validation errors: {'; '.join(errors)}")
+            return self._fallback_format(text)
+            
+        return self._normalize_level_field(text)
+    
+    def _missing_sections(self, text: str) -> List[str]:
+        """List required sections missing from a standardized resume"""
         required_sections = {
             'NAME': r'NAME:(.+?)(?=\n[A-Z_]+:|$)',
             'SKILLS': r'SKILLS:(.+?)(?=\n[A-Z_]+:|$)',
@@ -209,75 +237,91 @@ class ResumeStandardizer:
         for section, pattern in required_sections.items():
             if not re.search(pattern, text, re.DOTALL | re.IGNORECASE):
                 errors.append(f"Missing {section} section")
-        
-        if errors:
-            logger.warning(f"Validation errors: {'; '.join(errors)}")
-            return self._fallback_format(text)
-            
-        return text
+        return errors
     
-    def _extract_structured_experience(self, text: str) -> str:
-        """Extract experience section for level detection"""
-        exp_match = re.search(r'EXPERIENCE:(.+?)(?=\n[A-Z_]+:|$)', text, re.DOTALL | re.IGNORECASE)
-        if exp_match:
-            return exp_match.group(1)[:2000]
-        return text[:1500]
+    def _normalize_level_field(self, text: str) -> str:
+        """Ensure the standardized record carries exactly one valid LEVEL line"""
+        level_match = self.level_field_pattern.search(text)
+        level = level_match.group(1).lower() if level_match else ""
+        if level not in self.valid_levels:
+            logger.warning(f"Missing or invalid LEVEL field '{level}', estimating from dates")
+            level = self._estimate_level_from_dates(text)
+        
+        text = re.sub(r'^[\s\-*]*LEVEL:.*$', '', text, flags=re.IGNORECASE | re.MULTILINE).rstrip()
+        return f"{text}\nLEVEL: {level}"
     
     def _estimate_level_from_dates(self, text: str) -> str:
-        """Fallback level estimation from dates"""
-        date_ranges = re.findall(r'(\d{2}/\d{4})-(\d{2}/\d{4})|\d{4}-\d{4}|\d{4}\s*-\s*(?:Present|Current)', text, re.IGNORECASE)
-        
-        if not date_ranges:
-            return 'entry'
-            
-        total_years = 0
-        for date_range in date_ranges:
-            if len(date_range) >= 2 and date_range[0] and date_range[1]:
-                try:
-                    start_year = int(date_range[0].split('/')[1]) if '/' in date_range[0] else int(date_range[0])
-                    end_year = int(date_range[1].split('/')[1]) if '/' in date_range[1] else int(date_range[1])
-                    total_years += end_year - start_year
-                except:
-                    continue
-            
-        avg_years = total_years / max(1, len(date_ranges))
-        
-        if avg_years <= 2:
+        """Fallback level estimation from merged employment date ranges"""
+        return self._level_for_years(experience_calculator.calculate_experience_years(text))
+    
+    @staticmethod
+    def _level_for_years(total_years: float) -> str:
+        if total_years <= 2:
             return 'entry'
-        elif avg_years <= 6:
+        elif total_years <= 6:
             return 'mid'
-        elif avg_years <= 10:
+        elif total_years <= 10:
             return 'senior'
         return 'expert'
     
     def _fallback_format(self, text: str) -> str:
-        """Create fallback standardized format"""
-        domain_skills = self.domain_skills_mapping.get(self.domain, self.domain_skills_mapping["general"])
+        """Rule-based standardized record built from the resume text itself (used when the LLM is unavailable)"""
+        text = text or ""
+        domain_skills = next(
+            (skills for key, skills in self.domain_skills_mapping.items() if key.lower() == self.domain),
+            self.domain_skills_mapping["General"]
+        )
+        # Hanya keterampilan domain yang benar-benar disebut di resume (alias dipisah "/", mis. AI/ML)
+        skills = [
+            skill for skill in domain_skills
+            if any(re.search(rf"\b{re.escape(alias.strip())}\b", text, re.IGNORECASE) for alias in skill.split("/"))
+        ]
         
-        sections = [
-            "NAME: Unknown Candidate",
-            f"SKILLS: {', '.join(domain_skills[:5])}",
-            "EXPERIENCE_YEARS: 0",
-            "EXPERIENCE: **Unknown Company** (*Position*) 2020-2022: Professional experience",
-            "EDUCATION: Bachelor's Degree, University (01/2020)",
-            "CERTIFICATIONS: None",
+        sections: Dict[str, List[str]] = {}
+        for name, content in resume_chunker.split_sections(text):
+            sections.setdefault(name, []).append(content)
+        
+        # Baris bertanggal dari section pengalaman; tanpa judul section, baris bertanggal yang bukan pendidikan
+        if "experience" in sections:
+            experience_lines = [line.strip() for content in sections["experience"] for line in content.splitlines()
+                                if DATE_RANGE_PATTERN.search(line)]
+        else:
+            experience_lines = [line.strip() for line in text.splitlines()
+                                if DATE_RANGE_PATTERN.search(line) and not self.degree_pattern.search(line)]
+        experience_text = "; ".join(experience_lines)
+        experience_years = experience_calculator.calculate_experience_years(experience_text)
+        
+        education_source = sections.get("education") or [text]
+        education_line = next((line.strip() for content in education_source for line in content.splitlines()
+                               if self.degree_pattern.search(line)), "")
+        degree_match = self.degree_pattern.search(education_line)
+        education = (f"{education_line} ({self.degree_levels[degree_match.group(1).lower()]})"
+                     if degree_match else "Not specified")
+        
+        certifications = [line.strip(" -•*") for content in sections.get("certifications", [])
+                          for line in content.splitlines() if line.strip(" -•*")]
+        projects_count = sum(len(resume_chunker.split_entries(content)) for content in sections.get("projects", []))
+        level = self._level_for_years(experience_years)
+        
+        record = [
+            f"NAME: {name_extractor.extract_name_from_resume(text)}",
+            f"SKILLS: {', '.join(skills) or 'Not specified'}",
+            f"EXPERIENCE_YEARS: {int(experience_years)}",
+            f"EXPERIENCE: {experience_text or 'Not specified'}",
+            f"EDUCATION: {education}",
+            f"CERTIFICATIONS: {', '.join(certifications[:10]) or 'None'}",
             "JOB_ROLE: Not specified",
-            "PROJECTS_COUNT: 0",
+            f"PROJECTS_COUNT: {projects_count}",
             "SALARY_EXPECTATION: Not specified",
-            f"DOMAIN_EXPERTISE: Entry-level {self.domain} knowledge"
+            f"DOMAIN_EXPERTISE: {level.title()}-level {self.domain} knowledge",
+            f"LEVEL: {level}"
         ]
-        return '\n'.join(sections)
+        return '\n'.join(record)
     
     def standardize_multiple(self, resume_texts: List[str]) -> Tuple[List[str], List[str]]:
-        """Standardize multiple resumes and detect their levels"""
-        standardized = []
-        levels = []
-        
-        for text in resume_texts:
-            std_text = self.standardize_resume(text)
-            level = self.detect_resume_level(std_text)
-            standardized.append(std_text)
-            levels.append(level)
+        """Standardize multiple resumes and read their levels from the standardized records"""
+        standardized = map_in_threads(self.standardize_resume, resume_texts)
+        levels = [self.detect_resume_level(std_text) for std_text in standardized]
         
         return standardized, levels
     